@@ -5,7 +5,8 @@
 
 import os
 import math
-import html
+import html as _html
+import json
 import urllib.parse
 import urllib.request
 import datetime
@@ -15,9 +16,11 @@ cgitb.enable()
 
 from tools.db_backend import (
     count_goodruns,
-    fetch_goodruns_page,
+    fetch_goodruns_page_with_total,
     get_run_metadata,
-    apply_updates,
+    apply_updates, bulk_classify, build_where,
+    set_client_tag, cancel_superseded, cancel_on_disconnect, pin_reads_to_primary,
+    reads_from_replica, notice_new_runs,
 )
 
 
@@ -25,107 +28,168 @@ from tools.templates import (
     urlencode_keep,
     render_pagination,
     parse_cell, class_to_css, label_for,
-    active_filters_panel,
+    active_filters_panel, join_rows,
     render_header, render_filters_form, render_top_controls,
-    render_table, render_form_footer, render_footer
+    render_table, render_form_footer, render_footer,
+    render_virtual_table,
+)
+
+from tools import page_cache, accesslog, metrics
+from tools.response import start_response
+from tools.params import (
+    COLUMNS, RUN_CLASSES, parse_filters, client_tag, client_seq, is_prefetch, get_int, get_str, wrote_recently,
+    read_your_writes_cookie, READ_YOUR_WRITES_SECONDS,
 )
 
 import sys, io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
 
-COLUMNS = ["MVTX", "INTT", "TPC", "TPOT", "EMCAL", "IHCAL", "OHCAL", "MBD", "ZDC", "sEPD"]
-PAGE_SIZE_DEFAULT = 15
-PAGE_SIZE_MAX = 200
-
 
 # ---------- CGI INPUT ----------
 form = cgi.FieldStorage()
 
-def _get_int(name, default=None):
-    try:
-        v = form.getfirst(name, "")
-        if v in (None, ""):
-            return default
-        return int(v)
-    except Exception:
-        return default
-
-def _get_str(name, default=""):
-    v = form.getfirst(name, default)
-    return v if v is not None else default
-
-page = max(1, _get_int("page", 1))
-page_size = min(max(1, _get_int("page_size", PAGE_SIZE_DEFAULT)), PAGE_SIZE_MAX)
-
-# Filters
-run_number_exact = _get_int("run_number", None)
-run_min = _get_int("run_min", None)
-run_max = _get_int("run_max", None)
-run_type_filter = _get_str("run_type", "").strip().lower()   # physics/cosmics/calibration or ""
-notes_contains  = _get_str("notes_contains", "").strip()
-require_class   = _get_str("require_class", "").strip().upper()  # GOLDEN/QUESTIONABLE/BAD
-subsys_filter   = _get_str("subsys", "").strip()                 # exact member of COLUMNS
-subsys_class    = _get_str("subsys_class", "").strip().upper()   # GOLDEN/QUESTIONABLE/BAD
-track_ready     = _get_str("track_ready", "")
-calo_ready      = _get_str("calo_ready", "")
-
-# Current params for links (strip empty when building QS)
-current_params = {
-    "run_number": "" if run_number_exact is None else str(run_number_exact),
-    "run_min": "" if run_min is None else str(run_min),
-    "run_max": "" if run_max is None else str(run_max),
-    "run_type": run_type_filter or "",
-    "page_size": str(page_size),
-    "notes_contains": notes_contains or "",
-    "require_class": require_class or "",
-    "subsys": subsys_filter or "",
-    "subsys_class": subsys_class or "",
-    "track_ready": "1" if track_ready in ("1", "true", "True") else "",
-    "calo_ready":  "1" if calo_ready  in ("1", "true", "True") else "",
-    "page": str(page),
-}
+filters_dict, current_params = parse_filters(form)
+accesslog.begin("all.py", current_params)
+metrics.request("all.py")
+accesslog.note(page=filters_dict["page"], page_size=filters_dict["page_size"])
+
+# Just after this browser's own save, read from the primary so replica lag
+# cannot hide the change (and bypass the shared cache for the same reason)
+read_primary = wrote_recently()
+if read_primary:
+    pin_reads_to_primary()
+page = filters_dict["page"]
+page_size = filters_dict["page_size"]
+run_number_exact = filters_dict["run_number_exact"]
+run_min = filters_dict["run_min"]
+run_max = filters_dict["run_max"]
+run_type_filter = filters_dict["run_type"]
+view_cols = filters_dict["cols"] or COLUMNS  # cols= projection; filters and sorts still see every column
 
 # ---------- HANDLE POST (updates) ----------
+def _wants_json():
+    # saveChanges() in tools/script.py posts with X-Requested-With
+    return (os.environ.get("HTTP_X_REQUESTED_WITH", "") == "XMLHttpRequest"
+            or "application/json" in os.environ.get("HTTP_ACCEPT", ""))
+
+def _send_json(obj, status="200 OK", headers=None):
+    start_response("application/json; charset=utf-8", status, headers)
+    print(json.dumps(obj))
+
+def _bulk_request():
+    """
+    Bulk classification (JSON only): action=bulk_preview|bulk_apply,
+    bulk_col, bulk_class, bulk_notes, scope=filters|range (+ bulk_min/bulk_max),
+    expected (apply only: the previewed count).
+    """
+    action = get_str(form, "action", "")
+    accesslog.note(action=action)
+    col = get_str(form, "bulk_col", "").strip()
+    rc = get_str(form, "bulk_class", "").strip().upper()
+    notes = get_str(form, "bulk_notes", "").strip()
+    if col.lower() not in {c.lower() for c in COLUMNS}:
+        return _send_json({"ok": False, "error": "unknown subsystem"}, "400 Bad Request")
+    if rc not in RUN_CLASSES:
+        return _send_json({"ok": False, "error": "unknown run class"}, "400 Bad Request")
+
+    if get_str(form, "scope", "filters") == "range":
+        scope = {"run_min": get_int(form, "bulk_min", None), "run_max": get_int(form, "bulk_max", None)}
+        if scope["run_min"] is None or scope["run_max"] is None:
+            return _send_json({"ok": False, "error": "run range needs both ends"}, "400 Bad Request")
+    else:
+        # build_where filters only: run type / QA-ready are post-join and not applied
+        scope = {k: filters_dict[k] for k in ("run_number_exact", "run_min", "run_max",
+                                              "notes_contains", "require_class",
+                                              "subsys_filter", "subsys_class",
+                                              "begin_from", "begin_to", "dur_min", "dur_max")}
+    if not build_where(scope, COLUMNS)[0]:
+        return _send_json({"ok": False, "error": "set a filter or run range first"}, "400 Bad Request")
+    # the preview count is what bulk_apply is checked against: both on the primary
+    pin_reads_to_primary()
+    try:
+        if action == "bulk_preview":
+            n = count_goodruns(scope, COLUMNS)
+            return _send_json({"ok": True, "count": n})
+        n = bulk_classify(scope, COLUMNS, col, rc, notes, expected=get_int(form, "expected", None))
+        return _send_json({"ok": True, "updated": n},
+                          headers={"Set-Cookie": read_your_writes_cookie()})
+    except ValueError as e:
+        return _send_json({"ok": False, "error": str(e)}, "409 Conflict")
+    except Exception as e:
+        return _send_json({"ok": False, "error": str(e)}, "500 Internal Server Error")
+
 if os.environ.get("REQUEST_METHOD", "").upper() == "POST":
+    if get_str(form, "action", "") in ("bulk_preview", "bulk_apply"):
+        _bulk_request()
+        raise SystemExit
+
+    columns_lc = {c.lower() for c in COLUMNS}
     updates_by_run = {}
+    rejected = []
+    # script.py posts only the cells the user changed, so this walks the
+    # edits rather than every editor on the page.
     for key in form.keys():
+        if not key.startswith("runclass_"):
+            continue
         val = form.getfirst(key, "")
         if not val:
             continue
-        if key.startswith("runclass_"):
-            # runclass_COL_RUN
+        # runclass_COL_RUN
+        try:
             _, col, rn = key.split("_", 2)
             rn = int(rn)
-            notes = form.getfirst(f"notes_{col}_{rn}", "").strip()
-            updates_by_run.setdefault(rn, []).append((col.lower(), val.strip(), notes))
+        except ValueError:
+            continue
+        rc = val.strip().upper()
+        notes = form.getfirst(f"notes_{col}_{rn}", "").strip()
+        col = col.lower()
+        if col not in columns_lc:
+            rejected.append((rn, col, rc, notes, "unknown subsystem"))
+        elif rc not in RUN_CLASSES:
+            rejected.append((rn, col, rc, notes, "unknown run class"))
+        else:
+            updates_by_run.setdefault(rn, []).append((col, rc, notes))
 
     try:
-        apply_updates(updates_by_run)
+        with accesslog.stage("update"):
+            results = apply_updates(updates_by_run)
+        accesslog.note(cells=len(results), rejected=len(rejected))
     except Exception as e:
-        print("Content-type: text/html; charset=utf-8\r\n\r\n")
-        print(f"<p>Error updating database: {_html.escape(str(e))}</p>")
+        accesslog.note(error=str(e))
+        if _wants_json():
+            _send_json({"ok": False, "error": str(e)}, "500 Internal Server Error")
+        else:
+            start_response("text/html; charset=utf-8")
+            print(f"<p>Error updating database: {_html.escape(str(e))}</p>")
         raise SystemExit
 
-    print("Content-type: text/html; charset=utf-8\r\n\r\n")
+    if _wants_json():
+        cells = [
+            {"run": rn, "col": col, "class": rc, "notes": notes,
+             "ok": written, "error": None if written else "run not found"}
+            for rn, col, rc, notes, written in results
+        ] + [
+            {"run": rn, "col": col, "class": rc, "notes": notes, "ok": False, "error": err}
+            for rn, col, rc, notes, err in rejected
+        ]
+        _send_json({
+            "ok": all(c["ok"] for c in cells),
+            "saved": sum(1 for c in cells if c["ok"]),
+            "cells": cells,
+        }, headers={"Set-Cookie": read_your_writes_cookie()} if any(w for *_, w in results) else None)
+        raise SystemExit
+
+    start_response("text/html; charset=utf-8", headers={"Set-Cookie": read_your_writes_cookie()})
     redir_qs = urlencode_keep(current_params, {"page": str(page)})
     print(f'<meta http-equiv="refresh" content="0; url=all.py?{redir_qs}">')
     print("<p>Update successful. Redirecting...</p>")
     raise SystemExit
 
 # ---------- PAGE (GET) ----------
-print("Content-type: text/html; charset=utf-8\r\n\r\n")
+start_response("text/html; charset=utf-8")
 print(render_header())
 
 # Filter form + “Active Filters”
-filters_dict = {
-    "run_number_exact": run_number_exact,
-    "run_min": run_min,
-    "run_max": run_max,
-    "notes_contains": notes_contains,
-    "require_class": require_class,
-    "subsys_filter": subsys_filter,
-    "subsys_class": subsys_class,
-}
 rn_val = "" if run_number_exact is None else str(run_number_exact)
 rmin_val = "" if run_min is None else str(run_min)
 rmax_val = "" if run_max is None else str(run_max)
@@ -134,63 +198,127 @@ print(render_filters_form(
     run_type_filter=run_type_filter,
     rn_val=rn_val, rmin_val=rmin_val, rmax_val=rmax_val,
     page_size=page_size,
-    active_filters_html=active_filters_panel(
-        {"run_number_exact": run_number_exact, "run_min": run_min, "run_max": run_max},
-        run_type_filter
-    )
+    active_filters_html=active_filters_panel(filters_dict, run_type_filter)
 ))
+# Let the browser fetch CSS/JS while the queries run
+sys.stdout.flush()
+
+# ---------- VIRTUAL SCROLL VIEW (rows come from rows.py) ----------
+if filters_dict["view"] == "virtual":
+    print('<div id="resultsRoot">')
+    print(render_virtual_table(current_params, view_cols))
+    print('</div>')  # end #resultsRoot
+    print(render_footer())
+    raise SystemExit
 
 # ---------- COUNT -> CLAMP -> FETCH ----------
-try:
-    filtered_total = count_goodruns(filters_dict, COLUMNS)
+def render_results(page=page, current_params=current_params):
+    """
+    Count -> clamp -> fetch -> render.
+    returns: (html, cacheable) -- pages missing run metadata are not cached
+    """
+    current_params = dict(current_params)
+    out = []
+    # page + total in one query (estimated total for the unfiltered view)
+    with accesslog.stage("fetch"):
+        raw_rows, filtered_total, page, approximate = fetch_goodruns_page_with_total(
+            filters_dict, COLUMNS, page, page_size, select=view_cols)
     total_pages = max(1, -(-filtered_total // page_size))  # ceil-div
-    page = max(1, min(page, total_pages))
-    offset = (page - 1) * page_size
     current_params["page"] = str(page)  # keep links in sync
 
-    raw_rows = fetch_goodruns_page(filters_dict, COLUMNS, page_size, offset)
     run_numbers = [r[0] for r in raw_rows]
 
     # Metadata (safe if empty)
     meta = {}
+    cacheable = True
     try:
-        meta = get_run_metadata(run_numbers)
+        with accesslog.stage("meta"):
+            meta = get_run_metadata(run_numbers)
     except Exception as e:
-        print(f"<p style='color:#a00;'>Warning: Could not fetch run metadata: {_html.escape(str(e))}</p>")
-
-    # Post-join filters (type + optional QA-ready file presence)
-    rows = []
-    for row in raw_rows:
-        rn = row[0]
-        runtime = (meta.get(rn,{}).get("beginruntime") or "")
-        runtime_format = runtime.strftime("%Y-%m-%d %H:%M:%S") if runtime else "&mdash;"
-        new_row = (rn, runtime) + row[1:]
-        rt = (meta.get(rn, {}).get("runtype", "") or "")
-        if run_type_filter and rt != run_type_filter:
-            continue
+        cacheable = False
+        out.append(f"<p style='color:#a00;'>Warning: Could not fetch run metadata: {_html.escape(str(e))}</p>")
 
-        # 1000-run binning for QA artifacts
-        floor = (rn // 1000) * 1000
-        ceiling = floor + 1000
-        tqa = f"/sphenix/WWW/subsystem/QAHtml/{rt}/run_{floor:010d}_{ceiling:010d}/{rn:05d}/TpcLasersQA_1_{rn:05d}.png"
-        cqa = f"/sphenix/WWW/subsystem/QAHtml/{rt}/run_{floor:010d}_{ceiling:010d}/{rn:05d}/CaloQA_cemc1_{rn}.png"
+    with accesslog.stage("render"):
+        # Post-join filters (type + optional QA-ready file presence)
+        rows = join_rows(raw_rows, meta, run_type_filter,
+                         filters_dict["track_ready"], filters_dict["calo_ready"])
 
-        if current_params["track_ready"] and (not os.path.exists(tqa)):
-            continue
-        if current_params["calo_ready"] and (not os.path.exists(cqa)):
-            continue
+        # ----- Render results area (AJAX-swappable) -----
+        out.append('<div id="resultsRoot">')
+        out.append(render_top_controls(current_params))
+        out.append(render_table(rows, meta, view_cols, current_params))
+        out.append(render_form_footer(current_params))
+        out.append(f"<div class='pagination'>{render_pagination(current_params, page, total_pages, filtered_total, page_size, approximate=approximate)}</div>")
+        out.append('</div>')  # end #resultsRoot
+    accesslog.note(page=page, rows=len(rows), total=filtered_total, approximate=approximate)
+    return "\n".join(out), cacheable
 
-        rows.append(new_row)
+def may_cache():
+    """
+    Whether a page rendered now may go into the shared cache: not when it came
+    from a replica within the replica-lag window after the last write, since
+    it could miss that write and would be stored under the new generation.
+    """
+    return not reads_from_replica() or page_cache.generation_age() >= READ_YOUR_WRITES_SECONDS
 
-    # ----- Render results area (AJAX-swappable) -----
-    print('<div id="resultsRoot">')
-    print(render_top_controls(current_params))
-    print(render_table(rows, meta, COLUMNS))
-    print(render_form_footer(current_params))
-    print(f"<div class='pagination'>{render_pagination(current_params, page, total_pages, filtered_total, page_size)}</div>")
-    print('</div>')  # end #resultsRoot
+def refresh_in_background(key):
+    """Re-render a stale cache entry after the response has gone out."""
+    sys.stdout.flush()
+    if os.fork() != 0:
+        return
+    # child: detach from the web server's pipes so the response completes now
+    os.setsid()
+    devnull = os.open(os.devnull, os.O_RDWR)
+    for fd in (0, 1, 2):
+        os.dup2(devnull, fd)
+    try:
+        gen = page_cache.generation()
+        filters_dict.pop("run_set", None)  # re-resolve DAQ time/duration filters too
+        html, cacheable = render_results()
+        if cacheable and may_cache():
+            page_cache.put(key, html, gen)
+    except Exception:
+        pass
+    finally:
+        page_cache.release_refresh(key)
+        os._exit(0)
 
-except Exception as e:
-    print(f"<p style='color:#a00;'>Error: {_html.escape(str(e))}</p>")
+# Shared page cache: stale entries are served at once and refreshed by one worker
+cache_key = page_cache.cache_key(current_params)
+with accesslog.stage("cache"):
+    if not read_primary:
+        notice_new_runs()
+    results_html, cache_state = (None, None) if read_primary else page_cache.get(cache_key)
+cache_result = "bypass" if read_primary else (cache_state or "miss")
+accesslog.note(cache=cache_result)
+metrics.counter("runqa_page_cache_total", result=cache_result).inc()
+if results_html is not None:
+    print(results_html)
+else:
+    # A newer hydration request from the same tab supersedes any query still running.
+    # Prefetches run side by side with each other and with navigations, so they
+    # neither cancel nor can be cancelled that way (the browser aborts them instead).
+    cancel_on_disconnect()
+    if not is_prefetch() and set_client_tag(client_tag(), client_seq()):
+        try:
+            cancel_superseded()
+        except Exception:
+            pass
+
+    try:
+        gen = page_cache.generation()
+        results_html, cacheable = render_results()
+        print(results_html)
+        if cacheable and may_cache():
+            try:
+                page_cache.put(cache_key, results_html, gen)
+            except OSError:
+                pass
+    except Exception as e:
+        accesslog.note(error=str(e))
+        print(f"<p style='color:#a00;'>Error: {_html.escape(str(e))}</p>")
 
 print(render_footer())
+
+if cache_state == "stale" and page_cache.try_lock_refresh(cache_key):
+    refresh_in_background(cache_key)
@@ -0,0 +1,81 @@
+#!/usr/bin/python3
+# Incremental change feed: goodruns cell writes after a cursor, oldest first.
+# For scripts that keep a copy in sync without re-reading the whole table
+# (live viewers use events.py instead).
+#
+#   changes.py?since=0[&limit=1000]   -> the whole log, page by page
+#   changes.py?since=N                -> writes after cursor N
+#   changes.py?since=latest           -> no rows, "next" is the current cursor
+#   -> {"since": N, "next": M, "more": bool,
+#       "changes": [{"seq", "run", "subsystem", "class", "notes", "changed_at"}, ...]}
+#
+# Keep asking with since=<next>; "more" means the next page is already there.
+# A page is fully determined by (since, next, more), which is its ETag, so a
+# poll with If-None-Match and nothing new gets 304 Not Modified.
+# Several writes to one cell all appear; the last one is its current value.
+
+import cgi
+import json
+import os
+
+from tools.db_backend import fetch_changes, cancel_on_disconnect
+from tools.params import COLUMNS, get_int, get_str
+from tools.response import start_response
+from tools import accesslog, metrics
+
+import sys, io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+LIMIT_DEFAULT = 1000
+LIMIT_MAX = 10000
+
+_SUBSYSTEMS = {c.lower(): c for c in COLUMNS}
+
+def _send_json(obj, status="200 OK", headers=None):
+    start_response("application/json; charset=utf-8", status, headers)
+    print(json.dumps(obj, separators=(",", ":")))
+
+def _etag_matches(etag):
+    inm = os.environ.get("HTTP_IF_NONE_MATCH", "")
+    return inm.strip() == "*" or etag in (t.strip().removeprefix("W/") for t in inm.split(","))
+
+form = cgi.FieldStorage()
+accesslog.begin("changes.py")
+metrics.request("changes.py")
+since_arg = get_str(form, "since", "0").strip()
+since = None if since_arg == "latest" else get_int(form, "since", None)
+if since is None and since_arg != "latest":
+    _send_json({"error": "since must be a cursor (integer) or 'latest'"}, "400 Bad Request")
+    raise SystemExit
+if since is not None:
+    since = max(0, since)
+limit = min(max(1, get_int(form, "limit", LIMIT_DEFAULT)), LIMIT_MAX)
+cancel_on_disconnect()
+
+try:
+    with accesslog.stage("fetch"):
+        rows, next_cursor, more = fetch_changes(since, limit)
+except Exception as e:
+    accesslog.note(error=str(e))
+    _send_json({"error": str(e)}, "500 Internal Server Error")
+    raise SystemExit
+if since is None:
+    since = next_cursor
+accesslog.note(rows=len(rows))
+
+etag = f'"{since}-{next_cursor}-{int(more)}"'
+headers = {"ETag": etag, "Cache-Control": "no-cache"}
+if _etag_matches(etag):
+    start_response("application/json; charset=utf-8", "304 Not Modified", headers, compress=False)
+    raise SystemExit
+
+_send_json({
+    "since": since,
+    "next": next_cursor,
+    "more": more,
+    "changes": [
+        {"seq": seq, "run": rn, "subsystem": _SUBSYSTEMS.get(col, col), "class": rc, "notes": notes,
+         "changed_at": changed_at.isoformat() if changed_at else None}
+        for seq, rn, col, rc, notes, changed_at in rows
+    ],
+}, headers=headers)
@@ -0,0 +1,58 @@
+#!/usr/bin/python3
+# Server-Sent Events stream of goodruns cell changes for open run tables.
+# Each event is a JSON [runnumber, subsystem_lc, runclass, notes] tuple that
+# script.py patches into the matching cell in place.
+#
+# Cost: every open tab holds one CGI process and one LISTEN connection on the
+# primary (notifications are not sent to replicas) for as long as its stream
+# lasts, idle or not; size the web server's CGI limit and max_connections for
+# the expected number of open tables. Streams are kept short (STREAM_SECONDS)
+# so nothing lingers after a tab goes away; EventSource then reconnects with
+# Last-Event-ID (the goodruns_changes cursor, sent as the event id at the
+# start and after every notification) and only the cells written while it
+# was away are replayed, or a "resync" event asks the page to reload when
+# that is too much.
+
+import os
+import sys
+import json
+import time
+
+from tools.db_backend import listen_changes, RESYNC
+from tools.response import start_response
+
+HEARTBEAT_SECONDS = 15
+# CGI workers should not live long; EventSource reconnects by itself.
+STREAM_SECONDS = 60
+RETRY_MS = 2000
+
+def _send(chunk):
+    # flush per event: the encoder sync-flushes so compressed events arrive at once
+    sys.stdout.write(chunk)
+    sys.stdout.flush()
+
+try:
+    since = int(os.environ.get("HTTP_LAST_EVENT_ID", ""))
+except ValueError:
+    since = None
+
+start_response("text/event-stream; charset=utf-8",
+               headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+_send(f"retry: {RETRY_MS}\n\n")
+
+deadline = time.monotonic() + STREAM_SECONDS
+try:
+    for change in listen_changes(heartbeat=HEARTBEAT_SECONDS, since=since):
+        if change is None:
+            _send(": ping\n\n")
+        elif change == RESYNC:
+            _send("event: resync\ndata: {}\n\n")
+        elif isinstance(change, int):
+            _send(f"id: {change}\n\n")  # sets lastEventId without dispatching an event
+        else:
+            _send(f"event: cell\ndata: {json.dumps(list(change))}\n\n")
+        if time.monotonic() > deadline:
+            break
+except (BrokenPipeError, ConnectionResetError):
+    # viewer closed the tab; the generator's finally closes the DB connection
+    pass
@@ -0,0 +1,56 @@
+#!/usr/bin/python3
+# Good-run-list endpoint (see tools/grl.py).
+#
+#   grl.py?require=mvtx,intt,tpc[&classes=GOLDEN,QUESTIONABLE][&type=physics]
+#         [&dur_min=10][&dur_max=][&run_min=][&run_max=][&format=runs|intervals|json]
+#   grl.py?<same criteria>&run=53210   -> {"run": 53210, "in": true, "name": ...}
+#
+# Plain-text formats are one run / one "first-last" interval per line.
+
+import cgi
+import json
+
+from tools.grl import Criteria, build, format_intervals
+from tools.params import get_int, get_str
+from tools.db_backend import cancel_on_disconnect
+from tools.response import start_response
+
+import sys, io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+def _send_json(obj, status="200 OK"):
+    start_response("application/json; charset=utf-8", status)
+    print(json.dumps(obj, separators=(",", ":")))
+
+form = cgi.FieldStorage()
+try:
+    crit = Criteria(get_str(form, "require", "").split(","),
+                    get_str(form, "classes", "GOLDEN").split(","),
+                    get_str(form, "type", ""),
+                    get_int(form, "dur_min", None), get_int(form, "dur_max", None),
+                    get_int(form, "run_min", None), get_int(form, "run_max", None))
+except ValueError as e:
+    _send_json({"error": str(e)}, "400 Bad Request")
+    raise SystemExit
+
+cancel_on_disconnect()
+try:
+    grl = build(crit)
+except Exception as e:
+    _send_json({"error": str(e)}, "500 Internal Server Error")
+    raise SystemExit
+
+run = get_int(form, "run", None)
+fmt = get_str(form, "format", "runs")
+if run is not None:
+    _send_json({"run": run, "in": run in grl, "name": crit.name})
+elif fmt == "json":
+    _send_json(grl.to_json())
+else:
+    start_response("text/plain; charset=utf-8",
+                   headers={"Content-Disposition": 'inline; filename="grl.txt"'})
+    print(f"# GRL {crit.name}: {len(grl)} runs, {len(grl.intervals)} intervals")
+    if fmt == "intervals":
+        print(format_intervals(grl.intervals))
+    else:
+        print("\n".join(str(rn) for rn in grl.runs))
@@ -0,0 +1,68 @@
+#!/usr/bin/python3
+# Run × subsystem status heatmap over the whole run history (see tools/heatmap.py).
+#
+#   heatmap.py[?run_min=&run_max=&width=]              -> page with the image
+#   heatmap.py?format=png[&run_min=&run_max=&width=]   -> the PNG itself
+#
+# One query loads every run's class codes for the range; page and image are
+# kept in the shared page cache until the next goodruns write or new run.
+
+import cgi
+
+from tools.db_backend import fetch_class_codes, cancel_on_disconnect, notice_new_runs
+from tools.heatmap import WIDTH_DEFAULT, WIDTH_MAX, build_grid, render_page, render_png, xscale_for
+from tools import page_cache
+from tools.params import COLUMNS, get_int, get_str
+from tools.templates import render_header, render_footer, urlencode_keep
+from tools.response import start_response
+
+import sys, io
+import html as _html
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+form = cgi.FieldStorage()
+run_min = get_int(form, "run_min", None)
+run_max = get_int(form, "run_max", None)
+width = min(max(100, get_int(form, "width", WIDTH_DEFAULT)), WIDTH_MAX)
+fmt = "png" if get_str(form, "format", "") == "png" else "html"
+params = {"run_min": "" if run_min is None else str(run_min),
+          "run_max": "" if run_max is None else str(run_max),
+          "width": "" if width == WIDTH_DEFAULT else str(width)}
+key = page_cache.cache_key(dict(params, heatmap=fmt))
+cancel_on_disconnect()
+
+notice_new_runs()
+body = page_cache.get_blob(key)
+if body is None:
+    gen = page_cache.generation()
+    try:
+        grid = build_grid(fetch_class_codes(COLUMNS, run_min, run_max), width)
+    except Exception as e:
+        start_response("text/html; charset=utf-8", "500 Internal Server Error")
+        print(f"<p>Error loading runs: {_html.escape(str(e))}</p>")
+        raise SystemExit
+    if fmt == "png":
+        if grid is None:
+            start_response("text/plain; charset=utf-8", "404 Not Found")
+            print("no runs in range")
+            raise SystemExit
+        body = render_png(grid, xscale_for(grid, width))
+    else:
+        img_qs = urlencode_keep(params, {"format": "png"})
+        body = render_page(grid, COLUMNS, img_qs, width, run_min, run_max).encode("utf-8")
+    try:
+        page_cache.put_blob(key, body, gen)
+    except OSError:
+        pass
+
+if fmt == "png":
+    start_response("image/png", headers={"Cache-Control": "no-cache"}, compress=False)
+    sys.stdout.flush()
+    sys.stdout.buffer.write(body)
+else:
+    start_response("text/html; charset=utf-8")
+    print(render_header())
+    print('<script src="tools/heatmap_ui.py?v=1" defer></script>')
+    print("<h2>Run status heatmap</h2>")
+    print(body.decode("utf-8"))
+    print(render_footer())
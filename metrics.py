@@ -0,0 +1,18 @@
+#!/usr/bin/python3
+# Prometheus scrape target: counters and histograms collected by tools/metrics.py
+# (request rates and durations, DB calls and connections, QA filesystem
+# probes, table rendering, page cache results), summed over all processes.
+# Each scrape folds the per-process delta files into the totals file.
+#
+#   scrape_configs:
+#     - job_name: runqa
+#       metrics_path: /path/to/metrics.py
+
+from tools import metrics
+from tools.response import start_response
+
+import sys, io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+start_response("text/plain; version=0.0.4; charset=utf-8", headers={"Cache-Control": "no-cache"})
+print(metrics.render(metrics.collect()), end="")
@@ -0,0 +1,83 @@
+#!/usr/bin/python3
+# JSON rows API: windows of the filtered run table (same filters as all.py).
+# Used by the virtual-scroll view in tools/virtual_ui.py.
+#
+#   rows.py?<all.py filters>&offset=0&limit=500[&cols=tpc,tpot]
+#   -> {"columns": [...], "total": N|null, "offset": o, "next_offset": o2,
+#       "done": bool, "rows": [[run, begin, runtype, duration, [[class, notes], ...]], ...]}
+# The cells follow "columns": every subsystem, or only the cols= ones.
+#
+# offset/next_offset count goodruns rows before the post-join filters (run type,
+# QA-ready), so a window may hold fewer rows than requested.
+
+import json
+import cgi
+
+from tools.db_backend import (
+    count_goodruns, fetch_goodruns_page, get_run_metadata, cancel_on_disconnect,
+    pin_reads_to_primary,
+)
+from tools.params import COLUMNS, get_int, parse_filters, wrote_recently
+from tools.templates import join_rows, parse_cell
+from tools.response import start_response
+from tools import accesslog, metrics
+
+import sys, io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+
+WINDOW_DEFAULT = 500
+WINDOW_MAX = 1000
+
+def _send_json(obj, status="200 OK"):
+    start_response("application/json; charset=utf-8", status)
+    print(json.dumps(obj, separators=(",", ":")))
+
+form = cgi.FieldStorage()
+filters, params = parse_filters(form)
+accesslog.begin("rows.py", params)
+metrics.request("rows.py")
+view_cols = filters["cols"] or COLUMNS
+offset = max(0, get_int(form, "offset", 0))
+limit = min(max(0, get_int(form, "limit", WINDOW_DEFAULT)), WINDOW_MAX)
+want_total = offset == 0 or get_int(form, "count", 0) == 1
+cancel_on_disconnect()
+if wrote_recently():
+    pin_reads_to_primary()
+
+try:
+    with accesslog.stage("fetch"):
+        total = count_goodruns(filters, COLUMNS) if want_total else None
+        raw_rows = fetch_goodruns_page(filters, COLUMNS, limit, offset, select=view_cols) if limit else []
+    try:
+        with accesslog.stage("meta"):
+            meta = get_run_metadata([r[0] for r in raw_rows])
+    except Exception:
+        meta = {}
+    rows = join_rows(raw_rows, meta, filters["run_type"],
+                     filters["track_ready"], filters["calo_ready"])
+    accesslog.note(rows=len(rows), total=total)
+except Exception as e:
+    accesslog.note(error=str(e))
+    _send_json({"error": str(e)}, "500 Internal Server Error")
+    raise SystemExit
+
+out_rows = []
+for row in rows:
+    rn, runtime = row[0], row[1]
+    info = meta.get(rn, {}) or {}
+    out_rows.append([
+        rn,
+        str(runtime) if runtime else "",
+        info.get("runtype", "") or "",
+        info.get("duration"),
+        [list(parse_cell(raw)) for raw in row[2:]],
+    ])
+
+_send_json({
+    "columns": view_cols,
+    "total": total,
+    "offset": offset,
+    "next_offset": offset + len(raw_rows),
+    "done": len(raw_rows) < limit,
+    "rows": out_rows,
+})
@@ -0,0 +1,28 @@
+-- sql/changes.sql
+-- Change log behind the incremental feed (changes.py, db_backend.fetch_changes).
+-- Every goodruns cell write (apply_updates, bulk_classify,
+-- import_classifications) appends one row per changed cell in the same
+-- transaction. Until this has been run writes are not recorded (they still
+-- succeed) and changes.py answers with an error. Safe to re-run.
+--
+-- seq is the consumer's cursor. Writers take a SHARE ROW EXCLUSIVE lock on the
+-- table just before inserting, so seq values become visible in commit order and
+-- a reader that has seen seq N can never later find a smaller committed seq.
+-- Readers (plain SELECT) are not blocked. Rolled-back writes leave gaps.
+-- seq is the only ordering key; changed_at is the wall-clock time of the
+-- insert (clock_timestamp(), taken under the lock) and is informational.
+
+CREATE TABLE IF NOT EXISTS goodruns_changes (
+    seq        bigserial PRIMARY KEY,
+    runnumber  integer NOT NULL,
+    subsystem  text NOT NULL,          -- goodruns column name (lowercase)
+    runclass   text,
+    notes      text,
+    changed_at timestamptz NOT NULL DEFAULT clock_timestamp()
+);
+
+-- History of one run (e.g. "who changed 53210 TPC and when").
+CREATE INDEX IF NOT EXISTS goodruns_changes_run_idx ON goodruns_changes (runnumber, subsystem, seq);
+
+-- Retention: delete only what every consumer has already read, e.g.
+-- DELETE FROM goodruns_changes WHERE changed_at < now() - INTERVAL '1 year';
@@ -0,0 +1,46 @@
+-- sql/indexes.sql
+-- Indexes behind the sortable run table (db_backend.py, ORDER BY ... runnumber).
+-- Safe to re-run. CONCURRENTLY is not allowed inside the DO block below; on a
+-- busy primary run the generated statements by hand with CONCURRENTLY instead.
+
+-- ---------- Production database (goodruns) ----------
+-- Run number order (the default sort) uses the primary key on runnumber.
+
+-- Subsystem class sort: one index per column on the rank expression built by
+-- db_backend._class_rank_sql (BAD 3, QUESTIONABLE 2, GOLDEN 1, unset 0) plus
+-- runnumber, so "BAD TPC runs first" is an index scan that stops at the page.
+-- The class is the first field of each column's composite type.
+DO $$
+DECLARE
+    col text;
+    fld text;
+BEGIN
+    FOREACH col IN ARRAY ARRAY['mvtx', 'intt', 'tpc', 'tpot', 'emcal',
+                               'ihcal', 'ohcal', 'mbd', 'zdc', 'sepd'] LOOP
+        SELECT a.attname INTO fld
+        FROM pg_attribute c
+        JOIN pg_type t ON t.oid = c.atttypid
+        JOIN pg_attribute a ON a.attrelid = t.typrelid AND a.attnum = 1
+        WHERE c.attrelid = 'goodruns'::regclass AND c.attname = col;
+        IF fld IS NULL THEN
+            RAISE NOTICE 'goodruns.% has no composite class field, skipped', col;
+            CONTINUE;
+        END IF;
+        EXECUTE format(
+            'CREATE INDEX IF NOT EXISTS %I ON goodruns ('
+            '(CASE (%I).%I WHEN ''BAD'' THEN 3 WHEN ''QUESTIONABLE'' THEN 2 '
+            'WHEN ''GOLDEN'' THEN 1 ELSE 0 END), runnumber)',
+            'goodruns_' || col || '_class_idx', col, fld);
+    END LOOP;
+END $$;
+
+ANALYZE goodruns;
+
+-- ---------- DAQ database (run) ----------
+-- Begin-time sort: the matching run numbers are joined to run on its primary
+-- key and ordered by brtimestamp; this index also serves begin-time ranges.
+-- Run against the DAQ database (psql -d daq), not Production:
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS run_brtimestamp_idx ON run (brtimestamp, runnumber);
+
+-- Duration filters (dur_min / dur_max) compare this expression:
+-- CREATE INDEX CONCURRENTLY IF NOT EXISTS run_duration_idx ON run ((ertimestamp - brtimestamp));
@@ -0,0 +1,248 @@
+# tools/accesslog.py
+# Structured access log: one JSON line per request, and a latency report over it.
+#
+#   python -m tools.accesslog report [--since 24h] [--until 2025-09-01] [--by shape]
+#                                    [--endpoint all.py] [--stages]
+#
+# Line fields (absent when they do not apply):
+#   ts           request start, UTC ISO-8601
+#   endpoint     script name (all.py, rows.py)
+#   method       GET / POST
+#   status       HTTP status as sent (null if the script died before responding)
+#   bytes        response size on the wire (headers included, after compression)
+#   ms           wall time from begin() (after imports) to exit
+#   shape        filter shape, e.g. "require_class+run_range" ("-" for no filters)
+#   filters      the non-empty filter parameters (page / page_size split out)
+#   page, page_size
+#   rows, total  rows rendered, matching runs (approximate: total is an estimate)
+#   cache        fresh | stale | miss | bypass (read-your-writes)
+#   stages       {name: ms}: fetch (page + total), meta (DAQ metadata),
+#                render (join + HTML), cache (page cache lookup), update (saves)
+#   action, cells, rejected   POSTs: bulk action / cells written and refused
+#   error        message when the request failed
+#
+# Each line is one O_APPEND write, so concurrent CGI processes do not
+# interleave. RUNQA_ACCESS_LOG="" turns logging off.
+
+import os
+import sys
+import json
+import math
+import time
+import atexit
+import argparse
+import datetime as dt
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from tools import response
+
+ACCESS_LOG = os.getenv("RUNQA_ACCESS_LOG", "/tmp/runqa-access.log")
+
+_REC: Optional[Dict[str, Any]] = None
+_T0 = 0.0
+
+# (shape label, parameters that set it), in display order
+_SHAPE_KEYS = (
+    ("run", ("run_number",)),
+    ("run_range", ("run_min", "run_max")),
+    ("run_type", ("run_type",)),
+    ("notes", ("notes_contains",)),
+    ("require_class", ("require_class",)),
+    ("subsys", ("subsys", "subsys_class")),
+    ("track_ready", ("track_ready",)),
+    ("calo_ready", ("calo_ready",)),
+    ("begin", ("begin_from", "begin_to")),
+    ("duration", ("dur_min", "dur_max")),
+    ("virtual", ("view",)),
+    ("cols", ("cols",)),
+)
+_SORT_KEYS = ("begin", "duration")
+_STAGES = ("cache", "fetch", "meta", "render", "update")
+
+def filter_shape(params: Dict[str, str]) -> str:
+    """Which filters are set, ignoring their values: the unit the report groups by."""
+    parts = [label for label, keys in _SHAPE_KEYS if any(params.get(k) for k in keys)]
+    sort = params.get("sort") or ""
+    if sort:
+        # subsystem sorts share one plan shape (class rank index)
+        parts.append("sort:" + (sort if sort in _SORT_KEYS else "class"))
+    return "+".join(parts) or "-"
+
+def begin(endpoint: str, params: Optional[Dict[str, str]] = None) -> None:
+    """Start this request's record; it is written when the process exits."""
+    global _REC, _T0
+    if not ACCESS_LOG or _REC is not None:
+        return
+    _T0 = time.monotonic()
+    _REC = {
+        "ts": dt.datetime.now(dt.timezone.utc).isoformat(timespec="milliseconds"),
+        "endpoint": endpoint,
+        "method": os.environ.get("REQUEST_METHOD", "GET").upper(),
+        "stages": {},
+    }
+    if params is not None:
+        _REC["shape"] = filter_shape(params)
+        _REC["filters"] = {k: v for k, v in params.items() if v and k not in ("page", "page_size")}
+    # uncaught exceptions (cgitb's page included) still get a line, with the error
+    prev_hook = sys.excepthook
+    def _hook(etype, value, tb):
+        note(error=f"{etype.__name__}: {value}")
+        prev_hook(etype, value, tb)
+    sys.excepthook = _hook
+    # registered before start_response's finisher, so it runs after it (atexit is LIFO)
+    atexit.register(_write)
+
+def note(**fields: Any) -> None:
+    if _REC is not None:
+        _REC.update(fields)
+
+@contextmanager
+def stage(name: str):
+    """Add the block's wall time to stages[name] (ms)."""
+    t = time.monotonic()
+    try:
+        yield
+    finally:
+        if _REC is not None:
+            ms = (time.monotonic() - t) * 1000.0
+            _REC["stages"][name] = round(_REC["stages"].get(name, 0.0) + ms, 2)
+
+def _write() -> None:
+    rec = _REC
+    if rec is None:
+        return
+    sent = response.sent()
+    rec["status"] = int(sent["status"].split()[0]) if sent["status"] else None
+    rec["bytes"] = sent["bytes"]
+    rec["ms"] = round((time.monotonic() - _T0) * 1000.0, 2)
+    line = (json.dumps(rec, separators=(",", ":"), default=str) + "\n").encode("utf-8")
+    try:
+        fd = os.open(ACCESS_LOG, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o664)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+    except OSError:
+        pass  # never fail a request over its log line
+
+# ---------- report ----------
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[max(0, math.ceil(q / 100.0 * len(sorted_values)) - 1)]
+
+def _parse_when(s: str) -> dt.datetime:
+    """'90m' / '24h' / '7d' before now, or an ISO date/time (UTC)."""
+    s = s.strip()
+    units = {"m": 60, "h": 3600, "d": 86400}
+    if s[-1:] in units and s[:-1].isdigit():
+        return dt.datetime.now(dt.timezone.utc) - dt.timedelta(seconds=int(s[:-1]) * units[s[-1]])
+    when = dt.datetime.fromisoformat(s)
+    return when if when.tzinfo else when.replace(tzinfo=dt.timezone.utc)
+
+def read_log(paths: List[str], since: Optional[dt.datetime] = None,
+             until: Optional[dt.datetime] = None) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        try:
+            f = open(path, encoding="utf-8", errors="replace")
+        except OSError as e:
+            print(f"skipping {path}: {e}", file=sys.stderr)
+            continue
+        with f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                    ts = dt.datetime.fromisoformat(rec["ts"])
+                except (ValueError, KeyError, TypeError):
+                    continue  # partial line from a crash or a foreign writer
+                if (since and ts < since) or (until and ts >= until):
+                    continue
+                yield rec
+
+def _is_error(rec: Dict[str, Any]) -> bool:
+    return rec.get("status") is None or rec["status"] >= 500 or bool(rec.get("error"))
+
+def summarize(records: Iterator[Dict[str, Any]], by: str = "shape", stages: bool = False) -> List[Dict[str, Any]]:
+    """Group by endpoint (+ shape); rows sorted by total time spent, largest first."""
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for rec in records:
+        key = (rec.get("endpoint", "?"), rec.get("method", "GET"))
+        if by == "shape":
+            key += (rec.get("shape") or "-",)
+        groups.setdefault(key, []).append(rec)
+    out = []
+    for key, recs in groups.items():
+        ms = sorted(r.get("ms", 0.0) for r in recs)
+        cached = [r["cache"] for r in recs if r.get("cache")]
+        row = {
+            "key": " ".join(key),
+            "count": len(recs),
+            "errors": sum(1 for r in recs if _is_error(r)),
+            "p50": percentile(ms, 50), "p95": percentile(ms, 95), "p99": percentile(ms, 99),
+            "total_s": sum(ms) / 1000.0,
+            "kib": sum(r.get("bytes", 0) for r in recs) / len(recs) / 1024.0,
+            "hit": (sum(1 for c in cached if c in ("fresh", "stale")) / len(cached)) if cached else None,
+        }
+        if stages:
+            for name in _STAGES:
+                vals = sorted(r["stages"][name] for r in recs if name in r.get("stages", {}))
+                row[name + "_p95"] = percentile(vals, 95) if vals else None
+        out.append(row)
+    out.sort(key=lambda r: -r["total_s"])
+    return out
+
+def format_report(rows: List[Dict[str, Any]], stages: bool = False) -> str:
+    width = max([len(r["key"]) for r in rows] + [len("endpoint / shape")]) + 2
+    head = (f"{'endpoint / shape':<{width}}{'count':>8}{'err':>6}{'p50 ms':>9}{'p95 ms':>9}"
+            f"{'p99 ms':>9}{'total s':>9}{'KiB':>7}{'hit %':>7}")
+    if stages:
+        head += "".join(f"{n + ' p95':>12}" for n in _STAGES)
+    lines = [head]
+    for r in rows:
+        hit = "-" if r["hit"] is None else f"{100 * r['hit']:.0f}"
+        line = (f"{r['key']:<{width}}{r['count']:>8}{r['errors']:>6}{r['p50']:>9.0f}{r['p95']:>9.0f}"
+                f"{r['p99']:>9.0f}{r['total_s']:>9.1f}{r['kib']:>7.1f}{hit:>7}")
+        if stages:
+            line += "".join("{:>12}".format("-" if r[n + "_p95"] is None else f"{r[n + '_p95']:.0f}")
+                            for n in _STAGES)
+        lines.append(line)
+    return "\n".join(lines)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m tools.accesslog",
+                                 description="Summarize the structured access log.")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("report", help="latency percentiles by endpoint and filter shape")
+    p.add_argument("--file", action="append", help=f"log file(s) (default {ACCESS_LOG or 'none'})")
+    p.add_argument("--since", help="e.g. 90m, 24h, 7d or an ISO date/time (UTC)")
+    p.add_argument("--until", help="same forms as --since")
+    p.add_argument("--by", default="shape", choices=("shape", "endpoint"))
+    p.add_argument("--endpoint", help="only this endpoint, e.g. all.py")
+    p.add_argument("--stages", action="store_true", help="add per-stage p95 columns")
+    p.add_argument("--json", action="store_true", help="print the rows as JSON")
+    args = ap.parse_args(argv)
+
+    paths = args.file or ([ACCESS_LOG] if ACCESS_LOG else [])
+    if not paths:
+        ap.error("no log file: pass --file or set RUNQA_ACCESS_LOG")
+    try:
+        since = _parse_when(args.since) if args.since else None
+        until = _parse_when(args.until) if args.until else None
+    except ValueError as e:
+        ap.error(str(e))
+    records = read_log(paths, since, until)
+    if args.endpoint:
+        records = (r for r in records if r.get("endpoint") == args.endpoint)
+    rows = summarize(records, args.by, args.stages)
+    if args.json:
+        print(json.dumps(rows, indent=1))
+    elif not rows:
+        print("no requests in range")
+    else:
+        print(format_report(rows, args.stages))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,25 +2,200 @@
 # Centralizes all database access for run triage UI.
 
 import os
+import re
+import sys
+import io
+import csv
+import hashlib
+import json
+import select
+import signal
+import weakref
+from collections import OrderedDict
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+
+from tools import page_cache, metrics
 
 # ---------- CONFIG (overridable via env) ----------
 DB_NAME = os.getenv("RUNQA_DB_NAME", "Production")
 DB_USER = os.getenv("RUNQA_DB_USER", "phnxrc")
 DB_HOST = os.getenv("RUNQA_DB_HOST", "sphnxproddbmaster")
 
+# Page/count reads may go to a streaming replica; writes, LISTEN/NOTIFY and
+# anything a write depends on stay on DB_HOST. Either side can also be given as
+# a libpq connection string (RUNQA_DB_DSN / RUNQA_DB_READ_DSN). Without a read
+# host or DSN all reads use the primary, as before.
+DB_DSN = os.getenv("RUNQA_DB_DSN", "")
+DB_READ_DSN = os.getenv("RUNQA_DB_READ_DSN", "")
+DB_READ_HOST = os.getenv("RUNQA_DB_READ_HOST", "")
+DB_READ_USER = os.getenv("RUNQA_DB_READ_USER", DB_USER)
+
 DAQ_DB_PARAMS = {
     "dbname": os.getenv("RUNQA_DAQ_DB_NAME", "daq"),
     "user":   os.getenv("RUNQA_DAQ_DB_USER", "phnxro"),
     "host":   os.getenv("RUNQA_DAQ_DB_HOST", "sphnxdaqdbreplica"),
 }
+# or a full libpq connection string, which takes precedence
+DAQ_DB_DSN = os.getenv("RUNQA_DAQ_DB_DSN", "")
+
+# LISTEN/NOTIFY channel carrying goodruns cell changes to live viewers (events.py)
+NOTIFY_CHANNEL = os.getenv("RUNQA_NOTIFY_CHANNEL", "goodruns_changed")
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+_NOTIFY_MAX_BYTES = 7900
+
+# Server-side cap on any single statement; a stuck LIKE scan is cancelled by PostgreSQL
+STATEMENT_TIMEOUT_MS = int(os.getenv("RUNQA_STATEMENT_TIMEOUT_MS", "15000"))
+
+# ---------- METRICS (tools/metrics.py) ----------
+_Q_COUNT = metrics.histogram("runqa_db_query_seconds", op="count")
+_Q_FETCH = metrics.histogram("runqa_db_query_seconds", op="fetch")
+_Q_META = metrics.histogram("runqa_db_query_seconds", op="metadata")
+_Q_UPDATE = metrics.histogram("runqa_db_query_seconds", op="update")
+_Q_CHANGES = metrics.histogram("runqa_db_query_seconds", op="changes")
+_PREP_HIT = metrics.counter("runqa_db_prepared_total", result="hit")
+_PREP_NEW = metrics.counter("runqa_db_prepared_total", result="prepared")
+_PREP_EVICT = metrics.counter("runqa_db_prepared_total", result="evicted")
+_PREP_PLAIN = metrics.counter("runqa_db_prepared_total", result="plain")
+_CONN_COUNTS = {(role, result): metrics.counter("runqa_db_connections_total", role=role, result=result)
+          for role, result in (("main", "opened"), ("read", "opened"), ("read", "reused"), ("daq", "opened"))}
 
 # ---------- CONNECTION HELPERS ----------
-def _conn_main():
-    return psycopg2.connect(dbname=DB_NAME, user=DB_USER, host=DB_HOST)
+# Connections opened by this process, so a signal handler can cancel their queries
+_OPEN_CONNS = weakref.WeakSet()
+# Browser-tab id (X-RunQA-Client) reported as application_name; see cancel_superseded
+_CLIENT_TAG = ""
+# The tab's navigation sequence number for this request; see cancel_superseded
+_CLIENT_SEQ = 0
+# Set by pin_reads_to_primary(): this request must see the user's own recent write
+_READ_PRIMARY = False
+# Reused read connections, see _conn_read
+_READ_CONNS = {}
+
+def _connect(**params):
+    app = f"runqa:{_CLIENT_TAG}:{_CLIENT_SEQ}" if _CLIENT_TAG else "runqa"
+    conn = psycopg2.connect(
+        application_name=app,
+        options=f"-c statement_timeout={STATEMENT_TIMEOUT_MS}",
+        **params,
+    )
+    _OPEN_CONNS.add(conn)
+    return conn
+
+def _conn_main(role="main"):
+    _CONN_COUNTS[role, "opened"].inc()
+    if DB_DSN:
+        return _connect(dsn=DB_DSN)
+    return _connect(dbname=DB_NAME, user=DB_USER, host=DB_HOST)
+
+def _conn_read():
+    """
+    Connection for read-only goodruns queries: the replica unless pinned or unset.
+    Kept open for the life of the process (per target and client tag) so
+    statements prepared on it by _execute_prepared are reused.
+    """
+    replica = not _READ_PRIMARY and (DB_READ_DSN or DB_READ_HOST)
+    key = ("replica" if replica else "primary", _CLIENT_TAG)
+    conn = _READ_CONNS.get(key)
+    if conn is None or conn.closed:
+        if not replica:
+            conn = _conn_main(role="read")
+        else:
+            _CONN_COUNTS["read", "opened"].inc()
+            if DB_READ_DSN:
+                conn = _connect(dsn=DB_READ_DSN)
+            else:
+                conn = _connect(dbname=DB_NAME, user=DB_READ_USER, host=DB_READ_HOST)
+        _READ_CONNS[key] = conn
+    else:
+        _CONN_COUNTS["read", "reused"].inc()
+    return conn
+
+def _forget_connections():
+    # a forked child must not talk over the parent's sockets; it reconnects lazily
+    _READ_CONNS.clear()
+    _PREPARED.clear()
+
+os.register_at_fork(after_in_child=_forget_connections)
+
+def pin_reads_to_primary(pin=True):
+    """
+    Send this process's reads to the primary. Used for a short window after the
+    user's own save (see params.wrote_recently) so replica lag cannot hide it,
+    and for counts that a following write is checked against.
+    """
+    global _READ_PRIMARY
+    _READ_PRIMARY = bool(pin)
+
+def reads_from_replica():
+    """True when this process's goodruns reads go to a replica (which may lag)."""
+    return bool(not _READ_PRIMARY and (DB_READ_DSN or DB_READ_HOST))
 
 def _conn_daq():
-    return psycopg2.connect(**DAQ_DB_PARAMS)
+    _CONN_COUNTS["daq", "opened"].inc()
+    if DAQ_DB_DSN:
+        return _connect(dsn=DAQ_DB_DSN)
+    return _connect(**DAQ_DB_PARAMS)
+
+def set_client_tag(tag, seq=0):
+    """
+    Label this process's connections with the requesting tab's id (safe chars
+    only) and its navigation sequence number: application_name runqa:<tag>:<seq>.
+    """
+    global _CLIENT_TAG, _CLIENT_SEQ
+    _CLIENT_TAG = tag if re.fullmatch(r"[A-Za-z0-9_-]{1,40}", tag or "") else ""
+    _CLIENT_SEQ = seq if isinstance(seq, int) and 0 < seq < 10 ** 18 else 0
+    return _CLIENT_TAG
+
+def cancel_superseded():
+    """
+    Cancel queries still running for an earlier navigation of the same tab,
+    i.e. one with a lower sequence number; a request that arrives late never
+    cancels a newer one. Called at the start of a hydration request so
+    PostgreSQL only works on the newest query per user. No-op without a
+    client tag and sequence number.
+    """
+    if not _CLIENT_TAG or not _CLIENT_SEQ:
+        return 0
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT COUNT(pg_cancel_backend(pid)) FROM pg_stat_activity "
+                "WHERE split_part(application_name, ':', 1) = 'runqa' "
+                "AND split_part(application_name, ':', 2) = %s "
+                "AND CASE WHEN split_part(application_name, ':', 3) ~ '^[0-9]{1,18}$' "
+                "THEN split_part(application_name, ':', 3)::bigint END < %s "
+                "AND pid <> pg_backend_pid() AND state = 'active'",
+                (_CLIENT_TAG, _CLIENT_SEQ),
+            )
+            return cur.fetchone()[0]
+
+def cancel_on_disconnect():
+    """
+    Install SIGTERM/SIGHUP handlers that cancel in-flight queries and exit.
+    The web server sends these when it gives up on the CGI (its own timeout,
+    a restart, or after it has noticed the client is gone, which it usually
+    only does on a write); without this PostgreSQL would finish the abandoned
+    query anyway. A browser disconnect in the middle of a query is not seen
+    until then: superseded queries are cancelled by cancel_superseded and
+    the rest are bounded by STATEMENT_TIMEOUT_MS. libpq's own wait is a blocking C call that defers Python signal handlers
+    until the query ends, so queries wait in select() instead (psycopg2's
+    wait_select callback) and the handler runs mid-query. Call this before
+    the first connection is opened. COPY cannot run under a wait callback,
+    so import_classifications (a CLI, tools/import_csv.py) does not use it.
+    """
+    psycopg2.extensions.set_wait_callback(psycopg2.extras.wait_select)
+    def _handler(signum, frame):
+        for conn in list(_OPEN_CONNS):
+            try:
+                if not conn.closed:
+                    conn.cancel()
+            except Exception:
+                pass
+        os._exit(1)
+    for sig in (signal.SIGTERM, signal.SIGHUP):
+        signal.signal(sig, _handler)
 
 # ---------- WHERE-BUILDER ----------
 def build_where(filters, columns):
@@ -33,6 +208,8 @@ def build_where(filters, columns):
       require_class (GOLDEN/QUESTIONABLE/BAD or '')
       subsys_filter (exact from columns or '')
       subsys_class (GOLDEN/QUESTIONABLE/BAD or '')
+      begin_from / begin_to (datetime or None), dur_min / dur_max (minutes or None):
+        resolved on the DAQ run table into a run-number set, see _daq_run_set
     returns: where_sql (str), params (list)
     """
     where = []
@@ -80,37 +257,415 @@ def build_where(filters, columns):
         where.append(f"CAST({subsys_filter.lower()} AS TEXT) LIKE %s")
         params.append(f"%({subsys_class},%")
 
+    # Begin-time / duration window (DAQ metadata), as a run-number set
+    run_set = _daq_run_set(filters)
+    if run_set is not None:
+        where.append("runnumber = ANY(%s)")
+        params.append(run_set)
+
     where_clause = f"WHERE {' AND '.join(where)}" if where else ""
     return where_clause, params
 
+def _daq_run_set(filters):
+    """
+    Run numbers whose DAQ begin time / duration match the filters, from one
+    range query on the run table (brtimestamp and duration indexes, see
+    sql/indexes.sql), narrowed by the run-number range when one is set.
+    The goodruns side then filters with runnumber = ANY(...) before paging, so
+    counts stay exact. Memoized in filters["run_set"]; None without such filters.
+    daq_runtype (lowercase run type) is honoured here too; the run table's
+    run_type filter stays a post-join filter, only the GRL generator sets it.
+    """
+    if "run_set" in filters:
+        return filters["run_set"]
+    conds, params = [], []
+    if filters.get("begin_from") is not None:
+        conds.append("brtimestamp >= %s")
+        params.append(filters["begin_from"])
+    if filters.get("begin_to") is not None:
+        conds.append("brtimestamp < %s")
+        params.append(filters["begin_to"])
+    if filters.get("dur_min") is not None:
+        conds.append("ertimestamp - brtimestamp >= %s * INTERVAL '1 minute'")
+        params.append(filters["dur_min"])
+    if filters.get("dur_max") is not None:
+        conds.append("ertimestamp - brtimestamp <= %s * INTERVAL '1 minute'")
+        params.append(filters["dur_max"])
+    if filters.get("daq_runtype"):
+        conds.append("LOWER(runtype) = %s")
+        params.append(filters["daq_runtype"])
+    if not conds:
+        filters["run_set"] = None
+        return None
+    if filters.get("run_number_exact") is not None:
+        conds.append("runnumber = %s")
+        params.append(filters["run_number_exact"])
+    else:
+        if filters.get("run_min") is not None:
+            conds.append("runnumber >= %s")
+            params.append(filters["run_min"])
+        if filters.get("run_max") is not None:
+            conds.append("runnumber <= %s")
+            params.append(filters["run_max"])
+    with _conn_daq() as conn:
+        with conn.cursor() as cur:
+            cur.execute(f"SELECT runnumber FROM run WHERE {' AND '.join(conds)}", params)
+            filters["run_set"] = [r[0] for r in cur.fetchall()]
+    return filters["run_set"]
+
+# ---------- PREPARED STATEMENTS ----------
+# build_where produces one SQL text per combination of filters in use, so there
+# are few distinct shapes. A shape runs as a plain query the first time it is
+# seen on a connection and is PREPAREd on its PREPARE_THRESHOLD-th execution
+# (as psycopg's prepare_threshold), then EXECUTEd with the new values; after a
+# few executions PostgreSQL switches to a cached generic plan and the common
+# queries skip parsing and planning. A CGI request usually runs each shape
+# once, so it never pays for the extra PREPARE round trip.
+PREPARED_MAX = int(os.getenv("RUNQA_PREPARED_MAX", "32"))
+PREPARE_THRESHOLD = max(1, int(os.getenv("RUNQA_PREPARE_THRESHOLD", "2")))
+# connection -> OrderedDict(statement name -> executions, or True once prepared), LRU
+_PREPARED = weakref.WeakKeyDictionary()
+
+def _to_server_params(sql):
+    """psycopg2 placeholders -> PREPARE syntax: %s -> $1, $2, ...; %% -> %."""
+    n = 0
+    def _sub(m):
+        nonlocal n
+        if m.group() == "%%":
+            return "%"
+        n += 1
+        return f"${n}"
+    return re.sub(r"%%|%s", _sub, sql), n
+
+def _evict_prepared(cur, prepared):
+    """Make room for one more shape: drop the least recently used (DEALLOCATE if prepared)."""
+    while len(prepared) >= PREPARED_MAX:
+        old, state = prepared.popitem(last=False)
+        if state is True:
+            cur.execute(f"DEALLOCATE {old}")
+            _PREP_EVICT.inc()
+
+def _execute_prepared(cur, sql, params):
+    """
+    cur.execute(sql, params), through a per-connection cache of prepared
+    statements once the same shape has run PREPARE_THRESHOLD times.
+    """
+    sql = " ".join(sql.split())  # whitespace-insensitive shape
+    name = "runqa_" + hashlib.sha1(sql.encode("utf-8")).hexdigest()[:16]
+    prepared = _PREPARED.setdefault(cur.connection, OrderedDict())
+    state = prepared.get(name, 0)
+    if state is True:
+        prepared.move_to_end(name)
+        _PREP_HIT.inc()
+    elif state + 1 < PREPARE_THRESHOLD:
+        if name in prepared:
+            prepared.move_to_end(name)
+        else:
+            _evict_prepared(cur, prepared)
+        prepared[name] = state + 1
+        _PREP_PLAIN.inc()
+        cur.execute(sql, params)
+        return
+    else:
+        server_sql, nparams = _to_server_params(sql)
+        if nparams != len(params):
+            raise ValueError(f"{len(params)} parameters for {nparams} placeholders")
+        if name in prepared:
+            del prepared[name]
+        else:
+            _evict_prepared(cur, prepared)
+        cur.execute(f"PREPARE {name} AS {server_sql}")
+        _PREP_NEW.inc()
+        prepared[name] = True
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))})", params)
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+# ---------- SORTING ----------
+# Sort keys whose values live in the DAQ run table (a separate database)
+_DAQ_SORTS = {"begin": "r.brtimestamp", "duration": "r.ertimestamp - r.brtimestamp"}
+# goodruns column -> name of the class field of its composite type
+_CLASS_FIELD = {}
+
+def _sort_dir(filters):
+    return "ASC" if filters.get("dir") == "asc" else "DESC"
+
+def _class_rank_sql(cur, col):
+    """
+    Sort rank of one subsystem's class: BAD 3, QUESTIONABLE 2, GOLDEN 1, unset 0.
+    Kept identical to the expressions indexed by sql/indexes.sql.
+    """
+    if col not in _CLASS_FIELD:
+        cur.execute(
+            "SELECT a.attname FROM pg_attribute c "
+            "JOIN pg_type t ON t.oid = c.atttypid "
+            "JOIN pg_attribute a ON a.attrelid = t.typrelid AND a.attnum = 1 "
+            "WHERE c.attrelid = 'goodruns'::regclass AND c.attname = %s",
+            (col,),
+        )
+        row = cur.fetchone()
+        if row is None:
+            raise ValueError(f"goodruns.{col} is not a (runclass, notes) column")
+        _CLASS_FIELD[col] = row[0]
+    field = _CLASS_FIELD[col].replace('"', '""')
+    return (f"CASE ({col}).\"{field}\" WHEN 'BAD' THEN 3 WHEN 'QUESTIONABLE' THEN 2 "
+            "WHEN 'GOLDEN' THEN 1 ELSE 0 END")
+
+def _order_sql(cur, filters, columns):
+    """ORDER BY for goodruns-side sorts (run number or a subsystem's class), runnumber tiebreak."""
+    sort = filters.get("sort") or ""
+    d = _sort_dir(filters)
+    if sort in {c.lower() for c in columns}:
+        return f"ORDER BY {_class_rank_sql(cur, sort)} {d}, runnumber {d}"
+    return f"ORDER BY runnumber {d}"
+
+def _fetch_daq_sorted(filters, columns, limit, offset, select=None):
+    """
+    Page ordered by begin time or duration. Those live in the DAQ database, so
+    the matching run numbers (integers only) are sent there and PostgreSQL
+    sorts and paginates them; runs the DAQ does not know go last. Only the
+    page's goodruns rows (`select` columns) are then fetched.
+    returns: (raw_rows, total)
+    """
+    where_clause, params = build_where(filters, columns)
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            _execute_prepared(cur, f"SELECT runnumber FROM goodruns {where_clause}", params)
+            runs = [r[0] for r in cur.fetchall()]
+    if not runs:
+        return [], 0
+    d = _sort_dir(filters)
+    with _conn_daq() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                SELECT u.rn
+                FROM unnest(%s::int[]) AS u(rn)
+                LEFT JOIN run r ON r.runnumber = u.rn
+                ORDER BY {_DAQ_SORTS[filters["sort"]]} {d} NULLS LAST, u.rn {d}
+                LIMIT %s OFFSET %s
+                """,
+                (runs, limit, offset),
+            )
+            page_runs = [r[0] for r in cur.fetchall()]
+    if not page_runs:
+        return [], len(runs)
+    select_cols = ",".join([c.lower() for c in select or columns])
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            _execute_prepared(cur, f"SELECT runnumber, {select_cols} FROM goodruns WHERE runnumber = ANY(%s)",
+                              [page_runs])
+            by_run = {r[0]: r for r in cur.fetchall()}
+    return [by_run[rn] for rn in page_runs if rn in by_run], len(runs)
+
+# ---------- IN-MEMORY SNAPSHOT (tools/snapshot.py) ----------
+_SNAPSHOT = None
+
+def use_snapshot(snap):
+    """
+    Answer supported count/page queries from `snap` (None turns it off).
+    Only long-lived hosts do this, through tools.snapshot.enable(); CGI
+    requests always go to SQL.
+    """
+    global _SNAPSHOT
+    _SNAPSHOT = snap
+
+def _snapshot_for(filters, columns):
+    """The synced snapshot if it can answer these filters, else None (go to SQL)."""
+    # right after the user's own write, read from the primary instead
+    if _SNAPSHOT is None or _READ_PRIMARY or not _SNAPSHOT.supports(filters, columns):
+        return None
+    _SNAPSHOT.sync()
+    return _SNAPSHOT
+
+def fetch_cells(columns, after_run=None, runs=None):
+    """
+    Raw (runnumber, col1, ..., colN) rows from the primary, ascending: all runs,
+    runs newer than after_run, or the listed runs. Feeds tools/snapshot.py
+    and tools/static_export.py.
+    """
+    select_cols = ",".join([c.lower() for c in columns])
+    sql = f"SELECT runnumber, {select_cols} FROM goodruns"
+    params = []
+    if runs is not None:
+        sql += " WHERE runnumber = ANY(%s)"
+        params.append(list(runs))
+    elif after_run is not None:
+        sql += " WHERE runnumber > %s"
+        params.append(after_run)
+    with _conn_main() as conn:
+        try:
+            with conn.cursor() as cur:
+                cur.execute(sql + " ORDER BY runnumber", params)
+                return cur.fetchall()
+        finally:
+            conn.close()
+
+def _project(rows, columns, select):
+    """Keep runnumber and the `select` cells of full-width `columns` rows."""
+    if not select or list(select) == list(columns):
+        return rows
+    idx = [0] + [columns.index(c) + 1 for c in select]
+    return [tuple(r[i] for i in idx) for r in rows]
+
 # ---------- QUERIES ----------
+@_Q_COUNT.timed
 def count_goodruns(filters, columns):
+    snap = _snapshot_for(filters, columns)
+    if snap is not None:
+        return snap.count(filters)
     where_clause, params = build_where(filters, columns)
     sql = f"SELECT COUNT(*) FROM goodruns {where_clause}"
-    with _conn_main() as conn:
+    with _conn_read() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, params)
+            _execute_prepared(cur, sql, params)
             return cur.fetchone()[0]
 
-def fetch_goodruns_page(filters, columns, limit, offset):
+@_Q_FETCH.timed
+def fetch_goodruns_page(filters, columns, limit, offset, select=None):
     """
     returns: raw_rows (list of tuples)
-      tuple = (runnumber, MVTX, INTT, ..., sEPD) in the same order as columns
+      tuple = (runnumber, MVTX, INTT, ..., sEPD) in the same order as columns,
+      or only the `select` subset of columns (filters and sorts still see all)
     """
+    snap = _snapshot_for(filters, columns)
+    if snap is not None:
+        return _project(snap.page(filters, limit, offset), columns, select)
+    if filters.get("sort") in _DAQ_SORTS:
+        return _fetch_daq_sorted(filters, columns, limit, offset, select)[0]
     where_clause, params = build_where(filters, columns)
-    select_cols = ",".join([c.lower() for c in columns])
-    sql = f"""
-        SELECT runnumber, {select_cols}
-        FROM goodruns
-        {where_clause}
-        ORDER BY runnumber DESC
-        LIMIT %s OFFSET %s
+    select_cols = ",".join([c.lower() for c in select or columns])
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            sql = f"""
+                SELECT runnumber, {select_cols}
+                FROM goodruns
+                {where_clause}
+                {_order_sql(cur, filters, columns)}
+                LIMIT %s OFFSET %s
+            """
+            _execute_prepared(cur, sql, params + [limit, offset])
+            return cur.fetchall()
+
+def fetch_class_codes(columns, run_min=None, run_max=None):
     """
-    with _conn_main() as conn:
+    Every run number (optionally within [run_min, run_max]) with one class code
+    per subsystem (0 unset, 1 GOLDEN, 2 QUESTIONABLE, 3 BAD; the sort rank of
+    _class_rank_sql), ascending by run, in a single query. Used by heatmap.py.
+    returns: list of (runnumber, code_col1, ..., code_colN)
+    """
+    where, params = [], []
+    if run_min is not None:
+        where.append("runnumber >= %s")
+        params.append(run_min)
+    if run_max is not None:
+        where.append("runnumber <= %s")
+        params.append(run_max)
+    where_clause = f"WHERE {' AND '.join(where)}" if where else ""
+    with _conn_read() as conn:
         with conn.cursor() as cur:
-            cur.execute(sql, params + [limit, offset])
+            ranks = ", ".join(_class_rank_sql(cur, c.lower()) for c in columns)
+            _execute_prepared(cur, f"SELECT runnumber, {ranks} FROM goodruns {where_clause} ORDER BY runnumber",
+                              params)
             return cur.fetchall()
 
+def fetch_grl_runs(columns, subsystems, classes, run_type="", dur_min=None, dur_max=None,
+                   run_min=None, run_max=None):
+    """
+    Good-run-list evaluation: run numbers (ascending) where every subsystem in
+    `subsystems` has a class in `classes`, optionally of DAQ run type
+    `run_type` and duration within [dur_min, dur_max] minutes. The DAQ
+    conditions become a run-number set (separate database, see _daq_run_set);
+    the class conditions use the indexed rank expression of _class_rank_sql.
+    """
+    filters = {"run_min": run_min, "run_max": run_max, "dur_min": dur_min, "dur_max": dur_max,
+               "daq_runtype": (run_type or "").lower()}
+    where_clause, params = build_where(filters, columns)
+    conds = [where_clause[len("WHERE "):]] if where_clause else []
+    codes = [{"GOLDEN": 1, "QUESTIONABLE": 2, "BAD": 3}[c] for c in classes]
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            for col in subsystems:
+                conds.append(f"{_class_rank_sql(cur, col.lower())} = ANY(%s)")
+                params.append(codes)
+            sql = "SELECT runnumber FROM goodruns"
+            if conds:
+                sql += " WHERE " + " AND ".join(conds)
+            _execute_prepared(cur, sql + " ORDER BY runnumber", params)
+            return [r[0] for r in cur.fetchall()]
+
+# Below this many rows an exact COUNT is cheap enough even for the unfiltered view
+ESTIMATE_MIN_ROWS = int(os.getenv("RUNQA_ESTIMATE_MIN_ROWS", "10000"))
+
+def estimate_goodruns():
+    """Planner row estimate for goodruns (pg_class.reltuples); None if never analyzed."""
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT CAST(reltuples AS BIGINT) FROM pg_class WHERE oid = 'goodruns'::regclass")
+            row = cur.fetchone()
+    return row[0] if row and row[0] is not None and row[0] >= 0 else None
+
+@_Q_FETCH.timed
+def fetch_goodruns_page_with_total(filters, columns, page, page_size, select=None):
+    """
+    Page of goodruns (`select` columns, see fetch_goodruns_page) plus the total
+    in one round trip.
+    Filtered views add COUNT(*) OVER () to the page query. The unfiltered view
+    uses the table statistics instead (a window count would read every row);
+    its total is then approximate and can be fetched exactly later (rows.py
+    count=1). An out-of-range page is clamped to the last page.
+    returns: (raw_rows, total, page, approximate)
+    """
+    snap = _snapshot_for(filters, columns)
+    if snap is not None:
+        total = snap.count(filters)
+        page = max(1, min(page, -(-total // page_size)))
+        return (_project(snap.page(filters, page_size, (page - 1) * page_size), columns, select),
+                total, page, False)
+    if filters.get("sort") in _DAQ_SORTS:
+        page = max(1, page)
+        rows, total = _fetch_daq_sorted(filters, columns, page_size, (page - 1) * page_size, select)
+        if not rows and page > 1:
+            page = max(1, -(-total // page_size))
+            rows, total = _fetch_daq_sorted(filters, columns, page_size, (page - 1) * page_size, select)
+        return rows, total, page, False
+
+    where_clause, params = build_where(filters, columns)
+    approximate = False
+    if not where_clause:
+        est = estimate_goodruns()
+        if est is not None and est >= ESTIMATE_MIN_ROWS:
+            pages = max(1, -(-est // page_size))
+            page = max(1, min(page, pages))
+            rows = fetch_goodruns_page(filters, columns, page_size, (page - 1) * page_size, select)
+            if rows or page == 1:
+                return rows, est, page, True
+
+    select_cols = ",".join([c.lower() for c in select or columns])
+    page = max(1, page)
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            sql = f"""
+                SELECT runnumber, {select_cols}, COUNT(*) OVER () AS total_count
+                FROM goodruns
+                {where_clause}
+                {_order_sql(cur, filters, columns)}
+                LIMIT %s OFFSET %s
+            """
+            _execute_prepared(cur, sql, params + [page_size, (page - 1) * page_size])
+            rows = cur.fetchall()
+    if rows:
+        return [r[:-1] for r in rows], rows[0][-1], page, approximate
+    if page == 1:
+        return [], 0, 1, approximate
+    # past the end: no row carried the total, count and fetch the last page
+    total = count_goodruns(filters, columns)
+    page = max(1, -(-total // page_size))
+    return (fetch_goodruns_page(filters, columns, page_size, (page - 1) * page_size, select),
+            total, page, approximate)
+
+@_Q_META.timed
 def get_run_metadata(run_numbers):
     """
     DAQ metadata: duration + runtype for given run_numbers
@@ -135,13 +690,90 @@ def get_run_metadata(run_numbers):
                 info[rn] = {"duration": dur, "runtype": (rt or "").lower(), "beginruntime": brtime}
     return info
 
+def _notify_cells(cur, runs, col, rc, notes, seqs=None):
+    """
+    Announce that column `col` of every run in `runs` is now (rc, notes).
+    Payload: JSON [runnumber | [runnumbers], column_lc, runclass, notes, seq].
+    seq is the highest goodruns_changes seq of the cells in the payload (from
+    `seqs`, {rn: seq} as returned by _record_changes; null without a change
+    log), so a listener's cursor can advance with each notification. Long run
+    lists are split over several notifications, in `runs` order; notes too long
+    for a NOTIFY are sent as null (listeners keep what they show).
+    """
+    if len(json.dumps(notes)) > _NOTIFY_MAX_BYTES // 2:
+        notes = None
+    budget = _NOTIFY_MAX_BYTES - len(json.dumps([[], col, rc, notes, 2 ** 63]))
+    chunks, chunk, size = [], [], 0
+    for rn in runs:
+        width = len(str(rn)) + 2
+        if chunk and size + width > budget:
+            chunks.append(chunk)
+            chunk, size = [], 0
+        chunk.append(rn)
+        size += width
+    if chunk:
+        chunks.append(chunk)
+    for chunk in chunks:
+        target = chunk[0] if len(chunk) == 1 else chunk
+        seq = max((seqs[rn] for rn in chunk if rn in seqs), default=None) if seqs else None
+        cur.execute("SELECT pg_notify(%s, %s)",
+                    (NOTIFY_CHANNEL, json.dumps([target, col, rc, notes, seq])))
+
+# Set once goodruns_changes is known to exist (it only ever appears, see _record_changes)
+_HAVE_CHANGE_LOG = False
+
+def _record_changes(cur, cells):
+    """
+    Append (rn, column_lc, runclass, notes) cells to goodruns_changes (the feed
+    behind changes.py, see sql/changes.sql), numbered in the given order.
+    Call it after the transaction's goodruns writes and before its
+    notifications: the table lock it takes (readers are not blocked) keeps seq
+    in commit order, and taking it after every row lock cannot deadlock with
+    other writers. Until sql/changes.sql has been applied, writes go through
+    unrecorded (with a line in the server's error log) rather than failing.
+    returns: {column_lc: {rn: seq}} for _notify_cells ({} when not recorded)
+    """
+    global _HAVE_CHANGE_LOG
+    if not cells:
+        return {}
+    if not _HAVE_CHANGE_LOG:
+        cur.execute("SELECT to_regclass('goodruns_changes') IS NOT NULL")
+        _HAVE_CHANGE_LOG = bool(cur.fetchone()[0])
+        if not _HAVE_CHANGE_LOG:
+            print("runqa: goodruns_changes missing, change not recorded (apply sql/changes.sql)",
+                  file=sys.stderr)
+            return {}
+    cur.execute("LOCK TABLE goodruns_changes IN SHARE ROW EXCLUSIVE MODE")
+    runs, cols, classes, notes = (list(c) for c in zip(*cells))
+    cur.execute(
+        "INSERT INTO goodruns_changes (runnumber, subsystem, runclass, notes) "
+        "SELECT rn, col, rc, notes "
+        "FROM unnest(%s::integer[], %s::text[], %s::text[], %s::text[]) WITH ORDINALITY "
+        "AS c(rn, col, rc, notes, ord) ORDER BY ord "
+        "RETURNING runnumber, subsystem, seq",
+        (runs, cols, classes, notes),
+    )
+    seqs = {}
+    for rn, col, seq in cur.fetchall():
+        by_run = seqs.setdefault(col, {})
+        by_run[rn] = max(seq, by_run.get(rn, seq))
+    return seqs
+
+@_Q_UPDATE.timed
 def apply_updates(updates_by_run):
     """
     updates_by_run: dict[rn] -> list[(column_lc, runclass, notes)]
     Writes to goodruns: UPDATE goodruns SET {col} = (%s, %s) WHERE runnumber = %s
+    Written cells are recorded in goodruns_changes and announced on
+    NOTIFY_CHANNEL; PostgreSQL delivers the notifications only once the
+    transaction commits.
+    All cells are written in a single transaction.
+    returns: list[(rn, column_lc, runclass, notes, written)] in input order;
+             written is False when no goodruns row exists for rn
     """
+    results = []
     if not updates_by_run:
-        return
+        return results
     with _conn_main() as conn:
         with conn.cursor() as cur:
             for rn, items in updates_by_run.items():
@@ -150,4 +782,310 @@ def apply_updates(updates_by_run):
                         f"UPDATE goodruns SET {col} = (%s, %s) WHERE runnumber = %s",
                         (rc, notes, rn),
                     )
+                    results.append((rn, col, rc, notes, cur.rowcount > 0))
+            cells = [(rn, col, rc, notes) for rn, col, rc, notes, written in results if written]
+            seqs = _record_changes(cur, cells)
+            for rn, col, rc, notes in cells:
+                _notify_cells(cur, [rn], col, rc, notes, seqs.get(col))
+        conn.commit()
+    _invalidate_caches()
+    return results
+
+@_Q_UPDATE.timed
+def bulk_classify(filters, columns, column, runclass, notes, expected=None):
+    """
+    Set one subsystem to (runclass, notes) on every goodruns row matching
+    build_where(filters), as a single set-based UPDATE in one transaction.
+    column must already be validated against columns (it is interpolated).
+    expected: count shown in the preview; if the UPDATE touches a different
+              number of rows the transaction is rolled back and ValueError raised.
+    Refuses an empty WHERE so a missing filter cannot rewrite the whole table.
+    returns: number of runs updated
+    """
+    where_clause, params = build_where(filters, columns)
+    if not where_clause:
+        raise ValueError("bulk classification needs a filter or run range")
+    col = column.lower()
+    with _conn_main() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"UPDATE goodruns SET {col} = (%s, %s) {where_clause} RETURNING runnumber",
+                [runclass, notes] + params,
+            )
+            runs = [r[0] for r in cur.fetchall()]
+            if expected is not None and len(runs) != expected:
+                conn.rollback()
+                raise ValueError(
+                    f"selection changed since preview ({expected} expected, {len(runs)} matched); nothing written"
+                )
+            seqs = _record_changes(cur, [(rn, col, runclass, notes) for rn in runs])
+            _notify_cells(cur, runs, col, runclass, notes, seqs.get(col))
+        conn.commit()
+    _invalidate_caches()
+    return len(runs)
+
+# CSV columns accepted by import_classifications, in order
+IMPORT_HEADER = ("runnumber", "subsystem", "class", "notes")
+
+def _column_type(cur, col):
+    """SQL type name of a goodruns column (the composite the cells are stored as)."""
+    cur.execute(
+        "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+        "WHERE attrelid = 'goodruns'::regclass AND attname = %s AND NOT attisdropped",
+        (col,),
+    )
+    row = cur.fetchone()
+    if row is None:
+        raise ValueError(f"goodruns has no column {col}")
+    return row[0]
+
+@_Q_UPDATE.timed
+def import_classifications(csv_file, columns, classes, dry_run=False, max_errors=50):
+    """
+    Bulk-load (runnumber, subsystem, class, notes) CSV rows (with header line)
+    into goodruns in one transaction:
+      COPY -> temp staging table -> validate -> diff -> one UPDATE per subsystem.
+    The header must name IMPORT_HEADER in that order. Subsystems must be in
+    columns, classes in classes, runs must exist in goodruns and (run,
+    subsystem) may appear only once; any violation aborts, as does a line
+    COPY cannot parse (non-integer run number, wrong field count).
+    dry_run computes the diff and rolls back.
+    returns: dict(rows, errors=[(line, msg)], changes=[(rn, col, old_text, rc, notes)],
+                  applied=bool)
+    """
+    cols_lc = [c.lower() for c in columns]
+    report = {"rows": 0, "errors": [], "changes": [], "applied": False}
+    data = csv_file.read().lstrip("\ufeff")
+    # A quoted field (notes) may span lines, so record k does not start on line
+    # k + 1: starts[k] is the physical line of record k (the header is record 0)
+    starts = []
+    reader = csv.reader(io.StringIO(data, newline=""))
+    while True:
+        first = reader.line_num + 1
+        try:
+            next(reader)
+        except StopIteration:
+            break
+        except csv.Error:
+            starts.append(first)  # COPY reports it below
+            break
+        starts.append(first)
+    def physical_line(record):
+        return starts[record] if record < len(starts) else (starts[-1] if starts else 0)
+    header = next(csv.reader(io.StringIO(data, newline="")), [])
+    if [h.strip().lower() for h in header] != list(IMPORT_HEADER):
+        report["errors"].append((1, f"header must be {','.join(IMPORT_HEADER)} (got {','.join(header) or 'nothing'})"))
+        return report
+    with _conn_main() as conn:
+        with conn.cursor() as cur:
+            cur.execute("""
+                CREATE TEMP TABLE goodruns_import (
+                    line serial, runnumber integer, subsystem text, runclass text, notes text
+                ) ON COMMIT DROP
+            """)
+            try:
+                # COPY counts records, header included: its line n is record n - 1
+                cur.copy_expert(
+                    "COPY goodruns_import (runnumber, subsystem, runclass, notes) "
+                    "FROM STDIN WITH (FORMAT csv, HEADER true)",
+                    io.StringIO(data),
+                )
+            except psycopg2.DataError as e:
+                conn.rollback()
+                context = e.diag.context or ""
+                m = re.search(r"\bline (\d+)", context)
+                msg = (e.diag.message_primary or str(e)).strip()
+                report["errors"].append((physical_line(int(m.group(1)) - 1) if m else 0,
+                                         f"{msg} ({context})" if context else msg))
+                return report
+            cur.execute("""
+                UPDATE goodruns_import
+                SET subsystem = lower(trim(subsystem)),
+                    runclass  = upper(trim(runclass)),
+                    notes     = coalesce(trim(notes), '')
+            """)
+            cur.execute("SELECT COUNT(*) FROM goodruns_import")
+            report["rows"] = cur.fetchone()[0]
+
+            # staging line k is record k (serial from 1; record 0 is the header)
+            checks = [
+                ("SELECT line, 'unknown subsystem ' || coalesce(subsystem, '') FROM goodruns_import "
+                 "WHERE subsystem IS NULL OR subsystem <> ALL(%s)", (cols_lc,)),
+                ("SELECT line, 'unknown class ' || coalesce(runclass, '') FROM goodruns_import "
+                 "WHERE runclass IS NULL OR runclass <> ALL(%s)", (list(classes),)),
+                ("SELECT line, 'run ' || coalesce(runnumber::text, '(empty)') || ' not in goodruns' "
+                 "FROM goodruns_import s WHERE NOT EXISTS "
+                 "(SELECT 1 FROM goodruns g WHERE g.runnumber = s.runnumber)", None),
+                ("SELECT MIN(line), 'duplicate entry for run ' || coalesce(runnumber::text, '(empty)') "
+                 "|| ' ' || coalesce(subsystem, '(empty)') "
+                 "FROM goodruns_import GROUP BY runnumber, subsystem HAVING COUNT(*) > 1", None),
+            ]
+            for sql, params in checks:
+                cur.execute(sql + f" ORDER BY 1 LIMIT {int(max_errors)}", params)
+                report["errors"].extend((physical_line(line), msg) for line, msg in cur.fetchall())
+            if report["errors"]:
+                report["errors"].sort()
+                conn.rollback()
+                return report
+
+            # Diff against the current cells (parse_cell-equivalent comparison in SQL text form)
+            by_col = {}
+            for col in cols_lc:
+                cur.execute(
+                    f"""
+                    SELECT s.runnumber, CAST(g.{col} AS TEXT), s.runclass, s.notes
+                    FROM goodruns_import s JOIN goodruns g ON g.runnumber = s.runnumber
+                    WHERE s.subsystem = %s
+                      AND CAST(g.{col} AS TEXT) IS DISTINCT FROM CAST(ROW(s.runclass, s.notes) AS TEXT)
+                    ORDER BY s.runnumber
+                    """,
+                    (col,),
+                )
+                for rn, old, rc, notes in cur.fetchall():
+                    report["changes"].append((rn, col, old, rc, notes))
+                    by_col.setdefault(col, []).append(rn)
+
+            if dry_run or not by_col:
+                conn.rollback()
+                return report
+
+            for col, runs in by_col.items():
+                coltype = _column_type(cur, col)
+                cur.execute(
+                    f"""
+                    UPDATE goodruns g
+                    SET {col} = CAST(CAST(ROW(s.runclass, s.notes) AS TEXT) AS {coltype})
+                    FROM goodruns_import s
+                    WHERE s.runnumber = g.runnumber AND s.subsystem = %s
+                      AND s.runnumber = ANY(%s)
+                    """,
+                    (col, runs),
+                )
+            grouped = {}
+            for rn, col, _, rc, notes in report["changes"]:
+                grouped.setdefault((col, rc, notes), []).append(rn)
+            seqs = _record_changes(cur, [(rn, col, rc, notes)
+                                         for (col, rc, notes), runs in grouped.items() for rn in runs])
+            for (col, rc, notes), runs in grouped.items():
+                _notify_cells(cur, runs, col, rc, notes, seqs.get(col))
         conn.commit()
+    report["applied"] = True
+    _invalidate_caches()
+    return report
+
+@_Q_CHANGES.timed
+def fetch_changes(since, limit):
+    """
+    Cell writes recorded after cursor `since` (a goodruns_changes seq; 0 for the
+    whole log, None for "from now on": no rows, just the newest seq), oldest first.
+    returns: (rows, next_cursor, more)
+      rows = [(seq, runnumber, column_lc, runclass, notes, changed_at), ...]
+      next_cursor = seq of the last row (since when there are none)
+      more = True when further rows follow (ask again from next_cursor)
+    """
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            try:
+                if since is None:
+                    _execute_prepared(cur, "SELECT COALESCE(MAX(seq), 0) FROM goodruns_changes", [])
+                    return [], cur.fetchone()[0], False
+                _execute_prepared(
+                    cur,
+                    "SELECT seq, runnumber, subsystem, runclass, notes, changed_at FROM goodruns_changes "
+                    "WHERE seq > %s ORDER BY seq LIMIT %s",
+                    [since, limit + 1],
+                )
+            except psycopg2.ProgrammingError as e:
+                if getattr(e, "pgcode", None) != "42P01":  # undefined_table
+                    raise
+                raise RuntimeError("change feed not set up: apply sql/changes.sql") from e
+            rows = cur.fetchall()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, (rows[-1][0] if rows else since), more
+
+def latest_run():
+    """Newest run number in goodruns (None when empty)."""
+    with _conn_read() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT max(runnumber) FROM goodruns")
+            return cur.fetchone()[0]
+
+def notice_new_runs():
+    """
+    Invalidate the shared caches when runs have been added since the last look
+    (the ingest job writes goodruns directly); rate-limited by page_cache.
+    Call before reading a cached page.
+    """
+    try:
+        page_cache.check_new_runs(latest_run)
+    except Exception:
+        pass  # the cache then expires entries by age as before
+
+def _invalidate_caches():
+    # Rendered pages and anything keyed on the cache generation are now stale
+    try:
+        page_cache.invalidate()
+    except OSError:
+        pass
+
+# listen_changes: more missed changes than a reconnecting viewer should replay
+RESYNC = "resync"
+
+def listen_changes(heartbeat=20.0, since=None, replay_max=2000):
+    """
+    Generator over cell changes published by apply_updates / bulk_classify.
+    yields: (runnumber, column_lc, runclass, notes) per change, or None after
+            `heartbeat` seconds without traffic so callers can keep streams alive.
+    With the change log in place (sql/changes.sql) it also yields ints: the
+    goodruns_changes seq that everything yielded so far covers, after LISTEN
+    and after each notification. Passing the last one back as `since` on
+    reconnect first replays what was written in between, or yields RESYNC if
+    that is more than replay_max cells.
+    The connection sits idle in select() between notifications.
+    """
+    conn = _conn_main()
+    conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {NOTIFY_CHANNEL}")
+            # anything committed from here on also arrives as a notification
+            cur.execute("SELECT to_regclass('goodruns_changes') IS NOT NULL")
+            replay, cursor = [], None
+            if cur.fetchone()[0]:
+                cur.execute("SELECT COALESCE(MAX(seq), 0) FROM goodruns_changes")
+                cursor = cur.fetchone()[0]
+                if since is not None and since < cursor:
+                    cur.execute(
+                        "SELECT runnumber, subsystem, runclass, notes FROM goodruns_changes "
+                        "WHERE seq > %s AND seq <= %s ORDER BY seq LIMIT %s",
+                        (since, cursor, replay_max + 1),
+                    )
+                    replay = cur.fetchall()
+        if len(replay) > replay_max:
+            yield RESYNC
+        else:
+            yield from (tuple(r) for r in replay)
+        if cursor is not None:
+            yield cursor
+        while True:
+            ready, _, _ = select.select([conn], [], [], heartbeat)
+            if not ready:
+                yield None
+                continue
+            conn.poll()
+            while conn.notifies:
+                note = conn.notifies.pop(0)
+                try:
+                    target, col, rc, notes, *rest = json.loads(note.payload)
+                except (ValueError, TypeError):
+                    continue
+                for rn in (target if isinstance(target, list) else [target]):
+                    yield (rn, col, rc, notes)
+                # the cursor now covers this notification (ones that were committed
+                # before the starting cursor was read may repeat; never go back)
+                if rest and isinstance(rest[0], int) and (cursor is None or rest[0] > cursor):
+                    cursor = rest[0]
+                    yield cursor
+    finally:
+        conn.close()
@@ -1,8 +1,11 @@
 #!/usr/bin/python3
 # Emits JS that builds the floating filter window and wires Ctrl/Cmd+F to open it.
-import sys, io
+import os, sys, io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-print("Content-Type: application/javascript; charset=utf-8\r\n\r\n")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.response import start_response
+
+start_response("application/javascript; charset=utf-8")
 
 js = r'''
 (function(){
@@ -17,7 +20,8 @@ js = r'''
     // remove known keys first so we don't accumulate stale ones
     ['run_number','run_min','run_max','run_type','page_size',
      'notes_contains','require_class','subsys','subsys_class',
-     'track_ready','calo_ready','page'].forEach(k => u.searchParams.delete(k));
+     'track_ready','calo_ready','begin_from','begin_to','dur_min','dur_max',
+     'cols','page'].forEach(k => u.searchParams.delete(k));
     for (const [k,v] of Object.entries(obj)) {
       if (v === null || v === undefined || v === '') continue;
       u.searchParams.set(k, v);
@@ -60,36 +64,150 @@ js = r'''
     return next.search === new URL(window.location.href).search;
   }
 
-  // --- AJAX page updater ---
-  async function hydrateResults(obj, restore) {
-    const u = buildURL(obj);
-    if (qsEquals(obj)) return; // nothing changed
-    // Stash focus/caret in panel
-    const ae = document.activeElement;
-    const focusInfo = (ae && ae.id && (ae === document.getElementById('f_notes') ||
-                                       ae === document.getElementById('f_run_number') ||
-                                       ae === document.getElementById('f_run_min') ||
-                                       ae === document.getElementById('f_run_max') ||
-                                       ae === document.getElementById('f_page_size'))) ? {
-      id: ae.id,
-      s: ('selectionStart' in ae ? ae.selectionStart : null),
-      e: ('selectionEnd'   in ae ? ae.selectionEnd   : null)
-    } : null;
+  // --- Results fragment cache (LRU, keyed by canonical query string) ---
+  const CACHE_MAX = 24;
+  const fragCache = new Map();   // key -> #resultsRoot outerHTML; Map keeps insertion order
+  const inflight = new Map();    // key -> {p: Promise<html|null>, ctrl: AbortController}
+  let navSeq = 0;                // only the newest navigation may swap #resultsRoot
+
+  // Per-tab id + navigation sequence number; all.py cancels this tab's queries
+  // from older navigations (lower numbers) still running in PostgreSQL
+  const CLIENT_ID = (function(){
+    let id = sessionStorage.getItem('rt_client_id');
+    if (!id) {
+      id = Math.random().toString(36).slice(2, 12) + Date.now().toString(36);
+      sessionStorage.setItem('rt_client_id', id);
+    }
+    return id;
+  })();
+
+  // Increasing across reloads of the tab too (time based, never repeats)
+  let lastClientSeq = 0;
+  function nextClientSeq() {
+    lastClientSeq = Math.max(lastClientSeq + 1, Date.now());
+    return String(lastClientSeq);
+  }
 
-    // Fetch new HTML for the page
-    const res = await fetch(u.toString(), { headers: { 'X-Requested-With': 'XMLHttpRequest' }});
-    if (!res.ok) return;
-    const html = await res.text();
+  function canonicalKey(u) {
+    const p = Array.from(new URL(u.toString(), window.location.href).searchParams.entries())
+      .filter(([, v]) => v !== '')
+      .sort((a, b) => (a[0] === b[0] ? (a[1] < b[1] ? -1 : 1) : (a[0] < b[0] ? -1 : 1)));
+    return new URLSearchParams(p).toString();
+  }
+  function cacheGet(key) {
+    if (!fragCache.has(key)) return null;
+    const html = fragCache.get(key);
+    fragCache.delete(key); fragCache.set(key, html);   // mark most recent
+    return html;
+  }
+  function cachePut(key, html) {
+    fragCache.delete(key);
+    fragCache.set(key, html);
+    while (fragCache.size > CACHE_MAX) fragCache.delete(fragCache.keys().next().value);
+  }
+  function invalidateResultsCache() {
+    fragCache.clear();
+    exactTotals.clear();   // a save or bulk change can move runs in or out of a filter
+    abortOthers(null);
+  }
 
-    // Parse and grab #resultsRoot from the response
-    const parser = new DOMParser();
-    const doc = parser.parseFromString(html, 'text/html');
-    const newRoot = doc.getElementById('resultsRoot');
-    if (!newRoot) return;
+  // Prefetches carry no client id: the server would otherwise cancel one
+  // neighbour's query when the other one starts (see cancel_superseded).
+  function getFragment(u, prefetch) {
+    const key = canonicalKey(u);
+    const hit = cacheGet(key);
+    if (hit !== null) return Promise.resolve(hit);
+    if (inflight.has(key)) return inflight.get(key).p;
+    const ctrl = new AbortController();
+    const entry = { ctrl: ctrl, p: null };
+    const headers = prefetch
+      ? { 'X-Requested-With': 'XMLHttpRequest', 'X-RunQA-Prefetch': '1' }
+      : { 'X-Requested-With': 'XMLHttpRequest', 'X-RunQA-Client': CLIENT_ID,
+          'X-RunQA-Seq': nextClientSeq() };
+    entry.p = fetch(u.toString(), { signal: ctrl.signal, headers: headers })
+      .then((res) => (res.ok ? res.text() : null))
+      .then((html) => {
+        if (html === null) return null;
+        const doc = new DOMParser().parseFromString(html, 'text/html');
+        const root = doc.getElementById('resultsRoot');
+        if (!root) return null;
+        const frag = root.outerHTML;
+        if (inflight.get(key) === entry) cachePut(key, frag);
+        return frag;
+      })
+      .catch(() => null)   // includes AbortError
+      .finally(() => { if (inflight.get(key) === entry) inflight.delete(key); });
+    inflight.set(key, entry);
+    return entry.p;
+  }
+
+  // Abort every request except the one for `keepKey` (superseded keystrokes, stale prefetches)
+  function abortOthers(keepKey) {
+    for (const [key, entry] of Array.from(inflight.entries())) {
+      if (key === keepKey) continue;
+      entry.ctrl.abort();
+      inflight.delete(key);
+    }
+  }
+
+  // Warm the cache with the neighbouring pages once the browser is idle
+  function prefetchAdjacent() {
+    const idle = window.requestIdleCallback || ((fn) => setTimeout(fn, 200));
+    idle(() => {
+      ['Next page', 'Previous page'].forEach((label) => {
+        const a = document.querySelector('#resultsRoot .pager-links a[aria-label="' + label + '"]');
+        if (a) getFragment(new URL(a.href, window.location.href), true);
+      });
+    });
+  }
+
+  // Unfiltered pages show an estimated total ("of about N"); fetch the exact
+  // count after the rows are on screen and fix the summary and last-page links.
+  const exactTotals = new Map();   // count URL -> exact total
+  async function resolveApproxTotal() {
+    const sum = document.querySelector('#resultsRoot .pager-summary.approx[data-count-url]');
+    if (!sum) return;
+    const url = sum.getAttribute('data-count-url');
+    let total = exactTotals.get(url);
+    if (total === undefined) {
+      try {
+        const res = await fetch(url, { headers: { 'Accept': 'application/json' } });
+        const data = await res.json();
+        if (!res.ok || typeof data.total !== 'number') return;
+        total = data.total;
+        exactTotals.set(url, total);
+      } catch (_) { return; }
+    }
+    if (!sum.isConnected) return;
+    const pageSize = parseInt(sum.getAttribute('data-page-size'), 10) || 1;
+    const oldPages = sum.getAttribute('data-total-pages');
+    const pages = String(Math.max(1, Math.ceil(total / pageSize)));
+    sum.classList.remove('approx');
+    sum.innerHTML = sum.innerHTML.replace(/of about .*$/, 'of ' + total);
+    if (pages === oldPages) return;
+    document.querySelectorAll('#resultsRoot .pager-links a[href]').forEach((a) => {
+      const u = new URL(a.href, window.location.href);
+      if (u.searchParams.get('page') !== oldPages) return;
+      u.searchParams.set('page', pages);
+      a.href = u.toString();
+      if (a.textContent === oldPages) a.textContent = pages;
+    });
+  }
+
+  // --- AJAX page updater ---
+  async function loadResults(u, restore, focusInfo) {
+    const seq = ++navSeq;
+    abortOthers(canonicalKey(u));
+    const frag = await getFragment(u);
+    if (seq !== navSeq) return;   // a newer navigation owns the page now
+    if (frag === null) return;
 
     // Swap current #resultsRoot
+    const tpl = document.createElement('template');
+    tpl.innerHTML = frag;
+    const newRoot = tpl.content.firstElementChild;
     const curRoot = document.getElementById('resultsRoot');
-    if (curRoot) curRoot.replaceWith(newRoot);
+    if (curRoot && newRoot) curRoot.replaceWith(newRoot);
 
     // Update URL without reload
     history.replaceState(null, '', u.toString());
@@ -109,8 +227,53 @@ js = r'''
         }
       }
     }
+
+    prefetchAdjacent();
+    resolveApproxTotal();
+  }
+
+  async function hydrateResults(obj, restore) {
+    const u = buildURL(obj);
+    if (qsEquals(obj)) return; // nothing changed
+    // Stash focus/caret in panel
+    const ae = document.activeElement;
+    const focusInfo = (ae && ae.id && (ae === document.getElementById('f_notes') ||
+                                       ae === document.getElementById('f_run_number') ||
+                                       ae === document.getElementById('f_run_min') ||
+                                       ae === document.getElementById('f_run_max') ||
+                                       ae === document.getElementById('f_page_size') ||
+                                       ae === document.getElementById('f_cols'))) ? {
+      id: ae.id,
+      s: ('selectionStart' in ae ? ae.selectionStart : null),
+      e: ('selectionEnd'   in ae ? ae.selectionEnd   : null)
+    } : null;
+    await loadResults(u, restore, focusInfo);
   }
 
+  // Pagination and sort links swap #resultsRoot in place (cached pages are instant)
+  document.addEventListener('click', function(e){
+    const a = e.target && e.target.closest
+      ? e.target.closest('#resultsRoot .pager-links a[href], #resultsRoot a.sort-link[href]') : null;
+    if (!a || e.button !== 0 || e.ctrlKey || e.metaKey || e.shiftKey || e.altKey) return;
+    e.preventDefault();
+    loadResults(new URL(a.href, window.location.href), false, null);
+  });
+
+  document.addEventListener('DOMContentLoaded', function(){
+    const root = document.getElementById('resultsRoot');
+    if (root) {
+      // cache the view markup only: editors (and any unsaved input in them)
+      // are rebuilt from it by script.py when the fragment comes back
+      const copy = root.cloneNode(true);
+      copy.querySelectorAll('.cell-edit').forEach((e) => e.remove());
+      cachePut(canonicalKey(window.location.href), copy.outerHTML);
+    }
+    prefetchAdjacent();
+    resolveApproxTotal();
+  });
+
+  window.invalidateResultsCache = invalidateResultsCache;
+
   // --- Floating Panel state ---
   const LS_OPEN = 'rt_filter_open';
   const LS_POSX = 'rt_filter_x';
@@ -183,6 +346,14 @@ js = r'''
 
         <label><input id="f_track_ready" type="checkbox"> Tracking QA ready</label>
         <label><input id="f_calo_ready"  type="checkbox"> Calo QA ready</label>
+
+        <label>Began from<br><input id="f_begin_from" type="datetime-local" style="width:100%"></label>
+        <label>Began before<br><input id="f_begin_to" type="datetime-local" style="width:100%"></label>
+
+        <label>Duration ≥ (min)<br><input id="f_dur_min" type="number" min="0" style="width:100%"></label>
+        <label>Duration ≤ (min)<br><input id="f_dur_max" type="number" min="0" style="width:100%"></label>
+
+        <label style="grid-column: 1 / -1;">Only columns<br><input id="f_cols" type="text" placeholder="e.g. tpc,tpot (empty: all)" style="width:100%"></label>
       </div>
     `;
 
@@ -218,6 +389,11 @@ js = r'''
       f_subsys_class: 'subsys_class',
       f_track_ready: 'track_ready',
       f_calo_ready:  'calo_ready',
+      f_begin_from: 'begin_from',
+      f_begin_to: 'begin_to',
+      f_dur_min: 'dur_min',
+      f_dur_max: 'dur_max',
+      f_cols: 'cols',
     };
 
     // Init from current QS
@@ -260,7 +436,7 @@ js = r'''
     for (const id of Object.keys(controls)) {
       const el = document.getElementById(id);
       if (!el) continue;
-      const handler = (id === 'f_notes') ? applyNotes : applyGeneral;
+      const handler = (id === 'f_notes' || id === 'f_cols') ? applyNotes : applyGeneral;
       el.addEventListener('input', handler);
       el.addEventListener('change', handler);
     }
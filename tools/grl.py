@@ -0,0 +1,163 @@
+# tools/grl.py
+# Good-run lists: runs whose subsystems all have an accepted class, optionally
+# restricted by DAQ run type, duration and run range.
+#
+#   python -m tools.grl --require MVTX,INTT,TPC --type physics --dur-min 10
+#   python -m tools.grl --require MVTX,INTT,TPC --questionable --format intervals
+#   python -m tools.grl --require MVTX,INTT,TPC --check 53210
+#
+# grl.py serves the same lists over HTTP. Results are cached per criteria in
+# the page cache, so they are rebuilt after the next goodruns write.
+# Intervals are [first, last] run-number ranges in which every number is in
+# the list.
+
+import sys
+import json
+import argparse
+import hashlib
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from tools import page_cache
+from tools.db_backend import fetch_grl_runs, notice_new_runs
+from tools.params import COLUMNS, RUN_CLASSES
+
+RUN_TYPES = ("physics", "cosmics", "calibration")
+
+class Criteria:
+    """Validated GRL criteria; `name` is a stable id for caching and display."""
+
+    def __init__(self, subsystems: Sequence[str], classes: Sequence[str] = ("GOLDEN",),
+                 run_type: str = "", dur_min: Optional[int] = None, dur_max: Optional[int] = None,
+                 run_min: Optional[int] = None, run_max: Optional[int] = None):
+        by_lc = {c.lower(): c for c in COLUMNS}
+        subs = []
+        for s in subsystems:
+            s = s.strip()
+            if not s:
+                continue
+            if s.lower() not in by_lc:
+                raise ValueError(f"unknown subsystem {s!r} (expected one of {', '.join(COLUMNS)})")
+            if by_lc[s.lower()] not in subs:
+                subs.append(by_lc[s.lower()])
+        if not subs:
+            raise ValueError("require at least one subsystem")
+        cls = {c.strip().upper() for c in classes if c.strip()}
+        if not cls or not cls <= set(RUN_CLASSES):
+            raise ValueError(f"classes must be among {', '.join(RUN_CLASSES)}")
+        run_type = (run_type or "").strip().lower()
+        if run_type and run_type not in RUN_TYPES:
+            raise ValueError(f"run type must be one of {', '.join(RUN_TYPES)}")
+        self.subsystems = sorted(subs, key=COLUMNS.index)
+        self.classes = [c for c in RUN_CLASSES if c in cls]
+        self.run_type = run_type
+        self.dur_min, self.dur_max = dur_min, dur_max
+        self.run_min, self.run_max = run_min, run_max
+
+    def to_params(self) -> Dict[str, str]:
+        """Query-string form (grl.py); empty values are dropped by the caller."""
+        return {
+            "require": ",".join(s.lower() for s in self.subsystems),
+            "classes": ",".join(self.classes),
+            "type": self.run_type,
+            "dur_min": "" if self.dur_min is None else str(self.dur_min),
+            "dur_max": "" if self.dur_max is None else str(self.dur_max),
+            "run_min": "" if self.run_min is None else str(self.run_min),
+            "run_max": "" if self.run_max is None else str(self.run_max),
+        }
+
+    @property
+    def name(self) -> str:
+        return page_cache.canonical_query(self.to_params())
+
+class GRL:
+    """Sorted run list plus its intervals; `run in grl` is a bisect over intervals."""
+
+    def __init__(self, criteria: Criteria, runs: List[int]):
+        self.criteria = criteria
+        self.runs = runs
+        self.intervals = compress(runs)
+        self._starts = [a for a, _ in self.intervals]
+
+    def __contains__(self, run: int) -> bool:
+        i = bisect_right(self._starts, run) - 1
+        return i >= 0 and self.intervals[i][0] <= run <= self.intervals[i][1]
+
+    def __len__(self) -> int:
+        return len(self.runs)
+
+    def to_json(self) -> Dict:
+        return {"name": self.criteria.name, "criteria": self.criteria.to_params(),
+                "count": len(self.runs), "intervals": self.intervals, "runs": self.runs}
+
+def compress(runs: Sequence[int]) -> List[Tuple[int, int]]:
+    """Ascending run numbers -> [(first, last), ...] of consecutive numbers."""
+    out = []
+    for rn in runs:
+        if out and rn == out[-1][1] + 1:
+            out[-1] = (out[-1][0], rn)
+        else:
+            out.append((rn, rn))
+    return out
+
+def format_intervals(intervals: Sequence[Tuple[int, int]]) -> str:
+    return "\n".join(f"{a}" if a == b else f"{a}-{b}" for a, b in intervals)
+
+def build(criteria: Criteria, use_cache: bool = True) -> GRL:
+    """Evaluate criteria (one goodruns query plus one DAQ query when needed), cached per generation."""
+    key = "grl-" + hashlib.sha1(criteria.name.encode("utf-8")).hexdigest()
+    if use_cache:
+        notice_new_runs()
+        blob = page_cache.get_blob(key)
+        if blob is not None:
+            try:
+                return GRL(criteria, json.loads(blob))
+            except ValueError:
+                pass
+    gen = page_cache.generation()
+    runs = fetch_grl_runs(COLUMNS, criteria.subsystems, criteria.classes, criteria.run_type,
+                          criteria.dur_min, criteria.dur_max, criteria.run_min, criteria.run_max)
+    if use_cache:
+        try:
+            page_cache.put_blob(key, json.dumps(runs).encode("utf-8"), gen)
+        except OSError:
+            pass
+    return GRL(criteria, runs)
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m tools.grl", description="Generate a good-run list.")
+    ap.add_argument("--require", required=True, help="comma-separated subsystems, e.g. MVTX,INTT,TPC")
+    ap.add_argument("--questionable", action="store_true", help="accept QUESTIONABLE as well as GOLDEN")
+    ap.add_argument("--type", default="", choices=("",) + RUN_TYPES, help="DAQ run type")
+    ap.add_argument("--dur-min", type=int, help="minimum duration in minutes")
+    ap.add_argument("--dur-max", type=int, help="maximum duration in minutes")
+    ap.add_argument("--run-min", type=int)
+    ap.add_argument("--run-max", type=int)
+    ap.add_argument("--format", default="runs", choices=("runs", "intervals", "json"))
+    ap.add_argument("--check", type=int, metavar="RUN", help="only report whether RUN is in the list")
+    ap.add_argument("--no-cache", action="store_true")
+    args = ap.parse_args(argv)
+
+    try:
+        crit = Criteria(args.require.split(","),
+                        ("GOLDEN", "QUESTIONABLE") if args.questionable else ("GOLDEN",),
+                        args.type, args.dur_min, args.dur_max, args.run_min, args.run_max)
+    except ValueError as e:
+        ap.error(str(e))
+    grl = build(crit, use_cache=not args.no_cache)
+
+    if args.check is not None:
+        found = args.check in grl
+        print(f"run {args.check} {'is' if found else 'is not'} in GRL {crit.name}")
+        return 0 if found else 1
+    if args.format == "json":
+        print(json.dumps(grl.to_json()))
+    elif args.format == "intervals":
+        print(format_intervals(grl.intervals))
+    else:
+        print("\n".join(str(rn) for rn in grl.runs))
+    print(f"# {len(grl)} runs, {len(grl.intervals)} intervals: {crit.name}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
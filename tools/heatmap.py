@@ -0,0 +1,156 @@
+# tools/heatmap.py
+# Run × subsystem status heatmap: class-code grid -> palette PNG (no DB access).
+#
+# The grid holds one class code per (run, subsystem), as returned by
+# db_backend.fetch_class_codes. Runs are binned into at most `width` pixel
+# columns and each pixel shows the worst run in its bin, so a single BAD or
+# unclassified run is never averaged away. NumPy is used when installed (pip
+# install numpy); the pure-Python path gives the same image, only slower.
+
+import json
+import struct
+import zlib
+import html as _html
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import numpy as np  # optional
+except ImportError:
+    np = None
+
+# class code (0 unset, 1 GOLDEN, 2 QUESTIONABLE, 3 BAD) -> severity / palette index
+SEVERITY = (2, 0, 1, 3)
+# severity -> (label, RGB): GOLDEN < QUESTIONABLE < unset < BAD
+LEGEND = (
+    ("Golden", (0x5c, 0xb8, 0x5c)),
+    ("Questionable", (0x00, 0x00, 0x00)),
+    ("Not set", (0xdd, 0xdd, 0xdd)),
+    ("Bad", (0xd9, 0x35, 0x35)),
+)
+_SEPARATOR = len(LEGEND)          # palette index of the line between subsystem rows
+_PALETTE = [rgb for _, rgb in LEGEND] + [(0xff, 0xff, 0xff)]
+
+ROW_HEIGHT = 14                   # pixels per subsystem row (last one is the separator)
+WIDTH_DEFAULT = 1200
+WIDTH_MAX = 4000
+
+class Grid:
+    """
+    Binned heatmap data.
+      runs:  ascending run numbers covered
+      edges: first run of each pixel column, plus the last run (len = bins + 1)
+      cells: bins x subsystems severities, row-major bytes
+    """
+    def __init__(self, runs: Sequence[int], edges: List[int], cells: bytes, ncols: int):
+        self.runs = runs
+        self.edges = edges
+        self.cells = cells
+        self.ncols = ncols
+
+    @property
+    def bins(self) -> int:
+        return len(self.edges) - 1
+
+def build_grid(rows: Sequence[Tuple[int, ...]], width: int = WIDTH_DEFAULT) -> Optional[Grid]:
+    """rows: (runnumber, code, code, ...) ascending; returns None when there are no runs."""
+    n = len(rows)
+    if n == 0:
+        return None
+    ncols = len(rows[0]) - 1
+    bins = min(n, max(1, width))
+    starts = [i * n // bins for i in range(bins)]
+
+    if np is not None:
+        arr = np.asarray(rows, dtype=np.int64)
+        runs = arr[:, 0]
+        sev = np.asarray(SEVERITY, dtype=np.uint8)[np.clip(arr[:, 1:], 0, 3)]
+        cells = np.maximum.reduceat(sev, np.asarray(starts), axis=0).astype(np.uint8).tobytes()
+        edges = [int(runs[i]) for i in starts] + [int(runs[-1])]
+        return Grid(runs.tolist(), edges, cells, ncols)
+
+    runs = [r[0] for r in rows]
+    out = bytearray(bins * ncols)
+    for b in range(bins):
+        lo, hi = starts[b], (starts[b + 1] if b + 1 < bins else n)
+        for c in range(ncols):
+            worst = 0
+            for r in rows[lo:hi]:
+                s = SEVERITY[r[c + 1] if 0 <= r[c + 1] <= 3 else 0]
+                if s > worst:
+                    worst = s
+                    if s == 3:
+                        break
+            out[b * ncols + c] = worst
+    edges = [runs[i] for i in starts] + [runs[-1]]
+    return Grid(runs, edges, bytes(out), ncols)
+
+def _png_chunk(tag: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff)
+
+def render_png(grid: Grid, xscale: int = 1, row_height: int = ROW_HEIGHT) -> bytes:
+    """8-bit palette PNG: one row band per subsystem, one xscale-wide column per bin."""
+    bins, ncols = grid.bins, grid.ncols
+    w, h = bins * xscale, ncols * row_height
+    sep_line = b"\x00" + bytes([_SEPARATOR]) * w
+    lines = []
+    for c in range(ncols):
+        if np is not None:
+            band = np.frombuffer(grid.cells, dtype=np.uint8).reshape(bins, ncols)[:, c]
+            line = b"\x00" + np.repeat(band, xscale).tobytes()
+        else:
+            line = b"\x00" + b"".join(bytes([grid.cells[b * ncols + c]]) * xscale for b in range(bins))
+        lines.append(line * (row_height - 1) + sep_line)
+    raw = b"".join(lines)
+    plte = b"".join(bytes(rgb) for rgb in _PALETTE)
+    return (b"\x89PNG\r\n\x1a\n"
+            + _png_chunk(b"IHDR", struct.pack(">IIBBBBB", w, h, 8, 3, 0, 0, 0))
+            + _png_chunk(b"PLTE", plte)
+            + _png_chunk(b"IDAT", zlib.compress(raw, 6))
+            + _png_chunk(b"IEND", b""))
+
+def xscale_for(grid: Grid, width: int) -> int:
+    """Stretch short ranges so a zoomed tile still fills the requested width."""
+    return max(1, width // max(1, grid.bins))
+
+def render_page(grid: Optional[Grid], columns: List[str], img_qs: str, width: int,
+                run_min: Optional[int], run_max: Optional[int]) -> str:
+    """HTML body for heatmap.py: navigation, legend, subsystem labels and the image."""
+    legend = "".join(
+        f"<span class='hm-key'><span class='hm-swatch' style='background:#{r:02x}{g:02x}{b:02x}'></span>"
+        f"{_html.escape(label)}</span>"
+        for label, (r, g, b) in LEGEND
+    )
+    out = ["<div class='hm-controls'>",
+           "<a class='btn' href='all.py'>&larr; Run table</a>",
+           "<a class='btn' href='heatmap.py'>Full history</a>"]
+    if grid is not None and (run_min is not None or run_max is not None):
+        lo, hi = grid.edges[0], grid.edges[-1]
+        span = max(1, hi - lo)
+        out.append(f"<a class='btn' href='heatmap.py?run_min={max(0, lo - span)}&amp;run_max={hi + span}'>Zoom out</a>")
+        out.append(f"<a class='btn' href='heatmap.py?run_min={max(0, lo - span // 2)}&amp;run_max={max(0, hi - span // 2)}'>&lsaquo; Earlier</a>")
+        out.append(f"<a class='btn' href='heatmap.py?run_min={lo + span // 2}&amp;run_max={hi + span // 2}'>Later &rsaquo;</a>")
+    out.append(f"<span class='hm-legend'>{legend}</span></div>")
+
+    if grid is None:
+        out.append("<p>No runs in this range.</p>")
+        return "\n".join(out)
+
+    out.append(
+        f"<p class='hm-range'>Runs {grid.edges[0]}–{grid.edges[-1]} "
+        f"({len(grid.runs):,} runs, {grid.bins:,} columns; each pixel shows the worst run it covers). "
+        "Click a column to open those runs in the table; drag across the image to zoom.</p>"
+    )
+    labels = "".join(f"<div class='hm-label' style='height:{ROW_HEIGHT}px'>{_html.escape(c)}</div>" for c in columns)
+    xscale = xscale_for(grid, width)
+    out.append(
+        "<div class='hm-wrap'>"
+        f"<div class='hm-labels'>{labels}</div>"
+        "<div class='hm-scroll'>"
+        f"<img id='hmImg' class='hm-img' src='heatmap.py?{_html.escape(img_qs)}' "
+        f"width='{grid.bins * xscale}' height='{len(columns) * ROW_HEIGHT}' alt='Run status heatmap' "
+        f"data-edges='{json.dumps(grid.edges)}' data-xscale='{xscale}' data-row-height='{ROW_HEIGHT}' "
+        f"data-cols='{_html.escape(','.join(c.lower() for c in columns))}'>"
+        "<div id='hmTip' class='hm-tip' hidden></div>"
+        "</div></div>"
+    )
+    return "\n".join(out)
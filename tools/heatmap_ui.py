@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+# Emits JS for heatmap.py: hover tooltip, click-through to the run table, drag to zoom.
+import os, sys, io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.response import start_response
+
+start_response("application/javascript; charset=utf-8")
+
+js = r'''
+(function(){
+  "use strict";
+
+  function initHeatmap() {
+    const img = document.getElementById("hmImg");
+    if (!img) return;
+    const edges = JSON.parse(img.getAttribute("data-edges") || "[]");
+    const xscale = parseInt(img.getAttribute("data-xscale"), 10) || 1;
+    const rowH = parseInt(img.getAttribute("data-row-height"), 10) || 14;
+    const cols = (img.getAttribute("data-cols") || "").split(",");
+    const tip = document.getElementById("hmTip");
+    const bins = edges.length - 1;
+
+    function binAt(x) { return Math.max(0, Math.min(bins - 1, Math.floor(x / xscale))); }
+    // run range [first, last] shown by pixel column b
+    function rangeOf(b) {
+      const last = b + 1 < bins ? edges[b + 1] - 1 : edges[bins];
+      return [edges[b], Math.max(edges[b], last)];
+    }
+    function pos(e) {
+      const r = img.getBoundingClientRect();
+      return { x: (e.clientX - r.left) * img.naturalWidth / r.width,
+               y: (e.clientY - r.top) * img.naturalHeight / r.height };
+    }
+
+    img.addEventListener("mousemove", (e) => {
+      const p = pos(e), rg = rangeOf(binAt(p.x));
+      const col = cols[Math.min(cols.length - 1, Math.floor(p.y / rowH))] || "";
+      tip.textContent = col.toUpperCase() + "  runs " + (rg[0] === rg[1] ? rg[0] : rg[0] + "–" + rg[1]);
+      tip.style.left = (e.offsetX + 12) + "px";
+      tip.style.top = (e.offsetY + 12) + "px";
+      tip.hidden = false;
+    });
+    img.addEventListener("mouseleave", () => { tip.hidden = true; });
+
+    // Drag selects a run range to zoom into; a plain click opens the table
+    let down = null;
+    img.addEventListener("mousedown", (e) => { down = pos(e); e.preventDefault(); });
+    img.addEventListener("mouseup", (e) => {
+      if (!down) return;
+      const up = pos(e), start = down;
+      down = null;
+      if (Math.abs(up.x - start.x) > 4) {
+        const a = rangeOf(binAt(Math.min(start.x, up.x)))[0];
+        const b = rangeOf(binAt(Math.max(start.x, up.x)))[1];
+        window.location.href = "heatmap.py?run_min=" + a + "&run_max=" + b;
+        return;
+      }
+      const rg = rangeOf(binAt(up.x));
+      const col = cols[Math.min(cols.length - 1, Math.floor(up.y / rowH))] || "";
+      // sorted by that subsystem's class so its BAD runs come first
+      window.location.href = "all.py?run_min=" + rg[0] + "&run_max=" + rg[1] +
+        (col ? "&sort=" + encodeURIComponent(col) : "");
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", initHeatmap);
+})();
+'''
+print(js)
@@ -1,8 +1,11 @@
 #!/usr/bin/python3
 # Emits JS that builds a floating Help/Hotkeys window; opens via Ctrl+/ or button.
-import sys, io
+import os, sys, io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
-print("Content-Type: application/javascript; charset=utf-8\r\n\r\n")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.response import start_response
+
+start_response("application/javascript; charset=utf-8")
 
 js = r'''
 (function(){
@@ -0,0 +1,64 @@
+# tools/import_csv.py
+# Bulk import of run classifications from a CSV file.
+#
+#   python -m tools.import_csv classifications.csv [--dry-run]
+#
+# The file needs the header line runnumber,subsystem,class,notes, in that
+# order (standard CSV quoting; notes may be empty). Rows are COPY'd into a
+# staging table and merged into goodruns in one transaction by
+# db_backend.import_classifications, so an invalid file changes nothing;
+# every problem is reported with its CSV line number.
+
+import sys
+import argparse
+
+from tools.db_backend import import_classifications
+from tools.params import COLUMNS, RUN_CLASSES
+from tools.templates import parse_cell
+
+def _fmt_old(old_text):
+    # composite text form, e.g. (GOLDEN,"some note")
+    rc, notes = parse_cell(old_text)
+    return rc or "-", notes or ""
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m tools.import_csv",
+                                 description="Import run classifications from CSV into goodruns.")
+    ap.add_argument("csv", help="CSV file with header: runnumber,subsystem,class,notes ('-' for stdin)")
+    ap.add_argument("--dry-run", action="store_true", help="show the changes without writing them")
+    ap.add_argument("--quiet", action="store_true", help="print only the summary")
+    args = ap.parse_args(argv)
+
+    f = sys.stdin if args.csv == "-" else open(args.csv, encoding="utf-8", newline="")
+    try:
+        report = import_classifications(f, COLUMNS, RUN_CLASSES, dry_run=args.dry_run)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    if report["errors"]:
+        for line, msg in report["errors"]:
+            print(f"line {line}: {msg}", file=sys.stderr)
+        print(f"{len(report['errors'])} error(s) in {report['rows']} rows; nothing imported",
+              file=sys.stderr)
+        return 1
+
+    if not args.quiet:
+        for rn, col, old, rc, notes in report["changes"]:
+            old_rc, old_notes = _fmt_old(old)
+            line = f"{rn:>8}  {col:<6} {old_rc:<12} -> {rc:<12}"
+            if notes != old_notes:
+                line += f"  notes: {old_notes!r} -> {notes!r}"
+            print(line)
+
+    n = len(report["changes"])
+    if args.dry_run:
+        print(f"dry run: {report['rows']} rows read, {n} cell(s) would change")
+    elif report["applied"]:
+        print(f"{report['rows']} rows read, {n} cell(s) updated")
+    else:
+        print(f"{report['rows']} rows read, nothing to change")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
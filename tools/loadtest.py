@@ -0,0 +1,633 @@
+# tools/loadtest.py
+# End-to-end load test on one Linux box: synthetic goodruns and DAQ run tables
+# in a throwaway PostgreSQL, a synthetic QAHtml tree, a local CGI server, and
+# concurrent shifter traffic against all.py and rows.py.
+#
+#   python -m tools.loadtest seed  [--dir /tmp/runqa-loadtest] [--runs 40000]
+#   python -m tools.loadtest run   [--concurrency 16] [--duration 60] [--mix mixed] [--filters mixed]
+#   python -m tools.loadtest serve [--port 8080]      # browse the synthetic data
+#   python -m tools.loadtest stop                     # stop the test cluster
+#
+# Everything lives under --dir: pgdata/ (a cluster made with initdb and started
+# by pg_ctl on a unix socket only), qahtml/ and onlhtml/ (the QA trees the
+# page checks for), cache/ (page cache), server.log (CGI stderr), access.log
+# (see tools/accesslog.py: `report --file` breaks a run down by filter shape)
+# and state.json. With --dsn [--daq-dsn] seed fills an existing, empty test
+# database instead of creating a cluster. `run --url` drives an already
+# deployed copy (e.g. Apache on a test host pointed at the seeded database)
+# instead of the built-in server.
+#
+# The built-in server runs each request as a fresh CGI process, as the
+# production web server does, so latencies include interpreter start-up. It
+# does not stream responses, so events.py is not part of the mix.
+
+import io
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import itertools
+import subprocess
+import threading
+import urllib.parse
+import http.client
+import datetime as dt
+from glob import glob
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import psycopg2
+
+from tools.accesslog import percentile
+from tools.params import COLUMNS, RUN_CLASSES
+from tools.templates import _bin_dir  # same directory layout as the page's QA links
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DIR = "/tmp/runqa-loadtest"
+PG_USER = "runqa"
+PG_PORT = 55432
+
+# ---------- synthetic data ----------
+FIRST_RUN = 40000
+START = dt.datetime(2024, 4, 1, 8, 0)
+RUN_TYPES = (("physics", 70), ("cosmics", 18), ("calibration", 12))
+DURATION_MINUTES = {"physics": (5, 90), "cosmics": (10, 240), "calibration": (1, 15)}
+# (class, weight); None is an unset cell. Calibration runs are mostly unset.
+CLASS_MIX = {
+    "physics":     ((None, 8), ("GOLDEN", 72), ("QUESTIONABLE", 12), ("BAD", 8)),
+    "cosmics":     ((None, 20), ("GOLDEN", 60), ("QUESTIONABLE", 12), ("BAD", 8)),
+    "calibration": ((None, 50), ("GOLDEN", 40), ("QUESTIONABLE", 6), ("BAD", 4)),
+}
+# plain words only: written into composite literals without escaping
+NOTES = ("laser off", "hv trip", "noisy channels", "timing shift", "low rate",
+         "beam abort", "dead sector", "pedestal drift", "missing packets")
+MISSING_DAQ = 0.01      # goodruns rows without a DAQ run row
+PNG_STUB = b"\x89PNG\r\n\x1a\n"  # existence is all the page checks
+
+def _pick(rng: random.Random, weighted) -> Any:
+    values, weights = zip(*weighted)
+    return rng.choices(values, weights)[0]
+
+def synthetic_runs(n: int, first_run: int = FIRST_RUN, seed: int = 1) -> Iterator[Tuple]:
+    """Yield (runnumber, runtype, begin, end, in_daq, cells); cells[i] is (class, notes) or None."""
+    rng = random.Random(seed)
+    rn, t = first_run, START
+    for _ in range(n):
+        rt = _pick(rng, RUN_TYPES)
+        lo, hi = DURATION_MINUTES[rt]
+        end = t + dt.timedelta(seconds=rng.randint(lo * 60, hi * 60))
+        cells = []
+        for _col in COLUMNS:
+            rc = _pick(rng, CLASS_MIX[rt])
+            if rc is None:
+                cells.append(None)
+            else:
+                noted = rng.random() < (0.05 if rc == "GOLDEN" else 0.6)
+                cells.append((rc, rng.choice(NOTES) if noted else None))
+        yield rn, rt, t, end, rng.random() >= MISSING_DAQ, cells
+        t = end + dt.timedelta(seconds=rng.randint(60, 600))
+        rn += 1 if rng.random() > 0.02 else rng.randint(2, 10)
+
+def _cell_text(cell) -> str:
+    """COPY text form of a (runclass, notes) composite."""
+    if cell is None:
+        return r"\N"
+    rc, notes = cell
+    return f"({rc},)" if notes is None else f'({rc},"{notes}")'
+
+# ---------- local cluster ----------
+def _pg_bin(name: str) -> str:
+    # Debian/Ubuntu and PGDG RPMs keep the server binaries off PATH
+    found = shutil.which(name)
+    if not found:
+        candidates = sorted(glob(f"/usr/lib/postgresql/*/bin/{name}") + glob(f"/usr/pgsql-*/bin/{name}"))
+        found = candidates[-1] if candidates else None
+    if not found:
+        raise SystemExit(f"{name} not found; install the PostgreSQL server or seed with --dsn")
+    return found
+
+def _socket_dsn(pgdata: str, port: int, dbname: str) -> str:
+    return f"host={pgdata} port={port} user={PG_USER} dbname={dbname}"
+
+def start_cluster(pgdata: str, port: int) -> None:
+    """initdb on first use, then pg_ctl start (no-op when already running)."""
+    if not os.path.exists(os.path.join(pgdata, "PG_VERSION")):
+        os.makedirs(pgdata, exist_ok=True)
+        subprocess.run([_pg_bin("initdb"), "-D", pgdata, "-U", PG_USER, "-A", "trust",
+                        "-E", "UTF8", "--no-locale"], check=True, stdout=subprocess.DEVNULL)
+    pg_ctl = _pg_bin("pg_ctl")
+    if subprocess.run([pg_ctl, "-D", pgdata, "status"], stdout=subprocess.DEVNULL).returncode == 0:
+        return
+    # unix socket in pgdata only; every CGI process opens its own connections
+    opts = f"-k {pgdata} -p {port} -c listen_addresses='' -c max_connections=400"
+    subprocess.run([pg_ctl, "-D", pgdata, "-l", os.path.join(pgdata, "postgres.log"),
+                    "-w", "-o", opts, "start"], check=True, stdout=subprocess.DEVNULL)
+
+def stop_cluster(pgdata: str) -> None:
+    subprocess.run([_pg_bin("pg_ctl"), "-D", pgdata, "-m", "fast", "stop"], check=False)
+
+# ---------- seeding ----------
+def _create_schema(conn, daq_conn, replace: bool) -> None:
+    with conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('goodruns') IS NOT NULL")
+        if cur.fetchone()[0] and not replace:
+            raise SystemExit("goodruns already exists in the target database; pass --replace to drop it")
+        cur.execute("DROP TABLE IF EXISTS goodruns, goodruns_changes; DROP TYPE IF EXISTS runqa_cell")
+        cur.execute("CREATE TYPE runqa_cell AS (runclass text, notes text)")
+        cols = ", ".join(f"{c.lower()} runqa_cell" for c in COLUMNS)
+        cur.execute(f"CREATE TABLE goodruns (runnumber integer PRIMARY KEY, {cols})")
+    with daq_conn.cursor() as cur:
+        cur.execute("SELECT to_regclass('run') IS NOT NULL")
+        if cur.fetchone()[0] and not replace:
+            raise SystemExit("run already exists in the DAQ database; pass --replace to drop it")
+        cur.execute("DROP TABLE IF EXISTS run")
+        cur.execute("CREATE TABLE run (runnumber integer PRIMARY KEY, runtype text, "
+                    "brtimestamp timestamp, ertimestamp timestamp)")
+
+def _copy(cur, table: str, lines: List[str]) -> None:
+    cur.copy_expert(f"COPY {table} FROM STDIN", io.StringIO("".join(lines)))
+    lines.clear()
+
+def seed_database(dsn: str, daq_dsn: str, runs: List[Tuple], replace: bool = False) -> None:
+    """Create and fill goodruns / run, build the indexes from sql/indexes.sql and the change log."""
+    conn, daq_conn = psycopg2.connect(dsn), psycopg2.connect(daq_dsn)
+    try:
+        _create_schema(conn, daq_conn, replace)
+        good, daq = [], []
+        with conn.cursor() as cur, daq_conn.cursor() as dcur:
+            for rn, rt, begin, end, in_daq, cells in runs:
+                good.append("\t".join([str(rn)] + [_cell_text(c) for c in cells]) + "\n")
+                if in_daq:
+                    daq.append(f"{rn}\t{rt}\t{begin:%Y-%m-%d %H:%M:%S}\t{end:%Y-%m-%d %H:%M:%S}\n")
+                if len(good) >= 10000:
+                    _copy(cur, "goodruns", good)
+                    _copy(dcur, "run (runnumber, runtype, brtimestamp, ertimestamp)", daq)
+            _copy(cur, "goodruns", good)
+            _copy(dcur, "run (runnumber, runtype, brtimestamp, ertimestamp)", daq)
+        conn.commit()
+        daq_conn.commit()
+
+        conn.autocommit = daq_conn.autocommit = True
+        for script in ("indexes.sql", "changes.sql"):
+            with open(os.path.join(REPO_ROOT, "sql", script), encoding="utf-8") as f:
+                with conn.cursor() as cur:
+                    cur.execute(f.read())
+        with daq_conn.cursor() as cur:
+            # the DAQ part of sql/indexes.sql (commented there: different database)
+            cur.execute("CREATE INDEX IF NOT EXISTS run_brtimestamp_idx ON run (brtimestamp, runnumber)")
+            cur.execute("CREATE INDEX IF NOT EXISTS run_duration_idx ON run ((ertimestamp - brtimestamp))")
+            cur.execute("ANALYZE run")
+    finally:
+        conn.close()
+        daq_conn.close()
+
+def build_qa_tree(runs: List[Tuple], qa_root: str, onl_root: str, seed: int = 1) -> int:
+    """Offline/online QA directories for most runs; QA-ready PNGs for some physics runs."""
+    rng = random.Random(seed + 1)
+    made = 0
+    for rn, rt, _begin, _end, in_daq, _cells in runs:
+        if not in_daq:
+            continue
+        if rng.random() < 0.85:
+            d = os.path.join(qa_root, rt, _bin_dir(rn), f"{rn:05d}")
+            os.makedirs(d, exist_ok=True)
+            with open(os.path.join(d, "menu.html"), "w") as f:
+                f.write(f"<html><body>run {rn}</body></html>\n")
+            if rt == "physics" and rng.random() < 0.6:
+                with open(os.path.join(d, f"TpcLasersQA_1_{rn:05d}.png"), "wb") as f:
+                    f.write(PNG_STUB)
+            if rt == "physics" and rng.random() < 0.7:
+                with open(os.path.join(d, f"CaloQA_cemc1_{rn}.png"), "wb") as f:
+                    f.write(PNG_STUB)
+            made += 1
+        if rng.random() < 0.9:
+            d = os.path.join(onl_root, rt, _bin_dir(rn), f"{rn:05d}")
+            os.makedirs(d, exist_ok=True)
+            with open(os.path.join(d, "menu.html"), "w") as f:
+                f.write(f"<html><body>online run {rn}</body></html>\n")
+    return made
+
+# ---------- state ----------
+def _state_path(workdir: str) -> str:
+    return os.path.join(workdir, "state.json")
+
+def load_state(workdir: str) -> Dict[str, Any]:
+    try:
+        with open(_state_path(workdir), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise SystemExit(f"no seeded data in {workdir}; run `python -m tools.loadtest seed` first")
+
+def app_env(state: Dict[str, Any], cache: bool = True) -> Dict[str, str]:
+    """Environment for the CGI scripts: local databases, QA trees and page cache."""
+    env = dict(os.environ)
+    for k in ("RUNQA_DB_READ_DSN", "RUNQA_DB_READ_HOST"):
+        env.pop(k, None)
+    env.update({
+        "RUNQA_DB_DSN": state["dsn"],
+        "RUNQA_DAQ_DB_DSN": state["daq_dsn"],
+        "RUNQA_QA_FS_BASE": state["qa_fs"],
+        "RUNQA_ONL_FS_BASE": state["onl_fs"],
+        "RUNQA_CACHE_DIR": state["cache_dir"],
+        "RUNQA_ACCESS_LOG": state.get("access_log", ""),
+        "RUNQA_METRICS_FILE": os.path.join(os.path.dirname(state["cache_dir"]), "metrics.json"),
+        "PYTHONWARNINGS": "ignore::DeprecationWarning",  # keep server.log to real errors
+    })
+    if not cache:
+        env["RUNQA_CACHE_FRESH_SECONDS"] = env["RUNQA_CACHE_STALE_SECONDS"] = "0"
+    return env
+
+# ---------- CGI server ----------
+class CGIHandler(BaseHTTPRequestHandler):
+    """Runs REPO_ROOT/<path>.py as a CGI process per request (all headers passed as HTTP_*)."""
+
+    env: Dict[str, str] = {}
+    log_file = None
+    _log_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path, _, query = self.path.partition("?")
+        rel = urllib.parse.unquote(path).lstrip("/")
+        script = os.path.realpath(os.path.join(REPO_ROOT, rel))
+        if not (script.startswith(REPO_ROOT + os.sep) and script.endswith(".py")
+                and os.path.isfile(script)):
+            self.send_error(404)
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        env = dict(self.env)
+        env.update({
+            "GATEWAY_INTERFACE": "CGI/1.1",
+            "SERVER_PROTOCOL": self.request_version,
+            "SERVER_SOFTWARE": self.version_string(),
+            "SERVER_NAME": "localhost",
+            "SERVER_PORT": str(self.server.server_port),
+            "REMOTE_ADDR": self.client_address[0],
+            "REQUEST_METHOD": self.command,
+            "SCRIPT_NAME": "/" + rel,
+            "QUERY_STRING": query,
+            "CONTENT_TYPE": self.headers.get("Content-Type", ""),
+            "CONTENT_LENGTH": str(length),
+        })
+        for k, v in self.headers.items():
+            env["HTTP_" + k.upper().replace("-", "_")] = v
+        proc = subprocess.run([sys.executable, script], input=body, env=env,
+                              cwd=os.path.dirname(script), capture_output=True)
+        if proc.stderr and self.log_file:
+            with self._log_lock:
+                self.log_file.write(f"--- {self.command} {self.path} (exit {proc.returncode})\n")
+                self.log_file.write(proc.stderr.decode("utf-8", "replace"))
+                self.log_file.flush()
+
+        head, sep, out = proc.stdout.partition(b"\r\n\r\n")
+        if not sep:
+            head, sep, out = proc.stdout.partition(b"\n\n")
+        if not sep:
+            self.send_error(502, "script produced no header block")
+            return
+        status, reason, headers = 200, "OK", []
+        for line in head.decode("latin-1").splitlines():
+            k, _, v = line.partition(":")
+            if k.strip().lower() == "status":
+                code, _, reason = v.strip().partition(" ")
+                status = int(code)
+            elif k.strip():
+                headers.append((k.strip(), v.strip()))
+        self.send_response(status, reason or None)
+        for k, v in headers:
+            self.send_header(k, v)
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    do_POST = do_GET
+
+def make_server(env: Dict[str, str], log_path: str, port: int = 0) -> ThreadingHTTPServer:
+    handler = type("Handler", (CGIHandler,), {"env": env, "log_file": open(log_path, "a")})
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+    server.request_queue_size = 128
+    return server
+
+# ---------- traffic ----------
+# request kind -> weight
+MIXES = {
+    "read":  {"page": 45, "fragment": 30, "rows": 20, "count": 5},
+    "mixed": {"page": 40, "fragment": 25, "rows": 15, "count": 5, "save": 12, "bulk_preview": 3},
+    "write": {"page": 20, "fragment": 15, "rows": 5, "save": 50, "bulk_preview": 10},
+}
+# filter shape -> weight
+FILTER_MIXES = {
+    "browse": {"none": 60, "range": 30, "class": 10},
+    "mixed":  {"none": 25, "range": 20, "class": 10, "subsys": 10, "run_type": 10,
+               "notes": 5, "begin": 5, "duration": 5, "sort": 5, "ready": 5},
+    "heavy":  {"notes": 25, "begin": 20, "duration": 15, "sort": 25, "ready": 15},
+}
+
+class Traffic:
+    """Random requests shaped like the browser's, over the seeded run range and time span."""
+
+    def __init__(self, state: Dict[str, Any], mix: str, filters: str):
+        self.run_first, self.run_last = state["run_first"], state["run_last"]
+        self.t_first = dt.datetime.fromisoformat(state["begin_first"])
+        self.t_last = dt.datetime.fromisoformat(state["begin_last"])
+        self.kinds = list(MIXES[mix].items())
+        self.shapes = list(FILTER_MIXES[filters].items())
+
+    def _filters(self, rng: random.Random) -> Dict[str, str]:
+        shape = _pick(rng, self.shapes)
+        if shape == "range":
+            lo = rng.randint(self.run_first, self.run_last)
+            return {"run_min": str(lo), "run_max": str(lo + rng.choice((100, 500, 2000)))}
+        if shape == "class":
+            return {"require_class": rng.choice(RUN_CLASSES)}
+        if shape == "subsys":
+            return {"subsys": rng.choice(COLUMNS), "subsys_class": rng.choice(RUN_CLASSES)}
+        if shape == "run_type":
+            return {"run_type": _pick(rng, RUN_TYPES)}
+        if shape == "notes":
+            return {"notes_contains": rng.choice(NOTES).split()[0]}
+        if shape == "begin":
+            span = (self.t_last - self.t_first).total_seconds()
+            a = self.t_first + dt.timedelta(seconds=rng.uniform(0, span))
+            b = a + dt.timedelta(days=rng.choice((1, 7, 30)))
+            return {"begin_from": a.strftime("%Y-%m-%dT%H:%M"), "begin_to": b.strftime("%Y-%m-%dT%H:%M")}
+        if shape == "duration":
+            return {"dur_min": str(rng.choice((10, 30, 60)))}
+        if shape == "sort":
+            return {"sort": rng.choice(("begin", "duration", rng.choice(COLUMNS).lower())),
+                    "dir": rng.choice(("", "asc"))}
+        if shape == "ready":
+            return {rng.choice(("track_ready", "calo_ready")): "1"}
+        return {}
+
+    def _page_params(self, rng: random.Random) -> Dict[str, str]:
+        p = self._filters(rng)
+        p["page_size"] = str(_pick(rng, ((15, 70), (50, 20), (100, 10))))
+        if rng.random() < 0.3:
+            p["page"] = str(rng.randint(2, 20))
+        return p
+
+    def request(self, rng: random.Random, client: str) -> Tuple[str, str, str, Optional[bytes], Dict[str, str]]:
+        """returns: (kind, method, path?query, body, headers)"""
+        kind = _pick(rng, self.kinds)
+        headers = {"Accept-Encoding": "gzip"}
+        if kind in ("page", "fragment"):
+            qs = urllib.parse.urlencode(self._page_params(rng))
+            if kind == "fragment":
+                # filter_ui.js refreshing #resultsRoot
+                headers.update({"X-Requested-With": "XMLHttpRequest", "X-RunQA-Client": client,
+                                "X-RunQA-Seq": str(time.time_ns() // 1000)})
+            return kind, "GET", f"all.py?{qs}", None, headers
+        headers["Accept"] = "application/json"
+        if kind == "rows":
+            p = self._filters(rng)
+            p.update(offset=str(rng.choice((0, 0, 500, 1000, 5000))), limit="500")
+            return kind, "GET", "rows.py?" + urllib.parse.urlencode(p), None, headers
+        if kind == "count":
+            p = self._filters(rng)
+            p.update(limit="0", count="1")
+            return kind, "GET", "rows.py?" + urllib.parse.urlencode(p), None, headers
+        headers.update({"X-Requested-With": "XMLHttpRequest",
+                        "Content-Type": "application/x-www-form-urlencoded"})
+        col = rng.choice(COLUMNS)
+        if kind == "save":
+            # script.py posts only the edited cells
+            form = {}
+            for _ in range(_pick(rng, ((1, 70), (2, 20), (5, 10)))):
+                rn = rng.randint(self.run_first, self.run_last)
+                form[f"runclass_{col}_{rn}"] = rng.choice(RUN_CLASSES)
+                form[f"notes_{col}_{rn}"] = f"loadtest {client}"
+        else:
+            lo = rng.randint(self.run_first, self.run_last)
+            form = {"action": "bulk_preview", "scope": "range", "bulk_col": col,
+                    "bulk_class": rng.choice(RUN_CLASSES), "bulk_min": str(lo),
+                    "bulk_max": str(lo + rng.choice((50, 200, 1000)))}
+        return kind, "POST", "all.py", urllib.parse.urlencode(form).encode("ascii"), headers
+
+def _send(base: urllib.parse.SplitResult, method: str, target: str, body: Optional[bytes],
+          headers: Dict[str, str], timeout: float) -> Tuple[int, int, Optional[str]]:
+    """One request on a fresh connection; returns (status, body bytes, Set-Cookie)."""
+    cls = http.client.HTTPSConnection if base.scheme == "https" else http.client.HTTPConnection
+    conn = cls(base.hostname, base.port, timeout=timeout)
+    try:
+        conn.request(method, base.path.rstrip("/") + "/" + target, body=body, headers=headers)
+        res = conn.getresponse()
+        data = res.read()
+        return res.status, len(data), res.getheader("Set-Cookie")
+    finally:
+        conn.close()
+
+def drive(url: str, traffic: Traffic, concurrency: int, duration: float, max_requests: int = 0,
+          warmup: float = 0.0, think: float = 0.0, timeout: float = 60.0, seed: int = 1):
+    """
+    Closed-loop load: `concurrency` simulated shifters each send a request, wait
+    for the whole response, optionally think, and repeat.
+    returns: (samples, window seconds); samples are (kind, status, seconds, bytes),
+             status 0 for a transport error
+    """
+    base = urllib.parse.urlsplit(url)
+    samples: List[Tuple[str, int, float, int]] = []
+    issued = itertools.count()
+    t0 = time.monotonic()
+    measure_from, deadline = t0 + warmup, t0 + warmup + duration
+
+    def shifter(i: int) -> None:
+        rng = random.Random(seed * 1000 + i)
+        client, cookie = f"lt{i}", None
+        while time.monotonic() < deadline:
+            if max_requests and next(issued) >= max_requests:
+                return
+            kind, method, target, body, headers = traffic.request(rng, client)
+            if cookie:
+                headers["Cookie"] = cookie
+            start = time.monotonic()
+            try:
+                status, size, set_cookie = _send(base, method, target, body, headers, timeout)
+                if set_cookie:
+                    cookie = set_cookie.split(";", 1)[0]
+            except (OSError, http.client.HTTPException):
+                status, size = 0, 0
+            end = time.monotonic()
+            if start >= measure_from:
+                samples.append((kind, status, end - start, size))  # list.append is atomic
+            if think:
+                time.sleep(rng.expovariate(1.0 / think))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for f in [pool.submit(shifter, i) for i in range(concurrency)]:
+            f.result()
+    window = max(1e-9, min(time.monotonic(), deadline) - measure_from)
+    return samples, window
+
+def summarize(samples: List[Tuple[str, int, float, int]], window: float) -> Dict[str, Dict[str, float]]:
+    """Per request kind plus "all": count, errors, req/s, p50/p90/p99/max latency (ms), mean bytes."""
+    groups: Dict[str, List[Tuple[str, int, float, int]]] = {}
+    for s in samples:
+        groups.setdefault(s[0], []).append(s)
+    groups["all"] = samples
+    out = {}
+    for kind, rows in groups.items():
+        lat = sorted(r[2] * 1000.0 for r in rows)
+        out[kind] = {
+            "count": len(rows),
+            "errors": sum(1 for r in rows if r[1] == 0 or r[1] >= 400),
+            "rps": len(rows) / window,
+            "p50_ms": percentile(lat, 50), "p90_ms": percentile(lat, 90),
+            "p99_ms": percentile(lat, 99), "max_ms": lat[-1] if lat else float("nan"),
+            "mean_bytes": sum(r[3] for r in rows) / len(rows) if rows else 0.0,
+        }
+    return out
+
+def format_report(summary: Dict[str, Dict[str, float]], window: float) -> str:
+    lines = [f"{'kind':<13}{'count':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}"
+             f"{'p99 ms':>9}{'max ms':>9}{'KiB':>8}"]
+    order = sorted((k for k in summary if k != "all"), key=lambda k: -summary[k]["count"]) + ["all"]
+    for k in order:
+        s = summary[k]
+        lines.append(f"{k:<13}{s['count']:>8}{s['errors']:>8}{s['rps']:>9.1f}{s['p50_ms']:>9.0f}"
+                     f"{s['p90_ms']:>9.0f}{s['p99_ms']:>9.0f}{s['max_ms']:>9.0f}{s['mean_bytes'] / 1024:>8.1f}")
+    lines.append(f"window {window:.1f}s")
+    return "\n".join(lines)
+
+# ---------- CLI ----------
+def _cmd_seed(args) -> int:
+    workdir = os.path.abspath(args.dir)
+    os.makedirs(workdir, exist_ok=True)
+    if args.dsn:
+        dsn, daq_dsn, pgdata = args.dsn, args.daq_dsn or args.dsn, None
+    else:
+        pgdata = os.path.join(workdir, "pgdata")
+        start_cluster(pgdata, args.port)
+        admin = psycopg2.connect(_socket_dsn(pgdata, args.port, "postgres"))
+        admin.autocommit = True
+        with admin.cursor() as cur:
+            for db in ("runqa", "daq"):
+                cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (db,))
+                if cur.fetchone() is None:
+                    cur.execute(f"CREATE DATABASE {db}")
+        admin.close()
+        dsn, daq_dsn = _socket_dsn(pgdata, args.port, "runqa"), _socket_dsn(pgdata, args.port, "daq")
+
+    t = time.monotonic()
+    runs = list(synthetic_runs(args.runs, args.first_run, args.seed))
+    seed_database(dsn, daq_dsn, runs, replace=args.replace or pgdata is not None)
+    print(f"seeded {len(runs)} runs ({runs[0][0]}-{runs[-1][0]}) in {time.monotonic() - t:.1f}s")
+
+    qa_fs, onl_fs = os.path.join(workdir, "qahtml"), os.path.join(workdir, "onlhtml")
+    for d in (qa_fs, onl_fs):
+        shutil.rmtree(d, ignore_errors=True)
+    t = time.monotonic()
+    made = build_qa_tree(runs, qa_fs, onl_fs, args.seed)
+    print(f"QA tree: {made} offline run directories under {qa_fs} in {time.monotonic() - t:.1f}s")
+
+    state = {"dsn": dsn, "daq_dsn": daq_dsn, "pgdata": pgdata, "port": args.port,
+             "qa_fs": qa_fs, "onl_fs": onl_fs, "cache_dir": os.path.join(workdir, "cache"),
+             "access_log": os.path.join(workdir, "access.log"),
+             "run_first": runs[0][0], "run_last": runs[-1][0], "runs": len(runs),
+             "begin_first": runs[0][2].isoformat(), "begin_last": runs[-1][2].isoformat()}
+    with open(_state_path(workdir), "w", encoding="utf-8") as f:
+        json.dump(state, f, indent=1)
+    return 0
+
+def _prepare(args) -> Tuple[Dict[str, Any], str]:
+    workdir = os.path.abspath(args.dir)
+    state = load_state(workdir)
+    if state.get("pgdata"):
+        start_cluster(state["pgdata"], state["port"])
+    shutil.rmtree(state["cache_dir"], ignore_errors=True)  # start cold
+    return state, workdir
+
+def _cmd_run(args) -> int:
+    state, workdir = _prepare(args)
+    server = None
+    url = args.url
+    if not url:
+        server = make_server(app_env(state, cache=not args.no_cache), os.path.join(workdir, "server.log"))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}/"
+    print(f"driving {url} with {args.concurrency} shifters, mix={args.mix}, filters={args.filters}")
+    try:
+        samples, window = drive(url, Traffic(state, args.mix, args.filters), args.concurrency,
+                                args.duration, args.requests, args.warmup, args.think,
+                                args.timeout, args.seed)
+    finally:
+        if server is not None:
+            server.shutdown()
+    summary = summarize(samples, window)
+    print(format_report(summary, window))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"url": url, "concurrency": args.concurrency, "mix": args.mix,
+                       "filters": args.filters, "window_s": window, "summary": summary}, f, indent=1)
+    return 1 if summary["all"]["errors"] else 0
+
+def _cmd_serve(args) -> int:
+    state, workdir = _prepare(args)
+    server = make_server(app_env(state, cache=not args.no_cache), os.path.join(workdir, "server.log"),
+                         args.port)
+    print(f"serving http://127.0.0.1:{server.server_port}/all.py (Ctrl-C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+def _cmd_stop(args) -> int:
+    state = load_state(os.path.abspath(args.dir))
+    if state.get("pgdata"):
+        stop_cluster(state["pgdata"])
+    return 0
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m tools.loadtest",
+                                 description="Seed a local test database and load-test the run table.")
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--dir", default=DEFAULT_DIR, help=f"work directory (default {DEFAULT_DIR})")
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    p = sub.add_parser("seed", parents=[common], help="create synthetic goodruns/run tables and the QA tree")
+    p.add_argument("--runs", type=int, default=40000)
+    p.add_argument("--first-run", type=int, default=FIRST_RUN)
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--port", type=int, default=PG_PORT, help="port (socket name) of the local cluster")
+    p.add_argument("--dsn", help="existing test database for goodruns instead of a local cluster")
+    p.add_argument("--daq-dsn", help="test database for the DAQ run table (default: --dsn)")
+    p.add_argument("--replace", action="store_true", help="drop goodruns/run if --dsn already has them")
+    p.set_defaults(func=_cmd_seed)
+
+    p = sub.add_parser("run", parents=[common], help="drive concurrent traffic and report latencies")
+    p.add_argument("--url", help="drive this deployment instead of the built-in CGI server")
+    p.add_argument("--concurrency", type=int, default=8, help="simulated shifters")
+    p.add_argument("--duration", type=float, default=60.0, help="measured seconds")
+    p.add_argument("--warmup", type=float, default=5.0, help="unmeasured seconds first")
+    p.add_argument("--requests", type=int, default=0, help="stop after this many requests (0: no limit)")
+    p.add_argument("--think", type=float, default=0.0, help="mean think time between requests (s)")
+    p.add_argument("--timeout", type=float, default=60.0)
+    p.add_argument("--mix", default="mixed", choices=sorted(MIXES))
+    p.add_argument("--filters", default="mixed", choices=sorted(FILTER_MIXES))
+    p.add_argument("--no-cache", action="store_true", help="disable the page cache (built-in server)")
+    p.add_argument("--seed", type=int, default=1)
+    p.add_argument("--json", metavar="FILE", help="also write the summary as JSON")
+    p.set_defaults(func=_cmd_run)
+
+    p = sub.add_parser("serve", parents=[common], help="serve the app on the seeded data for manual browsing")
+    p.add_argument("--port", type=int, default=8080)
+    p.add_argument("--no-cache", action="store_true")
+    p.set_defaults(func=_cmd_serve)
+
+    p = sub.add_parser("stop", parents=[common], help="stop the local cluster")
+    p.set_defaults(func=_cmd_stop)
+
+    args = ap.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+# tools/metrics.py
+# Counters and histograms for the Prometheus text format (served by metrics.py).
+#
+# Every CGI request is its own short-lived process, so values are collected in
+# plain in-process objects (a few attribute increments per observation) and
+# written at exit as one small delta file of their own (no lock, no read of
+# shared state, so requests never wait on each other). The scrape (metrics.py,
+# collect()) adds the deltas into the totals file under an flock and deletes
+# them. A long-lived host (e.g. one using tools/snapshot.py) calls flush()
+# every few seconds instead; flush() sends only what accumulated since the
+# last flush.
+#
+#   _FETCH = metrics.histogram("runqa_db_query_seconds", op="fetch")   # once, at import
+#   with _FETCH.time(): ...                                            # per call
+#
+# Series:
+#   runqa_requests_total{endpoint,method,code}
+#   runqa_request_seconds{endpoint}                 histogram
+#   runqa_db_query_seconds{op=count|fetch|metadata|update|changes}
+#   runqa_db_connections_total{role=main|read|daq,result=opened|reused}
+#   runqa_db_prepared_total{result=hit|prepared|evicted|plain}
+#   runqa_fs_probe_seconds{tree=offline|online|qa_ready}
+#   runqa_render_seconds{part=table}
+#   runqa_page_cache_total{result=fresh|stale|miss|bypass}
+
+import os
+import json
+import time
+import fcntl
+import atexit
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+from tools import response
+
+METRICS_FILE = os.getenv("RUNQA_METRICS_FILE", "/tmp/runqa-metrics.json")
+DELTA_DIR = METRICS_FILE + ".d"  # one <pid>.<ns>.json per flush, until the next scrape
+
+# seconds; filesystem probes and cached pages sit in the sub-millisecond buckets
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+           0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+HELP = {
+    "runqa_requests_total": ("counter", "Requests by endpoint, method and HTTP status."),
+    "runqa_request_seconds": ("histogram", "Wall time per request (after imports)."),
+    "runqa_db_query_seconds": ("histogram", "Database calls by operation."),
+    "runqa_db_connections_total": ("counter", "Database connections opened or reused from the read-connection cache."),
+    "runqa_db_prepared_total": ("counter", "Prepared-statement cache lookups."),
+    "runqa_fs_probe_seconds": ("histogram", "QA artifact existence checks under the QA filesystem roots."),
+    "runqa_render_seconds": ("histogram", "HTML rendering."),
+    "runqa_page_cache_total": ("counter", "Shared page cache lookups by result."),
+}
+
+def _series(name: str, labels: Dict[str, str]) -> str:
+    """Canonical label text, e.g. 'op="fetch"' (values are fixed identifiers, no escaping)."""
+    return ",".join(f'{k}="{v}"' for k, v in sorted(labels.items()))
+
+class Counter:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, n: int = 1) -> None:
+        self.value += n
+
+class _Timer:
+    __slots__ = ("hist", "t0")
+
+    def __init__(self, hist):
+        self.hist = hist
+
+    def __enter__(self):
+        self.hist.depth += 1
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.hist.depth -= 1
+        if not self.hist.depth:  # nested calls of the same series count once
+            self.hist.observe(time.perf_counter() - self.t0)
+        return False
+
+class Histogram:
+    __slots__ = ("counts", "sum", "depth")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)  # last slot: above the top bucket (+Inf)
+        self.sum = 0.0
+        self.depth = 0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+
+    def time(self) -> _Timer:
+        return _Timer(self)
+
+    def timed(self, fn):
+        """Decorator form of time()."""
+        def wrapper(*args, **kwargs):
+            with _Timer(self):
+                return fn(*args, **kwargs)
+        wrapper.__name__, wrapper.__doc__ = fn.__name__, fn.__doc__
+        return wrapper
+
+_COUNTERS: Dict[Tuple[str, str], Counter] = {}
+_HISTOGRAMS: Dict[Tuple[str, str], Histogram] = {}
+_registered = False
+
+def _register_flush() -> None:
+    global _registered
+    if not _registered:
+        _registered = True
+        atexit.register(flush)
+
+def counter(name: str, **labels: str) -> Counter:
+    key = (name, _series(name, labels))
+    c = _COUNTERS.get(key)
+    if c is None:
+        c = _COUNTERS[key] = Counter()
+        _register_flush()
+    return c
+
+def histogram(name: str, **labels: str) -> Histogram:
+    key = (name, _series(name, labels))
+    h = _HISTOGRAMS.get(key)
+    if h is None:
+        h = _HISTOGRAMS[key] = Histogram()
+        _register_flush()
+    return h
+
+def request(endpoint: str) -> None:
+    """Count and time this CGI request at exit, once the response is finished."""
+    hist = histogram("runqa_request_seconds", endpoint=endpoint)  # registers flush() first
+    method = os.environ.get("REQUEST_METHOD", "GET").upper()
+    t0 = time.perf_counter()
+    def _done():
+        hist.observe(time.perf_counter() - t0)
+        status = response.sent()["status"]
+        counter("runqa_requests_total", endpoint=endpoint, method=method,
+                code=status.split()[0] if status else "none").inc()
+    atexit.register(_done)  # atexit is LIFO: runs before flush()
+
+# ---------- shared files ----------
+def _empty() -> Dict:
+    return {"counters": {}, "histograms": {}}
+
+def _merge(data: Dict, delta: Dict) -> None:
+    for name, series in delta.get("counters", {}).items():
+        into = data["counters"].setdefault(name, {})
+        for labels, value in series.items():
+            into[labels] = into.get(labels, 0) + value
+    for name, series in delta.get("histograms", {}).items():
+        into = data["histograms"].setdefault(name, {})
+        for labels, values in series.items():
+            old = into.get(labels)
+            if old is None or len(old) != len(values):  # new series or bucket layout changed
+                old = [0] * (len(values) - 1) + [0.0]
+            into[labels] = [a + b for a, b in zip(old, values)]
+
+def _read(path: str) -> Dict:
+    try:
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return _empty()
+    data.setdefault("counters", {})
+    data.setdefault("histograms", {})
+    return data
+
+def _deltas() -> List[str]:
+    try:
+        return [e.path for e in os.scandir(DELTA_DIR) if e.name.endswith(".json")]
+    except OSError:
+        return []
+
+def load() -> Dict:
+    """{"counters": {name: {labels: value}}, "histograms": {name: {labels: [counts..., sum]}}}"""
+    data = _read(METRICS_FILE)
+    for path in _deltas():
+        _merge(data, _read(path))
+    return data
+
+def collect() -> Dict:
+    """load(), folding the pending deltas into METRICS_FILE first (scrape side)."""
+    try:
+        lock = os.open(METRICS_FILE + ".lock", os.O_RDWR | os.O_CREAT, 0o664)
+    except OSError:
+        return load()
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # scrapers only; requests never take it
+        data = _read(METRICS_FILE)
+        paths = _deltas()
+        for path in paths:
+            _merge(data, _read(path))
+        tmp = f"{METRICS_FILE}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, separators=(",", ":"))
+        os.replace(tmp, METRICS_FILE)
+        for path in paths:
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+        return data
+    except OSError:
+        return load()
+    finally:
+        os.close(lock)
+
+def flush() -> None:
+    """Write this process's values since the last flush as a new delta file."""
+    delta = _empty()
+    for (name, labels), c in _COUNTERS.items():
+        if c.value:
+            delta["counters"].setdefault(name, {})[labels] = c.value
+            c.value = 0
+    for (name, labels), h in _HISTOGRAMS.items():
+        if any(h.counts):
+            delta["histograms"].setdefault(name, {})[labels] = h.counts + [h.sum]
+            h.counts = [0] * len(h.counts)
+            h.sum = 0.0
+    if not delta["counters"] and not delta["histograms"]:
+        return
+    try:
+        os.makedirs(DELTA_DIR, exist_ok=True)
+        name = f"{os.getpid()}.{time.time_ns()}"
+        tmp = os.path.join(DELTA_DIR, name + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(delta, f, separators=(",", ":"))
+        os.replace(tmp, os.path.join(DELTA_DIR, name + ".json"))  # scrapers see whole files only
+    except OSError:
+        pass  # metrics never fail a request
+
+def render(data: Dict) -> str:
+    """Prometheus text exposition format (0.0.4) of load()'s result."""
+    out: List[str] = []
+    names = sorted(set(data["counters"]) | set(data["histograms"]))
+    for name in names:
+        kind, text = HELP.get(name, ("histogram" if name in data["histograms"] else "counter", ""))
+        out.append(f"# HELP {name} {text}")
+        out.append(f"# TYPE {name} {kind}")
+        for labels, value in sorted(data["counters"].get(name, {}).items()):
+            out.append(f"{name}{{{labels}}} {value}" if labels else f"{name} {value}")
+        for labels, values in sorted(data["histograms"].get(name, {}).items()):
+            counts, total = values[:-1], values[-1]
+            sep = "," if labels else ""
+            running = 0
+            for le, n in zip(BUCKETS + (float("inf"),), counts):
+                running += n
+                le_text = "+Inf" if le == float("inf") else repr(le)
+                out.append(f'{name}_bucket{{{labels}{sep}le="{le_text}"}} {running}')
+            out.append(f"{name}_sum{{{labels}}} {total}" if labels else f"{name}_sum {total}")
+            out.append(f"{name}_count{{{labels}}} {running}" if labels else f"{name}_count {running}")
+    return "\n".join(out) + "\n"
@@ -0,0 +1,247 @@
+# tools/page_cache.py
+# Rendered #resultsRoot cache shared by all CGI workers (plain files, no DB access).
+#
+# Entries are keyed by the canonicalized query parameters and tagged with a
+# global generation number. invalidate() bumps the generation (apply_updates
+# calls it after every write), which turns every existing entry into a miss.
+# Within a generation an entry is fresh for FRESH_SECONDS and may be served
+# stale for up to STALE_SECONDS while one worker re-renders it. Runs added by
+# the ingest job (outside this app) are noticed by check_new_runs(): at most
+# every INGEST_CHECK_SECONDS one worker compares the newest run number with the
+# one it saw last and invalidates when it grew. An ingest job can also force
+# it with: python -m tools.page_cache invalidate
+#
+# Callers reading from a replica should not put() pages for a while after a
+# bump (generation_age()): the replica may not have the write yet, and the page
+# would be cached under the new generation with the old data.
+#
+# Files do not outlive their use: get() deletes the entry it finds expired or
+# from an older generation, invalidate() deletes everything written before the
+# bump, and about one put() in SWEEP_EVERY sweeps entries past STALE_SECONDS
+# (one query string per notes keystroke would otherwise pile up) together with
+# abandoned refresh locks and temp files.
+
+import os
+import sys
+import json
+import time
+import fcntl
+import random
+import hashlib
+import urllib.parse as _urlparse
+from typing import Any, Callable, Dict, Optional, Tuple
+
+CACHE_DIR = os.getenv("RUNQA_CACHE_DIR", "/tmp/runqa-cache")
+FRESH_SECONDS = float(os.getenv("RUNQA_CACHE_FRESH_SECONDS", "30"))
+STALE_SECONDS = float(os.getenv("RUNQA_CACHE_STALE_SECONDS", "600"))
+INGEST_CHECK_SECONDS = float(os.getenv("RUNQA_CACHE_INGEST_CHECK_SECONDS", "10"))
+LOCK_SECONDS = 60  # a refresh lock older than this is considered abandoned
+SWEEP_EVERY = 100  # puts per sweep, on average
+
+_GEN_FILE = "generation"
+_RUNS_FILE = "latest_run"  # newest run number seen by check_new_runs
+
+def canonical_query(params: Dict[str, Any]) -> str:
+    """Sorted querystring without empty values: same params in any order -> same string."""
+    clean = sorted((k, str(v)) for k, v in (params or {}).items() if v not in (None, "", "None"))
+    return _urlparse.urlencode(clean)
+
+def cache_key(params: Dict[str, Any]) -> str:
+    return hashlib.sha1(canonical_query(params).encode("utf-8")).hexdigest()
+
+def _path(name: str) -> str:
+    return os.path.join(CACHE_DIR, name)
+
+def generation() -> int:
+    try:
+        with open(_path(_GEN_FILE)) as f:
+            return int(f.read().strip() or 0)
+    except (OSError, ValueError):
+        return 0
+
+def generation_age() -> float:
+    """Seconds since the generation was last bumped (the generation file's mtime)."""
+    try:
+        return time.time() - os.path.getmtime(_path(_GEN_FILE))
+    except OSError:
+        return float("inf")
+
+def invalidate() -> int:
+    """Bump the generation so every cached page (and derived cache) is re-rendered."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    t0 = time.time()
+    with open(_path(_GEN_FILE), "a+") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        f.seek(0)
+        try:
+            gen = int(f.read().strip() or 0) + 1
+        except ValueError:
+            gen = 1
+        f.seek(0)
+        f.truncate()
+        f.write(str(gen))
+    sweep(before=t0)
+    return gen
+
+def check_new_runs(latest_run: Callable[[], Optional[int]]) -> bool:
+    """
+    Invalidate when latest_run() (the newest run number in goodruns) is higher
+    than at the last check. Asks at most every INGEST_CHECK_SECONDS, and only
+    one worker at a time; the others go on with the current generation.
+    returns: True if the generation was bumped
+    """
+    path = _path(_RUNS_FILE)
+    try:
+        if time.time() - os.path.getmtime(path) < INGEST_CHECK_SECONDS:
+            return False
+    except OSError:
+        pass
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(path, "a+") as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return False  # another worker is checking
+        f.seek(0)
+        try:
+            seen = int(f.read().strip() or 0)
+        except ValueError:
+            seen = 0
+        latest = None
+        try:
+            latest = latest_run()
+        finally:
+            # never lower it: a lagging replica must not make the next check bump again
+            f.seek(0)
+            f.truncate()
+            f.write(str(max(seen, latest or 0)))
+    if latest is not None and latest > seen:
+        invalidate()
+        return True
+    return False
+
+def sweep(before: Optional[float] = None) -> int:
+    """
+    Delete entries written before `before` (default: older than STALE_SECONDS,
+    i.e. expired in any generation), refresh locks older than LOCK_SECONDS and
+    temp files left by a worker that died mid-write.
+    returns: number of files removed
+    """
+    now = time.time()
+    if before is None:
+        before = now - STALE_SECONDS
+    removed = 0
+    try:
+        entries = list(os.scandir(CACHE_DIR))
+    except OSError:
+        return 0
+    for e in entries:
+        name = e.name
+        try:
+            mtime = e.stat().st_mtime
+            if name.endswith((".html", ".bin")):
+                expired = mtime < before
+            elif name.endswith((".lock", ".tmp")):
+                expired = now - mtime > LOCK_SECONDS
+            else:
+                continue
+            if expired:
+                os.unlink(e.path)
+                removed += 1
+        except OSError:
+            pass  # raced with another worker
+    return removed
+
+def _drop(path: str, f) -> None:
+    """Delete the entry `f` was read from, unless a worker has replaced it since."""
+    try:
+        if os.stat(path).st_ino == os.fstat(f.fileno()).st_ino:
+            os.unlink(path)
+    except OSError:
+        pass
+
+def get(key: str) -> Tuple[Optional[str], Optional[str]]:
+    """
+    returns: (html, state) with state "fresh" or "stale", or (None, None) on a miss
+    (absent, written under an older generation, or older than STALE_SECONDS).
+    """
+    path = _path(key + ".html")
+    try:
+        with open(path, encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            age = time.time() - header.get("t", 0)
+            if header.get("gen") != generation() or age >= STALE_SECONDS:
+                _drop(path, f)
+                return None, None
+            body = f.read()
+    except (OSError, ValueError):
+        return None, None
+    return body, ("fresh" if age < FRESH_SECONDS else "stale")
+
+def put(key: str, html: str, gen: Optional[int] = None) -> None:
+    """
+    Store html under key. Pass the generation read *before* rendering so a write
+    that lands mid-render is not masked by a page built from older data.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    header = json.dumps({"gen": generation() if gen is None else gen, "t": time.time()})
+    tmp = _path(f"{key}.{os.getpid()}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(header + "\n" + html)
+    os.replace(tmp, _path(key + ".html"))
+    if random.randrange(SWEEP_EVERY) == 0:
+        sweep()
+
+def get_blob(key: str) -> Optional[bytes]:
+    """Binary entry (e.g. a rendered image) valid for its generation and STALE_SECONDS."""
+    path = _path(key + ".bin")
+    try:
+        with open(path, "rb") as f:
+            header = json.loads(f.readline())
+            if header.get("gen") != generation() or time.time() - header.get("t", 0) >= STALE_SECONDS:
+                _drop(path, f)
+                return None
+            return f.read()
+    except (OSError, ValueError):
+        return None
+
+def put_blob(key: str, data: bytes, gen: Optional[int] = None) -> None:
+    """Binary counterpart of put(); same generation rule."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    header = json.dumps({"gen": generation() if gen is None else gen, "t": time.time()})
+    tmp = _path(f"{key}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        f.write(header.encode("utf-8") + b"\n" + data)
+    os.replace(tmp, _path(key + ".bin"))
+    if random.randrange(SWEEP_EVERY) == 0:
+        sweep()
+
+def try_lock_refresh(key: str) -> bool:
+    """Claim the right to re-render a stale entry; only one worker wins."""
+    lock = _path(key + ".lock")
+    try:
+        if time.time() - os.path.getmtime(lock) > LOCK_SECONDS:
+            os.unlink(lock)
+    except OSError:
+        pass
+    try:
+        os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except OSError:
+        return False
+
+def release_refresh(key: str) -> None:
+    """Drop the refresh lock (sweep() removes locks whose worker died)."""
+    try:
+        os.unlink(_path(key + ".lock"))
+    except OSError:
+        pass
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["invalidate"]:
+        print(f"page cache generation -> {invalidate()}")
+    elif sys.argv[1:] == ["sweep"]:
+        print(f"removed {sweep()} files")
+    else:
+        print("usage: python -m tools.page_cache invalidate|sweep", file=sys.stderr)
+        sys.exit(2)
@@ -0,0 +1,158 @@
+# tools/params.py
+# CGI input parsing shared by all.py and the JSON endpoints (no DB access).
+
+import os
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie, CookieError
+from typing import Any, Dict, Tuple
+
+COLUMNS = ["MVTX", "INTT", "TPC", "TPOT", "EMCAL", "IHCAL", "OHCAL", "MBD", "ZDC", "sEPD"]
+RUN_CLASSES = ("GOLDEN", "QUESTIONABLE", "BAD")
+PAGE_SIZE_DEFAULT = 15
+PAGE_SIZE_MAX = 200
+# Sort keys besides the subsystem columns (lowercase); "" means run number
+SORT_KEYS = ("run", "begin", "duration")
+
+# After a save the user's reads go to the primary for this long (replica lag bound)
+READ_YOUR_WRITES_SECONDS = int(os.getenv("RUNQA_READ_YOUR_WRITES_SECONDS", "30"))
+_WROTE_COOKIE = "runqa_wrote"
+
+def get_int(form, name: str, default=None):
+    try:
+        v = form.getfirst(name, "")
+        if v in (None, ""):
+            return default
+        return int(v)
+    except Exception:
+        return default
+
+def get_str(form, name: str, default: str = "") -> str:
+    v = form.getfirst(name, default)
+    return v if v is not None else default
+
+def get_datetime(form, name: str):
+    """ISO date/time field (e.g. from <input type="datetime-local">) or None."""
+    v = get_str(form, name, "").strip()
+    try:
+        return datetime.fromisoformat(v) if v else None
+    except ValueError:
+        return None
+
+def client_tag() -> str:
+    """Per-tab id sent by filter_ui.py hydration requests (X-RunQA-Client header)."""
+    return os.environ.get("HTTP_X_RUNQA_CLIENT", "").strip()
+
+def client_seq() -> int:
+    """The tab's navigation sequence number (X-RunQA-Seq header, increasing), 0 if absent."""
+    v = os.environ.get("HTTP_X_RUNQA_SEQ", "").strip()
+    return int(v) if v.isdigit() and len(v) <= 18 else 0
+
+def is_prefetch() -> bool:
+    """filter_ui.py warming its cache with a neighbouring page (X-RunQA-Prefetch: 1)."""
+    return os.environ.get("HTTP_X_RUNQA_PREFETCH", "") == "1"
+
+def read_your_writes_cookie() -> str:
+    """Set-Cookie value marking that this browser just wrote (see wrote_recently)."""
+    return (f"{_WROTE_COOKIE}={int(time.time())}; Max-Age={READ_YOUR_WRITES_SECONDS}; "
+            "Path=/; SameSite=Lax; HttpOnly")
+
+def wrote_recently() -> bool:
+    """True within READ_YOUR_WRITES_SECONDS of this browser's last save."""
+    try:
+        morsel = SimpleCookie(os.environ.get("HTTP_COOKIE", "")).get(_WROTE_COOKIE)
+        return morsel is not None and time.time() - int(morsel.value) < READ_YOUR_WRITES_SECONDS
+    except (CookieError, ValueError):
+        return False
+
+def parse_cols(value: str):
+    """
+    Comma-separated subsystem list (case-insensitive) -> members of COLUMNS in
+    COLUMNS order; unknown names are dropped. Empty means every column.
+    """
+    wanted = {c.strip().lower() for c in (value or "").split(",")}
+    return [c for c in COLUMNS if c.lower() in wanted]
+
+def parse_filters(form) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Read the run-table filters from a cgi.FieldStorage.
+    returns: (filters, current_params)
+      filters: normalized dict for db_backend.build_where plus the post-join
+               keys run_type / track_ready / calo_ready
+      current_params: string values for building links (see urlencode_keep)
+    filters["cols"] is the cols= projection (list of COLUMNS members, [] = all);
+    it only narrows what is fetched and shown, never what is filtered or sorted.
+    """
+    page = max(1, get_int(form, "page", 1))
+    page_size = min(max(1, get_int(form, "page_size", PAGE_SIZE_DEFAULT)), PAGE_SIZE_MAX)
+
+    run_number_exact = get_int(form, "run_number", None)
+    run_min = get_int(form, "run_min", None)
+    run_max = get_int(form, "run_max", None)
+    run_type_filter = get_str(form, "run_type", "").strip().lower()   # physics/cosmics/calibration or ""
+    notes_contains  = get_str(form, "notes_contains", "").strip()
+    require_class   = get_str(form, "require_class", "").strip().upper()  # GOLDEN/QUESTIONABLE/BAD
+    subsys_filter   = get_str(form, "subsys", "").strip()                 # exact member of COLUMNS
+    subsys_class    = get_str(form, "subsys_class", "").strip().upper()   # GOLDEN/QUESTIONABLE/BAD
+    track_ready     = get_str(form, "track_ready", "") in ("1", "true", "True")
+    calo_ready      = get_str(form, "calo_ready", "") in ("1", "true", "True")
+    view            = "virtual" if get_str(form, "view", "") == "virtual" else ""  # paged unless virtual
+    begin_from      = get_datetime(form, "begin_from")                   # run began at/after
+    begin_to        = get_datetime(form, "begin_to")                     # run began before
+    dur_min         = get_int(form, "dur_min", None)                     # minutes
+    dur_max         = get_int(form, "dur_max", None)                     # minutes
+    sort            = get_str(form, "sort", "").strip().lower()          # SORT_KEYS or a subsystem
+    if sort == "run" or (sort not in SORT_KEYS and sort not in {c.lower() for c in COLUMNS}):
+        sort = ""
+    cols            = parse_cols(get_str(form, "cols", ""))               # shown subsystems
+    if len(cols) == len(COLUMNS):
+        cols = []
+    sort_dir        = "asc" if get_str(form, "dir", "").strip().lower() == "asc" else ""  # desc unless asc
+
+    filters = {
+        "run_number_exact": run_number_exact,
+        "run_min": run_min,
+        "run_max": run_max,
+        "notes_contains": notes_contains,
+        "require_class": require_class,
+        "subsys_filter": subsys_filter,
+        "subsys_class": subsys_class,
+        "run_type": run_type_filter,
+        "track_ready": track_ready,
+        "calo_ready": calo_ready,
+        "begin_from": begin_from,
+        "begin_to": begin_to,
+        "dur_min": dur_min,
+        "dur_max": dur_max,
+        "page": page,
+        "page_size": page_size,
+        "view": view,
+        "sort": sort,
+        "dir": sort_dir,
+        "cols": cols,
+    }
+
+    # Current params for links (strip empty when building QS)
+    current_params = {
+        "run_number": "" if run_number_exact is None else str(run_number_exact),
+        "run_min": "" if run_min is None else str(run_min),
+        "run_max": "" if run_max is None else str(run_max),
+        "run_type": run_type_filter or "",
+        "page_size": str(page_size),
+        "notes_contains": notes_contains or "",
+        "require_class": require_class or "",
+        "subsys": subsys_filter or "",
+        "subsys_class": subsys_class or "",
+        "track_ready": "1" if track_ready else "",
+        "calo_ready":  "1" if calo_ready else "",
+        "begin_from": begin_from.isoformat(timespec="minutes") if begin_from else "",
+        "begin_to": begin_to.isoformat(timespec="minutes") if begin_to else "",
+        "dur_min": "" if dur_min is None else str(dur_min),
+        "dur_max": "" if dur_max is None else str(dur_max),
+        "page": str(page),
+        "view": view,
+        "sort": sort,
+        "dir": sort_dir,
+        "cols": ",".join(c.lower() for c in cols),
+    }
+    return filters, current_params
@@ -0,0 +1,142 @@
+# tools/response.py
+# CGI response start + Content-Encoding negotiation (gzip, brotli when installed).
+#
+# start_response() writes the header block and then swaps sys.stdout for a text
+# stream that compresses on the fly, so scripts keep using print(). Calling
+# sys.stdout.flush() emits a sync-flushed block the browser can render (or, for
+# events.py, deliver) immediately; the stream is finished at exit.
+
+import io
+import os
+import sys
+import zlib
+import atexit
+from typing import Dict, Optional
+
+try:
+    import brotli  # optional: pip install brotli
+except ImportError:
+    brotli = None
+
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# What went out, for tools/accesslog.py: status line and bytes written (headers included)
+_SENT = {"status": None, "bytes": 0}
+
+def negotiate(accept_encoding: Optional[str] = None) -> str:
+    """Pick "br", "gzip" or "" (identity) from an Accept-Encoding header."""
+    if accept_encoding is None:
+        accept_encoding = os.environ.get("HTTP_ACCEPT_ENCODING", "")
+    offered = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            offered[name.strip().lower()] = q
+    def acceptable(coding):
+        # "*" stands only for codings not named explicitly: "gzip;q=0, *" refuses gzip
+        return (offered[coding] if coding in offered else offered.get("*", 0)) > 0
+    if brotli is not None and offered.get("br", 0) > 0:
+        return "br"
+    if acceptable("gzip"):
+        return "gzip"
+    return ""
+
+class _EncodingWriter(io.BufferedIOBase):
+    """Binary sink that compresses into `raw`; flush() sync-flushes the compressor."""
+
+    def __init__(self, raw, coding: str):
+        super().__init__()
+        self.raw = raw
+        self.coding = coding
+        if coding == "gzip":
+            self._c = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+        elif coding == "br":
+            self._c = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self._c = None
+        self._finished = False
+
+    def writable(self):
+        return True
+
+    def _write_raw(self, b):
+        _SENT["bytes"] += len(b)
+        self.raw.write(b)
+
+    def write(self, b):
+        if self._finished:
+            raise ValueError("response already finished")
+        if self._c is None:
+            self._write_raw(b)
+        elif self.coding == "br":
+            self._write_raw(self._c.process(bytes(b)))
+        else:
+            self._write_raw(self._c.compress(b))
+        return len(b)
+
+    def flush(self):
+        if self._c is not None and not self._finished:
+            if self.coding == "br":
+                self._write_raw(self._c.flush())
+            else:
+                self._write_raw(self._c.flush(zlib.Z_SYNC_FLUSH))
+        self.raw.flush()
+
+    def finish(self):
+        if self._finished:
+            return
+        if self._c is not None:
+            self._write_raw(self._c.finish() if self.coding == "br" else self._c.flush(zlib.Z_FINISH))
+        self._finished = True
+        self.raw.flush()
+
+def start_response(content_type: str,
+                   status: Optional[str] = None,
+                   headers: Optional[Dict[str, str]] = None,
+                   compress: bool = True) -> str:
+    """
+    Write the CGI header block and route sys.stdout through the negotiated encoder.
+    returns: the chosen Content-Encoding ("" for identity)
+    """
+    # detach so the replaced text wrapper cannot close the fd when collected
+    sys.stdout.flush()
+    raw = sys.stdout.detach()
+    coding = negotiate() if compress else ""
+    lines = []
+    if status:
+        lines.append(f"Status: {status}")
+    lines.append(f"Content-Type: {content_type}")
+    lines.append("Vary: Accept-Encoding")
+    if coding:
+        lines.append(f"Content-Encoding: {coding}")
+    for k, v in (headers or {}).items():
+        lines.append(f"{k}: {v}")
+    head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+    raw.write(head)
+    _SENT["status"] = status or "200 OK"
+    _SENT["bytes"] += len(head)
+
+    writer = _EncodingWriter(raw, coding)
+    text = io.TextIOWrapper(writer, encoding="utf-8", errors="replace", write_through=False)
+    sys.stdout = text
+
+    def _finish():
+        try:
+            text.flush()
+            writer.finish()
+        except (BrokenPipeError, ValueError, OSError):
+            pass
+    atexit.register(_finish)
+    return coding
+
+def sent() -> Dict[str, object]:
+    """{"status": "200 OK" | None before start_response, "bytes": n} for this process."""
+    return dict(_SENT)
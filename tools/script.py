@@ -1,9 +1,44 @@
 #!/usr/bin/python3
-# Emits shared JS helpers (hotkeys, row dbl-click, etc.) for all.py
-import sys, io
+# Emits shared JS helpers (hotkeys, row dbl-click, etc.) for all.py.
+# script.py?part=lightbox emits only the image lightbox (static export pages).
+import os, sys, io, json
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.response import start_response
+from tools.params import COLUMNS
 
-print("Content-Type: application/javascript; charset=utf-8\r\n\r\n")
+start_response("application/javascript; charset=utf-8")
+
+# Opens render_table's thumbnails; standalone, so static pages can ship it alone
+lightbox_js = r'''
+// --- Lightbox ---
+function openLightbox(src, title) {
+  var root = document.getElementById("lb-root");
+  if (!root) return;
+  var img = document.getElementById("lb-img");
+  var ttl = document.getElementById("lb-title");
+  img.src = src;
+  img.alt = title || "";
+  ttl.textContent = title || "";
+  root.classList.add("open");
+  root.setAttribute("aria-hidden", "false");
+}
+function closeLightbox() {
+  var root = document.getElementById("lb-root");
+  if (!root) return;
+  var img = document.getElementById("lb-img");
+  img.src = "";
+  root.classList.remove("open");
+  root.setAttribute("aria-hidden", "true");
+}
+document.addEventListener("keydown", function (e) {
+  if (e.key === "Escape") closeLightbox();
+});
+
+// expose
+window.openLightbox = openLightbox;
+window.closeLightbox = closeLightbox;
+'''
 
 js = r'''
 (function () {
@@ -15,12 +50,64 @@ js = r'''
     });
   }
 
+  // --- Lazy editors: render_table ships view markup only ---
+  const CLASS_OPTIONS = ["GOLDEN", "QUESTIONABLE", "BAD"];
+  const CLASS_CSS = { GOLDEN: "golden", QUESTIONABLE: "questionable", BAD: "bad" };
+  const CLASS_PILL = { GOLDEN: ["g", "Good"], QUESTIONABLE: ["q", "Quest."], BAD: ["b", "Bad"] };
+
+  function findCell(rn, col) {
+    return document.querySelector('tr[data-run="' + rn + '"] td[data-col="' + col + '"]');
+  }
+
+  function cellClass(td) {
+    if (td.classList.contains("golden")) return "GOLDEN";
+    if (td.classList.contains("questionable")) return "QUESTIONABLE";
+    if (td.classList.contains("bad")) return "BAD";
+    return "";
+  }
+
+  function ensureEditor(td) {
+    if (td.querySelector(".cell-edit")) return;
+    const tr = td.closest("tr[data-run]");
+    const wrap = td.querySelector(".label-wrap");
+    if (!tr || !wrap) return;
+    const base = td.getAttribute("data-col") + "_" + tr.getAttribute("data-run");
+    const rc = cellClass(td);
+    const note = td.querySelector(".cell-view .note-ellip");
+
+    const sel = document.createElement("select");
+    sel.name = "runclass_" + base;
+    sel.className = CLASS_CSS[rc] || "unknown";
+    // defaultSelected / defaultValue put the stored values into the markup
+    // too, so a copy made through outerHTML keeps them
+    sel.add(new Option("--", "", rc === "", rc === ""));
+    CLASS_OPTIONS.forEach((c) => sel.add(new Option(c, c, c === rc, c === rc)));
+
+    const ta = document.createElement("textarea");
+    ta.name = "notes_" + base;
+    ta.placeholder = "Notes…";
+    ta.defaultValue = note ? note.textContent : "";
+
+    const vert = document.createElement("div");
+    vert.className = "editor-vert";
+    vert.append(sel, ta);
+    const edit = document.createElement("div");
+    edit.className = "cell-edit";
+    edit.appendChild(vert);
+    wrap.appendChild(edit);
+  }
+
+  function ensureEditors(scope) {
+    (scope || document).querySelectorAll("#bulkForm tr[data-run] td[data-col]").forEach(ensureEditor);
+  }
+
   function enterEditMode(on) {
     const root = document.documentElement;
     if (on === undefined) root.classList.toggle("edit-mode");
     else root.classList.toggle("edit-mode", !!on);
 
     const enabled = root.classList.contains("edit-mode");
+    if (enabled) ensureEditors();
     localStorage.setItem("runtriage_editmode", enabled ? "1" : "0");
 
     const btn = document.getElementById("btnEditMode");
@@ -44,11 +131,205 @@ js = r'''
     setTimeout(() => t.classList.remove("show"), 1600);
   }
 
-  function saveChanges() {
+  // --- Dirty tracking: only cells the user actually changed are submitted ---
+  function markDirty(e) {
+    const t = e.target;
+    if (!t || !t.closest) return;
+    const tag = (t.tagName || "").toLowerCase();
+    if (tag !== "select" && tag !== "textarea") return;
+    const td = t.closest("td[data-col]");
+    if (td && t.closest("#bulkForm")) td.classList.add("dirty");
+  }
+  document.addEventListener("input", markDirty);
+  document.addEventListener("change", markDirty);
+
+  function dirtyPayload() {
+    const body = new URLSearchParams();
+    document.querySelectorAll("#bulkForm td.dirty").forEach((td) => {
+      td.querySelectorAll("select[name], textarea[name]").forEach((f) => body.append(f.name, f.value));
+    });
+    return body;
+  }
+
+  // Save edits in place: all.py answers XHR posts with per-cell JSON results,
+  // so only the touched cells are patched instead of re-rendering the page.
+  let saving = false;
+  async function saveChanges() {
     const form = document.getElementById("bulkForm");
-    if (!form) return;
+    if (!form || saving) return;
+    if (!form.querySelector("td.dirty")) { showToast("No changes to save"); return; }
+    if (!window.fetch) {
+      // plain post: keep untouched editors out of the request body
+      form.querySelectorAll("td[data-col]:not(.dirty) select, td[data-col]:not(.dirty) textarea")
+        .forEach((f) => { f.disabled = true; });
+      showToast("Saving…");
+      form.submit();
+      return;
+    }
+    saving = true;
     showToast("Saving…");
-    form.submit();
+    try {
+      const res = await fetch(form.action, {
+        method: "POST",
+        body: dirtyPayload(),
+        headers: { "X-Requested-With": "XMLHttpRequest", "Accept": "application/json" },
+      });
+      let data = null;
+      try { data = await res.json(); } catch (_) {}
+      if (!data) { showToast("Save failed (HTTP " + res.status + ")"); return; }
+      if (data.error) { showToast("Save failed: " + data.error); return; }
+
+      if (data.saved && typeof window.invalidateResultsCache === "function") {
+        window.invalidateResultsCache();
+      }
+      const failed = [];
+      (data.cells || []).forEach((c) => {
+        if (c.ok) {
+          const td = findCell(c.run, c.col);
+          if (td) td.classList.remove("dirty");
+          patchCell(c.run, c.col, c.class, c.notes);
+        }
+        else failed.push(c.col.toUpperCase() + " " + c.run + " (" + c.error + ")");
+      });
+      showToast(failed.length
+        ? "Saved " + data.saved + ", failed: " + failed.join(", ")
+        : "Saved " + data.saved + " cell" + (data.saved === 1 ? "" : "s"));
+    } catch (e) {
+      showToast("Save failed: network error");
+    } finally {
+      saving = false;
+    }
+  }
+
+  // The Save button is a plain submit; route it through saveChanges()
+  document.addEventListener("submit", (e) => {
+    if (e.target && e.target.id === "bulkForm") { e.preventDefault(); saveChanges(); }
+  });
+
+  // --- Live updates (events.py pushes [run, subsystem_lc, runclass, notes]) ---
+
+  function patchCell(rn, col, rc, notes) {
+    const td = findCell(rn, col);
+    if (!td) return false;
+    const key = (rc || "").toUpperCase();
+    const css = CLASS_CSS[key] || "unknown";
+    td.classList.remove("golden", "questionable", "bad", "unknown");
+    td.classList.add(css);
+
+    const view = td.querySelector(".cell-view");
+    if (view) {
+      const oldNote = view.querySelector(".note-ellip");
+      const pill = CLASS_PILL[key] || ["", "&mdash;"];
+      view.innerHTML = "<span class='pill " + pill[0] + "'>" + pill[1] + "</span>";
+      if (notes === null) {
+        // notes too large for the push channel: keep what we show
+        if (oldNote) view.appendChild(oldNote);
+      } else if (notes) {
+        const d = document.createElement("div");
+        d.className = "note-ellip";
+        d.textContent = notes;
+        view.appendChild(d);
+      }
+    }
+
+    // Editors: never clobber unsaved edits
+    const sel = td.querySelector("select");
+    const ta = td.querySelector("textarea");
+    if (!td.classList.contains("dirty")) {
+      if (sel) { sel.value = key; sel.className = css; }
+      if (ta && notes !== null) ta.value = notes;
+    }
+
+    td.classList.add("live-updated");
+    setTimeout(() => td.classList.remove("live-updated"), 1500);
+    return true;
+  }
+
+  function connectLiveUpdates() {
+    if (!window.EventSource) return;
+    const es = new EventSource("events.py");
+    es.addEventListener("cell", (ev) => {
+      let change;
+      try { change = JSON.parse(ev.data); } catch (_) { return; }
+      patchCell(change[0], change[1], change[2], change[3]);
+      if (typeof window.invalidateResultsCache === "function") window.invalidateResultsCache();
+    });
+    // Too many changes missed while disconnected to replay: reload unless editing
+    es.addEventListener("resync", () => {
+      if (typeof window.invalidateResultsCache === "function") window.invalidateResultsCache();
+      if (!document.querySelector("td.dirty")) window.location.reload();
+    });
+  }
+
+  // --- Bulk classification: one set-based UPDATE over filters or a run range ---
+  const BULK_SUBSYS = __COLUMNS__;  // tools.params.COLUMNS
+
+  function buildBulkPanel() {
+    let panel = document.getElementById("rtBulkPanel");
+    if (panel) return panel;
+    panel = document.createElement("div");
+    panel.id = "rtBulkPanel";
+    panel.className = "floating-panel bulk-panel";
+    panel.innerHTML =
+      "<h3>Bulk classify</h3>" +
+      "<label><input type='radio' name='bulk_scope' value='filters' checked> All runs matching the current filters</label><br>" +
+      "<label><input type='radio' name='bulk_scope' value='range'> Run range</label> " +
+      "<input id='bulkMin' type='text' size='7' placeholder='from'> – <input id='bulkMax' type='text' size='7' placeholder='to'>" +
+      "<div class='bulk-grid'>" +
+      "<label>Subsystem<br><select id='bulkCol'>" + BULK_SUBSYS.map((c) => "<option>" + c + "</option>").join("") + "</select></label>" +
+      "<label>Class<br><select id='bulkClass'>" + CLASS_OPTIONS.map((c) => "<option>" + c + "</option>").join("") + "</select></label>" +
+      "</div>" +
+      "<textarea id='bulkNotes' placeholder='Notes…'></textarea>" +
+      "<div class='bulk-note'>Run type and QA-ready filters are not applied to bulk updates.</div>" +
+      "<div class='bulk-actions'><button type='button' class='btn primary' id='bulkGo'>Preview &amp; apply</button>" +
+      "<button type='button' class='btn' id='bulkClose'>Close</button></div>";
+    document.body.appendChild(panel);
+    document.getElementById("bulkClose").addEventListener("click", () => { panel.style.display = "none"; });
+    document.getElementById("bulkGo").addEventListener("click", runBulk);
+    return panel;
+  }
+
+  function openBulkPanel() {
+    const panel = buildBulkPanel();
+    panel.style.display = "block";
+  }
+
+  async function postBulk(action, extra) {
+    const form = document.getElementById("bulkForm");
+    const body = new URLSearchParams({
+      action: action,
+      scope: document.querySelector("input[name=bulk_scope]:checked").value,
+      bulk_min: document.getElementById("bulkMin").value.trim(),
+      bulk_max: document.getElementById("bulkMax").value.trim(),
+      bulk_col: document.getElementById("bulkCol").value,
+      bulk_class: document.getElementById("bulkClass").value,
+      bulk_notes: document.getElementById("bulkNotes").value,
+    });
+    Object.entries(extra || {}).forEach(([k, v]) => body.set(k, v));
+    // form.action carries the current filters in its query string
+    const res = await fetch(form ? form.action : "all.py" + window.location.search, {
+      method: "POST",
+      body: body,
+      headers: { "X-Requested-With": "XMLHttpRequest", "Accept": "application/json" },
+    });
+    return res.json();
+  }
+
+  async function runBulk() {
+    try {
+      const preview = await postBulk("bulk_preview");
+      if (!preview.ok) { showToast("Bulk: " + preview.error); return; }
+      const col = document.getElementById("bulkCol").value;
+      const rc = document.getElementById("bulkClass").value;
+      if (!preview.count) { showToast("Bulk: no runs match"); return; }
+      if (!window.confirm("Set " + col + " = " + rc + " on " + preview.count + " runs?")) return;
+      const done = await postBulk("bulk_apply", { expected: String(preview.count) });
+      if (!done.ok) { showToast("Bulk: " + done.error); return; }
+      showToast("Updated " + done.updated + " runs");
+      if (typeof window.invalidateResultsCache === "function") window.invalidateResultsCache();
+    } catch (e) {
+      showToast("Bulk: network error");
+    }
   }
 
   function attachRowDblClick() {
@@ -56,7 +337,9 @@ js = r'''
     rows.forEach((tr) => {
       tr.addEventListener(
         "dblclick",
-        function () { tr.classList.toggle("row-edit"); },
+        function () {
+          if (tr.classList.toggle("row-edit")) tr.querySelectorAll("td[data-col]").forEach(ensureEditor);
+        },
         { passive: true }
       );
     });
@@ -64,6 +347,7 @@ js = r'''
 
   function rewireAfterHydration() {
     attachRowDblClick();
+    if (typeof window.initVirtualTable === "function") window.initVirtualTable();
     if (localStorage.getItem("runtriage_editmode") === "1") {
       enterEditMode(true);
     }
@@ -93,6 +377,7 @@ js = r'''
       enterEditMode(true);
     }
     attachRowDblClick();
+    connectLiveUpdates();
   });
 
   // expose for inline handlers / filter_ui
@@ -101,6 +386,8 @@ js = r'''
   window.saveChanges = saveChanges;
   window.showToast = showToast;
   window.rewireAfterHydration = rewireAfterHydration;
+  window.patchCell = patchCell;
+  window.openBulkPanel = openBulkPanel;
 
 
   
@@ -180,36 +467,7 @@ js = r'''
 })();
 
 
-// --- Lightbox ---
-function openLightbox(src, title) {
-  var root = document.getElementById("lb-root");
-  if (!root) return;
-  var img = document.getElementById("lb-img");
-  var ttl = document.getElementById("lb-title");
-  img.src = src;
-  img.alt = title || "";
-  ttl.textContent = title || "";
-  root.classList.add("open");
-  root.setAttribute("aria-hidden", "false");
-}
-function closeLightbox() {
-  var root = document.getElementById("lb-root");
-  if (!root) return;
-  var img = document.getElementById("lb-img");
-  img.src = "";
-  root.classList.remove("open");
-  root.setAttribute("aria-hidden", "true");
-}
-document.addEventListener("keydown", function (e) {
-  if (e.key === "Escape") closeLightbox();
-});
-
-// expose
-window.openLightbox = openLightbox;
-window.closeLightbox = closeLightbox;
-
-
-// ---- Image Gallery (full preview of all PNGs in dir) ----
+__LIGHTBOX__// ---- Image Gallery (full preview of all PNGs in dir) ----
 // ---- Image Gallery (reads <template> of <a> elements; no JSON) ----
 (function(){
   "use strict";
@@ -303,5 +561,8 @@ window.closeLightbox = closeLightbox;
 })();
 
 
-'''
-print(js)
+'''.replace("__COLUMNS__", json.dumps(COLUMNS)).replace("__LIGHTBOX__", lightbox_js.lstrip("\n") + "\n\n")
+if os.environ.get("QUERY_STRING", "") == "part=lightbox":
+    print(lightbox_js)
+else:
+    print(js)
@@ -0,0 +1,248 @@
+# tools/snapshot.py
+# Columnar in-memory copy of goodruns for long-lived processes.
+#
+# Layout (n runs, ascending):
+#   runs          array('i') of run numbers
+#   codes[c]      bytearray, class code per run for column c
+#                 (0 unset, 1 GOLDEN, 2 QUESTIONABLE, 3 BAD)
+#   cells[c]      array('I') of indexes into one shared pool of raw cell texts
+#                 (the composite text PostgreSQL returns; identical cells share
+#                 a single string)
+#   bits[c, k]    Python int used as a bitset: bit i set when run i of column c
+#                 has class k; any[k] is the OR over all columns
+#
+# A filter combination from build_where is then an AND of a few bitsets and a
+# run-range mask, and a page is read off the highest (or lowest) set bits.
+# The snapshot LISTENs on the goodruns notify channel and re-reads only the
+# runs named there, checks for new runs every POLL_SECONDS and reloads fully
+# every RELOAD_SECONDS (catching edits made outside this app).
+#
+# Not for CGI: loading costs one full-table read. A long-lived host calls
+# enable() once (there is no environment switch, so CGI scripts never load
+# it); db_backend.count_goodruns and the
+# page fetches then answer supported filters here and send the rest (notes
+# search, DAQ time/duration filters, non-run sorts) to PostgreSQL.
+
+import os
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from tools import db_backend
+from tools.templates import parse_cell
+
+POLL_SECONDS = float(os.getenv("RUNQA_SNAPSHOT_POLL_SECONDS", "5"))
+RELOAD_SECONDS = float(os.getenv("RUNQA_SNAPSHOT_RELOAD_SECONDS", "600"))
+
+_CODE = {"GOLDEN": 1, "QUESTIONABLE": 2, "BAD": 3}
+# bytes.translate tables: class code k -> b"1", anything else -> b"0"
+_BIT_TABLES = {k: bytes(b"1"[0] if i == k else b"0"[0] for i in range(256)) for k in (1, 2, 3)}
+_DAQ_KEYS = ("begin_from", "begin_to", "dur_min", "dur_max")
+
+def _code_of(raw: Any) -> int:
+    return _CODE.get((parse_cell(raw)[0] or "").upper(), 0)
+
+def _bitset(codes: bytearray, k: int) -> int:
+    # bit i = run i: reverse so run 0 is the least significant digit
+    s = codes.translate(_BIT_TABLES[k])[::-1]
+    return int(s, 2) if s else 0
+
+def _drop_high(mask: int, k: int) -> int:
+    """mask without its k highest set bits (binary search on shift, no bit loop)."""
+    if k <= 0:
+        return mask
+    if k >= mask.bit_count():
+        return 0
+    lo, hi = 0, mask.bit_length()
+    while lo < hi:  # smallest t with popcount(mask >> t) <= k
+        t = (lo + hi) // 2
+        if (mask >> t).bit_count() <= k:
+            hi = t
+        else:
+            lo = t + 1
+    return mask & ((1 << lo) - 1)
+
+def _drop_low(mask: int, k: int) -> int:
+    """mask without its k lowest set bits."""
+    if k <= 0:
+        return mask
+    if k >= mask.bit_count():
+        return 0
+    lo, hi = 0, mask.bit_length()
+    while lo < hi:  # smallest t with popcount(mask & (2**t - 1)) >= k
+        t = (lo + hi) // 2
+        if (mask & ((1 << t) - 1)).bit_count() >= k:
+            hi = t
+        else:
+            lo = t + 1
+    return (mask >> lo) << lo
+
+class Snapshot:
+    def __init__(self, columns: Sequence[str]):
+        self.columns = list(columns)
+        self.cols_lc = [c.lower() for c in self.columns]
+        self._listener = None
+        self.loaded_at = 0.0
+        self.polled_at = 0.0
+        self.reload()
+
+    # ----- loading -----
+    def reload(self) -> None:
+        """Full load. LISTEN starts first so no change between the two is lost."""
+        if self._listener is not None:
+            self._listener.close()
+        self._listener = db_backend.listen_changes(heartbeat=0)
+        next(self._listener)
+        self.pool: List[Optional[str]] = [None]
+        self._pool_code = bytearray(1)  # class code of each pooled cell
+        self._pool_index: Dict[Optional[str], int] = {None: 0}
+        self.runs = array("i")
+        self.codes = [bytearray() for _ in self.cols_lc]
+        self.cells = [array("I") for _ in self.cols_lc]
+        for row in db_backend.fetch_cells(self.columns):
+            self._append(row)
+        self._rebuild_bits()
+        self.loaded_at = self.polled_at = time.monotonic()
+
+    def _intern(self, raw: Optional[str]) -> int:
+        i = self._pool_index.get(raw)
+        if i is None:
+            i = self._pool_index[raw] = len(self.pool)
+            self.pool.append(raw)
+            self._pool_code.append(_code_of(raw))
+        return i
+
+    def _append(self, row: Tuple[Any, ...]) -> None:
+        self.runs.append(row[0])
+        for c, raw in enumerate(row[1:]):
+            i = self._intern(raw)
+            self.codes[c].append(self._pool_code[i])
+            self.cells[c].append(i)
+
+    def _rebuild_bits(self) -> None:
+        self.bits = {(c, k): _bitset(self.codes[c], k)
+                     for c in range(len(self.cols_lc)) for k in (1, 2, 3)}
+        self.any = {k: 0 for k in (1, 2, 3)}
+        for (c, k), b in self.bits.items():
+            self.any[k] |= b
+
+    def _set_row(self, i: int, row: Tuple[Any, ...]) -> None:
+        bit = 1 << i
+        for c, raw in enumerate(row[1:]):
+            p = self._intern(raw)
+            old, new = self.codes[c][i], self._pool_code[p]
+            self.cells[c][i] = p
+            if old == new:
+                continue
+            self.codes[c][i] = new
+            if old:
+                self.bits[c, old] &= ~bit
+            if new:
+                self.bits[c, new] |= bit
+        for k in (1, 2, 3):
+            if any(self.codes[c][i] == k for c in range(len(self.cols_lc))):
+                self.any[k] |= bit
+            else:
+                self.any[k] &= ~bit
+
+    # ----- incremental sync -----
+    def sync(self) -> None:
+        now = time.monotonic()
+        if now - self.loaded_at > RELOAD_SECONDS:
+            self.reload()
+            return
+        changed = set()
+        try:
+            for change in self._listener:
+                if change is None:
+                    break
+                changed.add(change[0])
+        except Exception:
+            # listener connection lost: notifications may be missing
+            self.reload()
+            return
+        rows = []
+        if changed:
+            rows.extend(db_backend.fetch_cells(self.columns, runs=sorted(changed)))
+        if now - self.polled_at > POLL_SECONDS:
+            self.polled_at = now
+            rows.extend(db_backend.fetch_cells(self.columns, after_run=self.runs[-1] if self.runs else None))
+        appended = rebuild = False
+        for row in sorted(rows, key=lambda r: r[0]):
+            i = bisect_left(self.runs, row[0])
+            if i < len(self.runs) and self.runs[i] == row[0]:
+                self._set_row(i, row)
+            elif i == len(self.runs):
+                self._append(row)
+                appended = True
+            else:
+                # a run older than the newest one appeared: positions shift
+                self.runs.insert(i, row[0])
+                for c, raw in enumerate(row[1:]):
+                    p = self._intern(raw)
+                    self.codes[c].insert(i, self._pool_code[p])
+                    self.cells[c].insert(i, p)
+                rebuild = True
+        if rebuild or appended:
+            self._rebuild_bits()
+
+    # ----- queries -----
+    def supports(self, filters: Dict[str, Any], columns: Sequence[str]) -> bool:
+        return (list(columns) == self.columns
+                and not (filters.get("notes_contains") or "").strip()
+                and all(filters.get(k) is None for k in _DAQ_KEYS)
+                and filters.get("run_set") is None
+                and (filters.get("sort") or "run") == "run")
+
+    def mask(self, filters: Dict[str, Any]) -> int:
+        """Bitset of runs matching the build_where filters (same semantics)."""
+        n = len(self.runs)
+        rne = filters.get("run_number_exact")
+        if rne is not None:
+            i = bisect_left(self.runs, rne)
+            m = (1 << i) if i < n and self.runs[i] == rne else 0
+        else:
+            lo = 0 if filters.get("run_min") is None else bisect_left(self.runs, filters["run_min"])
+            hi = n if filters.get("run_max") is None else bisect_right(self.runs, filters["run_max"])
+            m = ((1 << hi) - 1) ^ ((1 << lo) - 1) if hi > lo else 0
+        k = _CODE.get((filters.get("require_class") or "").strip().upper())
+        if k:
+            m &= self.any[k]
+        subsys = (filters.get("subsys_filter") or "").strip()
+        k = _CODE.get((filters.get("subsys_class") or "").strip().upper())
+        if subsys in self.columns and k:
+            m &= self.bits[self.columns.index(subsys), k]
+        return m
+
+    def count(self, filters: Dict[str, Any]) -> int:
+        return self.mask(filters).bit_count()
+
+    def page(self, filters: Dict[str, Any], limit: int, offset: int) -> List[Tuple[Any, ...]]:
+        """Rows shaped like fetch_goodruns_page: (runnumber, raw cell, ...) in run order."""
+        m = self.mask(filters)
+        out = []
+        if filters.get("dir") == "asc":
+            m = _drop_low(m, offset)
+            while m and len(out) < limit:
+                low = m & -m
+                out.append(self._row(low.bit_length() - 1))
+                m ^= low
+        else:
+            m = _drop_high(m, offset)
+            while m and len(out) < limit:
+                i = m.bit_length() - 1
+                out.append(self._row(i))
+                m ^= 1 << i
+        return out
+
+    def _row(self, i: int) -> Tuple[Any, ...]:
+        return (self.runs[i],) + tuple(self.pool[self.cells[c][i]] for c in range(len(self.cols_lc)))
+
+def enable(columns: Optional[Sequence[str]] = None) -> Snapshot:
+    """Load the snapshot and route supported count/page queries in this process to it."""
+    if columns is None:
+        from tools.params import COLUMNS as columns
+    snap = Snapshot(columns)
+    db_backend.use_snapshot(snap)
+    return snap
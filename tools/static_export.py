@@ -0,0 +1,266 @@
+# tools/static_export.py
+# Read-only static copy of the registry for plain static hosting (outside
+# viewers, DB maintenance windows).
+#
+#   python -m tools.static_export /var/www/runqa-static [--page-size 100] [--jobs 8] [--force]
+#
+# Layout of OUT:
+#   index.html                view list with run counts
+#   style.css                 output of tools/style.py
+#   lightbox.js               tools/script.py?part=lightbox (thumbnail previews)
+#   manifest.json             per view and page: file, run range, row count, digest
+#   <view>/index.html         redirect to the view's newest page
+#   <view>/runs-00001.html    pages (views: all, physics, cosmics, calibration)
+#   <view>/runs-00001.json    the same rows in rows.py's row format
+#
+# A page holds a fixed slice of its view counted from the oldest run, so new
+# runs only change the newest page; the pager still shows the newest page as
+# page 1, as all.py does. A page's digest covers its goodruns cells, their DAQ
+# metadata, the presence of their QA artifacts and the page count, and a page
+# is rewritten only when its digest changes. Every page is rewritten when the
+# page count, page size or renderer (this file, tools/templates.py) changes,
+# or with --force. QA filesystem probes and rendering run in --jobs processes.
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+import datetime as dt
+import subprocess
+import html as _html
+from multiprocessing import Pool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from tools.db_backend import fetch_cells, get_run_metadata
+from tools.params import COLUMNS
+from tools.templates import (
+    join_rows, parse_cell, render_table, render_pagination,
+    _offline_paths_urls, _online_urls,
+)
+
+VIEWS = ("all", "physics", "cosmics", "calibration")
+PAGE_SIZE_DEFAULT = 100
+_META_BATCH = 5000   # run numbers per get_run_metadata call
+_PROBE_BATCH = 500   # runs per filesystem-probe task
+
+_TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def _page_file(k: int) -> str:
+    return f"runs-{k:05d}"
+
+def _write_if_changed(path: str, data: bytes) -> bool:
+    try:
+        with open(path, "rb") as f:
+            if f.read() == data:
+                return False
+    except OSError:
+        pass
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+    return True
+
+def _renderer_digest() -> str:
+    h = hashlib.sha1()
+    for name in ("static_export.py", "templates.py"):
+        with open(os.path.join(_TOOLS_DIR, name), "rb") as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+# ---------- workers ----------
+def _probe(batch: List[Tuple[int, str]]) -> Dict[int, Tuple[bool, bool, bool, bool]]:
+    """(offline dir, online dir, tracking PNG, calo PNG) presence per run."""
+    out = {}
+    for rn, rt in batch:
+        off, onl = _offline_paths_urls(rn, rt), _online_urls(rn, rt)
+        out[rn] = (off["dir_exists"], onl["exists"],
+                   os.path.exists(off["tqa_fs"]), os.path.exists(off["cqa_fs"]))
+    return out
+
+def _json_rows(rows: List[Tuple[Any, ...]], meta: Dict[int, Dict[str, Any]]) -> List[list]:
+    """rows.py row format: [run, begin, runtype, duration, [[class, notes], ...]]."""
+    out = []
+    for row in rows:
+        info = meta.get(row[0], {}) or {}
+        out.append([row[0], str(row[1]) if row[1] else "", info.get("runtype", "") or "",
+                    info.get("duration"), [list(parse_cell(raw)) for raw in row[2:]]])
+    return out
+
+def _page_html(view: str, views: Sequence[str], title: str, summary: str, table: str, pager: str) -> str:
+    nav = " · ".join(f"<strong>{v}</strong>" if v == view else f'<a href="../{v}/index.html">{v}</a>'
+                     for v in views)
+    return f"""<html><head><meta charset="utf-8">
+<title>sPHENIX Run Registry – {_html.escape(title)}</title>
+<link rel="stylesheet" href="../style.css">
+<script src="../lightbox.js" defer></script>
+</head><body>
+<h1 style="margin:0 0 6px 0;">sPHENIX Run Registry <small>(read-only snapshot)</small></h1>
+<p><a href="../index.html">Index</a> · {nav}</p>
+<div class="pager-summary">{summary}</div>
+{table}
+<div class='pagination'>{pager}</div>
+</body></html>
+"""
+
+def _render_page(task: Tuple) -> int:
+    """Write one page's HTML and JSON; returns 1 if either file changed."""
+    out_dir, view, views, k, total_pages, raw_rows, meta, columns = task
+    rows = join_rows(raw_rows[::-1], meta)  # newest first, as in all.py
+    display = total_pages - k + 1
+    pager = render_pagination({}, display, total_pages, None, len(raw_rows),
+                              href_for=lambda p: _page_file(total_pages - p + 1) + ".html")
+    if rows:
+        first, last = rows[-1][0], rows[0][0]
+        summary = f"Runs {last}–{first} ({len(rows)} runs) · page {display} of {total_pages}"
+    else:
+        first = last = None
+        summary = "No runs"
+    html = _page_html(view, views, f"{view} page {display}", summary,
+                      render_table(rows, meta, columns), pager)
+    doc = {"view": view, "page": display, "total_pages": total_pages, "first": first, "last": last,
+           "columns": columns, "rows": _json_rows(rows, meta)}
+    base = os.path.join(out_dir, view, _page_file(k))
+    changed = _write_if_changed(base + ".html", html.encode("utf-8"))
+    changed |= _write_if_changed(base + ".json", json.dumps(doc, separators=(",", ":")).encode("utf-8"))
+    return int(changed)
+
+# ---------- export ----------
+def _digest(k: int, total_pages: int, chunk: List[Tuple[Any, ...]],
+            meta: Dict[int, Dict[str, Any]], flags: Dict[int, Tuple]) -> str:
+    parts = [k, total_pages]
+    for row in chunk:
+        info = meta.get(row[0], {}) or {}
+        parts.append([list(row), info.get("runtype"), info.get("duration"),
+                      str(info.get("beginruntime") or ""), flags.get(row[0])])
+    return hashlib.sha1(json.dumps(parts, default=str).encode("utf-8")).hexdigest()
+
+def _read_manifest(out_dir: str) -> Dict[str, Any]:
+    try:
+        with open(os.path.join(out_dir, "manifest.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _style_css() -> bytes:
+    """tools/style.py's stylesheet without its CGI header block."""
+    env = {k: v for k, v in os.environ.items() if k != "HTTP_ACCEPT_ENCODING"}
+    out = subprocess.run([sys.executable, os.path.join(_TOOLS_DIR, "style.py")],
+                         env=env, capture_output=True, check=True).stdout
+    return out.split(b"\r\n\r\n", 1)[-1]
+
+def _lightbox_js() -> bytes:
+    """The image lightbox from tools/script.py that render_table's thumbnails open."""
+    env = {k: v for k, v in os.environ.items() if k != "HTTP_ACCEPT_ENCODING"}
+    env["QUERY_STRING"] = "part=lightbox"
+    out = subprocess.run([sys.executable, os.path.join(_TOOLS_DIR, "script.py")],
+                         env=env, capture_output=True, check=True).stdout
+    return out.split(b"\r\n\r\n", 1)[-1]
+
+def export(out_dir: str, columns: Sequence[str] = COLUMNS, page_size: int = PAGE_SIZE_DEFAULT,
+           jobs: Optional[int] = None, force: bool = False, views: Sequence[str] = VIEWS) -> Dict[str, int]:
+    """Bring out_dir up to date with goodruns; returns counts of pages and rewrites."""
+    columns = list(columns)
+    views = list(views)
+    jobs = jobs or os.cpu_count() or 1
+    os.makedirs(out_dir, exist_ok=True)
+    old = _read_manifest(out_dir)
+    renderer = _renderer_digest()
+    force = (force or old.get("renderer") != renderer or old.get("page_size") != page_size
+             or old.get("columns") != columns)
+
+    rows = sorted(fetch_cells(columns), key=lambda r: r[0])  # ascending: slices are stable
+    meta: Dict[int, Dict[str, Any]] = {}
+    rns = [r[0] for r in rows]
+    for i in range(0, len(rns), _META_BATCH):
+        meta.update(get_run_metadata(rns[i:i + _META_BATCH]))
+
+    pool = Pool(jobs) if jobs > 1 else None
+    imap = pool.imap_unordered if pool else map
+    try:
+        runs_rt = [(rn, (meta.get(rn, {}) or {}).get("runtype", "") or "") for rn in rns]
+        flags: Dict[int, Tuple] = {}
+        for part in imap(_probe, [runs_rt[i:i + _PROBE_BATCH] for i in range(0, len(runs_rt), _PROBE_BATCH)]):
+            flags.update(part)
+
+        manifest_views, tasks = {}, []
+        for view in views:
+            os.makedirs(os.path.join(out_dir, view), exist_ok=True)
+            vrows = rows if view == "all" else [r for r in rows if (meta.get(r[0], {}) or {}).get("runtype") == view]
+            total_pages = max(1, -(-len(vrows) // page_size))
+            old_view = old.get("views", {}).get(view, {})
+            old_digests = {p["page"]: p["digest"] for p in old_view.get("pages", [])}
+            pages = []
+            for k in range(1, total_pages + 1):
+                chunk = vrows[(k - 1) * page_size:k * page_size]
+                digest = _digest(k, total_pages, chunk, meta, flags)
+                pages.append({"page": k, "file": _page_file(k), "first": chunk[0][0] if chunk else None,
+                              "last": chunk[-1][0] if chunk else None, "count": len(chunk), "digest": digest})
+                html_path = os.path.join(out_dir, view, _page_file(k) + ".html")
+                if force or old_digests.get(k) != digest or not os.path.exists(html_path):
+                    vmeta = {r[0]: meta[r[0]] for r in chunk if r[0] in meta}
+                    tasks.append((out_dir, view, views, k, total_pages, chunk, vmeta, columns))
+            # pages past the end (runs removed)
+            for k in range(total_pages + 1, len(old_digests) + 1):
+                for ext in (".html", ".json"):
+                    try:
+                        os.remove(os.path.join(out_dir, view, _page_file(k) + ext))
+                    except FileNotFoundError:
+                        pass
+            newest = _page_file(total_pages) + ".html"
+            _write_if_changed(os.path.join(out_dir, view, "index.html"),
+                              f'<meta http-equiv="refresh" content="0; url={newest}">\n'
+                              f'<a href="{newest}">newest runs</a>\n'.encode("utf-8"))
+            manifest_views[view] = {"runs": len(vrows), "total_pages": total_pages, "pages": pages}
+
+        written = sum(imap(_render_page, tasks))
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    _write_if_changed(os.path.join(out_dir, "style.css"), _style_css())
+    _write_if_changed(os.path.join(out_dir, "lightbox.js"), _lightbox_js())
+    now = dt.datetime.now().isoformat(timespec="seconds")
+    items = "".join(f'<li><a href="{v}/index.html">{v}</a> – {manifest_views[v]["runs"]} runs, '
+                    f'{manifest_views[v]["total_pages"]} pages</li>' for v in views)
+    _write_if_changed(os.path.join(out_dir, "index.html"), f"""<html><head><meta charset="utf-8">
+<title>sPHENIX Run Registry (read-only snapshot)</title>
+<link rel="stylesheet" href="style.css">
+</head><body>
+<h1>sPHENIX Run Registry <small>(read-only snapshot)</small></h1>
+<p>Generated {now}. Classifications may lag the live registry; edits are only possible there.</p>
+<ul>{items}</ul>
+</body></html>
+""".encode("utf-8"))
+    manifest = {"generated": now, "renderer": renderer, "page_size": page_size,
+                "columns": columns, "views": manifest_views}
+    # last, so an interrupted export re-renders its pages next time
+    _write_if_changed(os.path.join(out_dir, "manifest.json"), json.dumps(manifest, indent=1).encode("utf-8"))
+    return {"runs": len(rows), "pages": sum(v["total_pages"] for v in manifest_views.values()),
+            "rendered": len(tasks), "written": written}
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(prog="python -m tools.static_export",
+                                 description="Render the registry into static HTML and JSON pages.")
+    ap.add_argument("out", help="output directory (served as static files)")
+    ap.add_argument("--page-size", type=int, default=PAGE_SIZE_DEFAULT)
+    ap.add_argument("--jobs", type=int, default=0, help="worker processes (default: CPU count)")
+    ap.add_argument("--views", default=",".join(VIEWS), help=f"comma-separated subset of {','.join(VIEWS)}")
+    ap.add_argument("--force", action="store_true", help="rewrite every page")
+    args = ap.parse_args(argv)
+
+    views = [v.strip() for v in args.views.split(",") if v.strip()]
+    unknown = set(views) - set(VIEWS)
+    if unknown or not views:
+        ap.error(f"views must be among {', '.join(VIEWS)}")
+    if args.page_size < 1:
+        ap.error("--page-size must be positive")
+    stats = export(args.out, COLUMNS, args.page_size, args.jobs or None, args.force, views)
+    print(f"{stats['runs']} runs, {stats['pages']} pages: {stats['rendered']} re-rendered, "
+          f"{stats['written']} changed on disk")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
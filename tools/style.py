@@ -1,9 +1,11 @@
 #!/usr/bin/python3
 # Emits CSS for all.py (so we don't inline a giant <style> block)
-import sys, io
+import os, sys, io
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.response import start_response
 
-print("Content-Type: text/css; charset=utf-8\r\n\r\n")
+start_response("text/css; charset=utf-8")
 
 css = r'''
 /* --- Layout / Typography --- */
@@ -60,6 +62,25 @@ tbody tr { cursor: pointer; }       /* visual hint */
 .row-edit .cell-edit { display: block; }
 .row-edit .cell-view { display: none; }
 
+/* --- QA-ready / shifter cells --- */
+td.qa-ready { background-color:#c8f7c5; }
+td.qa-missing { background-color:#f7c5c5; }
+td.shifter-cell { background-color:#fff; color:#111; text-align:center; }
+
+/* --- Unsaved edits --- */
+.edit-mode td.dirty, .row-edit td.dirty { box-shadow: inset 0 0 0 2px #e0a800; }
+
+/* --- Live-updated cell flash (events.py push) --- */
+td.live-updated { outline: 2px solid #4da3ff; outline-offset: -2px; }
+
+/* --- Virtual-scroll view (virtual_ui.py) --- */
+.vtable .vt-scroll { height: 75vh; overflow-y: auto; border: 1px solid #ccc; }
+.vtable tr.vt-row { height: 28px; cursor: default; }
+.vtable tr.vt-row td { padding: 0 8px; white-space: nowrap; overflow: hidden; }
+.vtable tr.vt-pad td, .vtable tr.vt-pad { padding: 0; border: 0; }
+.vtable tr.vt-pending td { color: #888; }
+.vt-status { color: #333; margin-left: 8px; }
+
 /* --- Toast --- */
 .toast {
   position: fixed; right: 12px; bottom: 12px;
@@ -69,6 +90,24 @@ tbody tr { cursor: pointer; }       /* visual hint */
 .toast.show { opacity: 0.95; }
 
 .pager-summary { margin:8px 0; color:#333; }
+.pager-summary.approx { color:#666; }
+th a.sort-link { color:inherit; text-decoration:none; white-space:nowrap; }
+th a.sort-link:hover { text-decoration:underline; }
+th a.sort-link + a.sort-link { font-size:11px; font-weight:normal; margin-left:4px; }
+
+/* --- Heatmap (heatmap.py) --- */
+.hm-controls { display:flex; gap:8px; align-items:center; flex-wrap:wrap; margin:8px 0; }
+.hm-legend { margin-left:auto; font-size:12px; }
+.hm-key { margin-left:10px; white-space:nowrap; }
+.hm-swatch { display:inline-block; width:12px; height:12px; margin-right:4px; vertical-align:middle; border:1px solid #999; }
+.hm-range { font-size:12px; color:#444; }
+.hm-wrap { display:flex; align-items:flex-start; }
+.hm-labels { flex:none; font-size:11px; text-align:right; padding-right:6px; }
+.hm-label { line-height:14px; }
+.hm-scroll { position:relative; overflow-x:auto; }
+.hm-img { display:block; image-rendering:pixelated; cursor:crosshair; }
+.hm-tip { position:absolute; pointer-events:none; background:#fff; border:1px solid #888;
+          padding:2px 6px; font-size:11px; white-space:nowrap; z-index:5; }
 .pager-links { text-align:center; margin:6px 0; }
 .pager-links a, .pager-links strong, .pager-links span { display:inline-block; padding:6px 10px; margin:2px; border:1px solid #ccc; border-radius:5px; text-decoration:none; background:#f8f8f8; color:#005b96; }
 .pager-links a:hover { background:#e6f2ff; border-color:#88c; }
@@ -95,6 +134,14 @@ tbody tr { cursor: pointer; }       /* visual hint */
 .floating-panel ul{ margin:0; padding-left:18px; font-size:13px; }
 .floating-panel .kbd{ font-family:monospace; background:#eee; padding:1px 4px; border-radius:4px; }
 
+/* --- Bulk classify panel --- */
+.bulk-panel { right:18px; top:120px; width:320px; }
+.bulk-panel .bulk-grid { display:grid; grid-template-columns:1fr 1fr; gap:6px; margin:8px 0; }
+.bulk-panel select { width:100%; }
+.bulk-panel textarea { width:100%; box-sizing:border-box; }
+.bulk-panel .bulk-note { color:#666; font-size:11px; margin:4px 0; }
+.bulk-panel .bulk-actions { display:flex; gap:6px; justify-content:flex-end; }
+
 /* Optional: small '?' help square trigger */
 #help-square{
   position:fixed; right:18px; bottom:18px; width:32px; height:32px;
@@ -4,7 +4,9 @@
 import os
 import html as _html
 import urllib.parse as _urlparse
-from typing import Optional, Dict, List, Tuple, Any
+from typing import Optional, Dict, List, Tuple, Any, Callable
+
+from tools import metrics
 
 # -------------------- URL / PARAMS --------------------
 
@@ -26,14 +28,23 @@ def render_pagination(current_params: Dict[str, Any],
                       cur_page: int,
                       total_pages: int,
                       total_count: Optional[int],
-                      page_size: int) -> str:
+                      page_size: int,
+                      approximate: bool = False,
+                      href_for: Optional[Callable[[int], str]] = None) -> str:
     """
     Adaptive pagination with first/prev/next/last, proportional window,
     and a “Showing X–Y of N” summary if total_count is provided.
+    approximate: total_count is an estimate; the summary reads “of about N” and
+    carries the rows.py URL filter_ui.py uses to fetch the exact count.
+    href_for: page number -> link target (default all.py with current_params),
+    e.g. file names for the static snapshot (tools/static_export.py).
     """
     def link(p: int, label: Optional[str] = None, aria: Optional[str] = None) -> str:
         lbl = label or str(p)
-        href = "all.py?" + urlencode_keep(current_params, {"page": str(p)})
+        if href_for is not None:
+            href = _html.escape(href_for(p))
+        else:
+            href = "all.py?" + urlencode_keep(current_params, {"page": str(p)})
         aria_attr = ' aria-label="{}"'.format(_html.escape(aria)) if aria else ""
         return '<a href="{}"{}>{}</a>'.format(href, aria_attr, lbl)
 
@@ -45,7 +56,15 @@ def render_pagination(current_params: Dict[str, Any],
         else:
             start_i = (cur_page - 1) * page_size + 1
             end_i = min(cur_page * page_size, total_count)
-            summary_html = '<div class="pager-summary">Showing {}–{} of {}</div>'.format(start_i, end_i, total_count)
+            if approximate:
+                count_qs = urlencode_keep(current_params, {"page": None, "limit": "0", "count": "1"})
+                summary_html = (
+                    '<div class="pager-summary approx" data-count-url="rows.py?{}" '
+                    'data-page-size="{}" data-total-pages="{}">'
+                    'Showing {}–{} of about <span class="pager-total">{}</span></div>'
+                ).format(_html.escape(count_qs), page_size, total_pages, start_i, end_i, total_count)
+            else:
+                summary_html = '<div class="pager-summary">Showing {}–{} of {}</div>'.format(start_i, end_i, total_count)
 
     if total_pages <= 1:
         return summary_html
@@ -138,7 +157,8 @@ def label_for(rc: Optional[str]) -> str:
 def active_filters_panel(filters: Dict[str, Any], run_type_filter: str) -> str:
     """
     Pretty “Active Filters” line built from the filter dict and run_type.
-    Expecting keys run_number_exact, run_min, run_max.
+    Expecting keys run_number_exact, run_min, run_max; optional begin_from,
+    begin_to (datetime), dur_min, dur_max (minutes) and cols (shown subsystems).
     """
     items = []
     if filters.get("run_number_exact") is not None:
@@ -152,6 +172,22 @@ def active_filters_panel(filters: Dict[str, Any], run_type_filter: str) -> str:
         items.append("Run " + " and ".join(minmax))
     if run_type_filter:
         items.append("Type = {}".format(_html.escape(run_type_filter)))
+    begin = []
+    if filters.get("begin_from") is not None:
+        begin.append("from {}".format(filters["begin_from"].strftime("%Y-%m-%d %H:%M")))
+    if filters.get("begin_to") is not None:
+        begin.append("before {}".format(filters["begin_to"].strftime("%Y-%m-%d %H:%M")))
+    if begin:
+        items.append("Began " + " and ".join(begin))
+    dur = []
+    if filters.get("dur_min") is not None:
+        dur.append("&ge; {} min".format(filters["dur_min"]))
+    if filters.get("dur_max") is not None:
+        dur.append("&le; {} min".format(filters["dur_max"]))
+    if dur:
+        items.append("Duration " + " and ".join(dur))
+    if filters.get("cols"):
+        items.append("Columns = {}".format(_html.escape(", ".join(filters["cols"]))))
     if not items:
         return "<em>None</em>"
     return " &nbsp;•&nbsp; ".join(items)
@@ -166,6 +202,7 @@ def render_header() -> str:
 <script src="tools/script.py?v=1" defer></script>
 <script src="tools/filter_ui.py?v=1" defer></script>
 <script src="tools/help_ui.py?v=1" defer></script>
+<script src="tools/virtual_ui.py?v=1" defer></script>
 </head><body>
 <div style="display:flex;align-items:center;gap:20px;margin-bottom:10px;">
   <img src="https://sphenix-intra.sdcc.bnl.gov/WWW/static/sphenix-logo-white-bg.png" alt="sPHENIX Logo" style="height:80px;">
@@ -241,9 +278,32 @@ def render_top_controls(current_params: Dict[str, Any]) -> str:
   <button type="button" id="btnHelp" class="btn" onclick="openHelp('btnHelp')">
     Help / Hotkeys (Ctrl+H)
   </button>
+  <button type="button" id="btnBulk" class="btn" onclick="openBulkPanel()">
+    Bulk classify…
+  </button>
+  <a class="btn" href="all.py?{vqs}" title="Scroll through every matching run (read-only)">Virtual scroll view</a>
+  <a class="btn" href="heatmap.py" title="Run × subsystem status over the whole run history">Heatmap</a>
 </div>
 <form id="bulkForm" method="post" action="all.py?{qs}">
-""".format(qs=urlencode_keep(current_params))
+""".format(qs=urlencode_keep(current_params),
+           vqs=urlencode_keep(current_params, {"view": "virtual", "page": ""}))
+
+def render_virtual_table(current_params: Dict[str, Any], columns: List[str]) -> str:
+    """
+    Shell for the virtual-scroll view; tools/virtual_ui.py fills it from rows.py
+    in windows and only keeps the visible rows in the DOM.
+    """
+    qs = urlencode_keep(current_params, {"view": "", "page": ""})
+    return """
+<div class="edit-controls" style="margin-bottom:8px;">
+  <a class="btn" href="all.py?{qs}">Paged view (editable)</a>
+  <button type="button" id="btnHelp" class="btn" onclick="openHelp('btnHelp')">
+    Help / Hotkeys (Ctrl+H)
+  </button>
+  <span class="vt-status" id="vtStatus"></span>
+</div>
+<div id="vtable" class="vtable" data-qs="{qs_attr}" data-cols="{cols}"></div>
+""".format(qs=qs, qs_attr=_html.escape(qs), cols=_html.escape(",".join(columns)))
 
 # def render_table(rows: List[Tuple[Any, ...]],
 #                  meta: Dict[int, Dict[str, Any]],
@@ -372,7 +432,16 @@ def render_footer() -> str:
 _SPHENIX_HTTP = "https://sphenix-intra.sdcc.bnl.gov"
 _OFF_HTTP_BASE = _SPHENIX_HTTP + "/WWW/subsystem/QAHtml"
 _ONL_HTTP_BASE = _SPHENIX_HTTP + "/WWW/run/2025/OnlMonHtml"
-_OFF_FS_BASE   = "/sphenix/WWW/subsystem/QAHtml"
+# Filesystem roots behind the QA links (existence checks only); overridable so
+# a test box can point them at a synthetic tree (see tools/loadtest.py)
+_OFF_FS_BASE   = os.getenv("RUNQA_QA_FS_BASE", "/sphenix/WWW/subsystem/QAHtml")
+_ONL_FS_BASE   = os.getenv("RUNQA_ONL_FS_BASE", "/sphenix/WWW/run/2025/OnlMonHtml")
+
+# existence-check latency per tree (the QA roots are network filesystems)
+_PROBE_OFFLINE = metrics.histogram("runqa_fs_probe_seconds", tree="offline")
+_PROBE_ONLINE = metrics.histogram("runqa_fs_probe_seconds", tree="online")
+_PROBE_QA = metrics.histogram("runqa_fs_probe_seconds", tree="qa_ready")
+_RENDER_TABLE = metrics.histogram("runqa_render_seconds", part="table")
 
 def _rt_dir(rt: str) -> str:
     return (rt or "").strip().lower()
@@ -397,8 +466,10 @@ def _offline_paths_urls(rn: int, rt: str) -> dict:
     cqa_url  = f"{_OFF_HTTP_BASE}/{rtd}/{bin_dir}/{leaf}/CaloQA_cemc1_{rn}.png"
     # Legacy mon.cgi (you said these work fine—keep them)
     mon_url  = f"{_OFF_HTTP_BASE}/mon.cgi?runnumber={rn}&runtype={rtd}"
+    with _PROBE_OFFLINE.time():
+        dir_exists = os.path.isdir(dir_fs) or os.path.exists(menu_fs)
     return {
-        "dir_exists": os.path.isdir(dir_fs) or os.path.exists(menu_fs),
+        "dir_exists": dir_exists,
         "menu_url": menu_url,
         "mon_url":  mon_url,
         "tqa_fs": tqa_fs, "tqa_url": tqa_url,
@@ -414,23 +485,85 @@ def _online_urls(rn: int, rt: str) -> dict:
     mon_url  = f"{_ONL_HTTP_BASE}/mon.cgi?runnumber={rn}&runtype={rtd}"
     # Try a cheap existence check: if the menu URL mirrors local export, you can
     # check the matching FS path; otherwise leave as always-enabled link.
-    onl_dir_fs = f"/sphenix/WWW/run/2025/OnlMonHtml/{rtd}/{bin_dir}/{leaf}"
-    exists = os.path.isdir(onl_dir_fs) or os.path.exists(os.path.join(onl_dir_fs, "menu.html"))
+    onl_dir_fs = os.path.join(_ONL_FS_BASE, rtd, bin_dir, leaf)
+    with _PROBE_ONLINE.time():
+        exists = os.path.isdir(onl_dir_fs) or os.path.exists(os.path.join(onl_dir_fs, "menu.html"))
     return {"exists": exists, "menu_url": menu_url, "mon_url": mon_url}
 
+def _qa_ready_fs(rn: int, rt: str) -> Tuple[str, str]:
+    """Filesystem paths of the tracking / calo QA-ready PNGs for a run."""
+    dir_fs = os.path.join(_OFF_FS_BASE, _rt_dir(rt), _bin_dir(rn), f"{rn:05d}")
+    return (os.path.join(dir_fs, f"TpcLasersQA_1_{rn:05d}.png"),
+            os.path.join(dir_fs, f"CaloQA_cemc1_{rn}.png"))
+
+def join_rows(raw_rows: List[Tuple[Any, ...]],
+              meta: Dict[int, Dict[str, Any]],
+              run_type_filter: str = "",
+              track_ready: bool = False,
+              calo_ready: bool = False) -> List[Tuple[Any, ...]]:
+    """
+    Attach DAQ begin-run time to goodruns rows and apply the post-join filters
+    that cannot run in SQL (run type, QA-ready file presence).
+    raw_rows: (runnumber, MVTX, ...) -> returns (runnumber, beginruntime, MVTX, ...)
+    """
+    rows = []
+    for row in raw_rows:
+        rn = row[0]
+        info = meta.get(rn, {}) or {}
+        runtime = info.get("beginruntime") or ""
+        rt = info.get("runtype", "") or ""
+        if run_type_filter and rt != run_type_filter:
+            continue
+        if track_ready or calo_ready:
+            tqa, cqa = _qa_ready_fs(rn, rt)
+            with _PROBE_QA.time():
+                missing = ((track_ready and not os.path.exists(tqa))
+                           or (calo_ready and not os.path.exists(cqa)))
+            if missing:
+                continue
+        rows.append((rn, runtime) + tuple(row[1:]))
+    return rows
+
+def _sort_link(label: str, key: str, current_params: Dict[str, Any]) -> str:
+    """Link to the table sorted by `key`; on the current sort key it flips the direction."""
+    cur_key = current_params.get("sort") or "run"
+    cur_dir = current_params.get("dir") or "desc"
+    if cur_key == key:
+        new_dir = "desc" if cur_dir == "asc" else "asc"
+        arrow = " &#9650;" if cur_dir == "asc" else " &#9660;"
+    else:
+        new_dir, arrow = "desc", ""
+    href = "all.py?" + urlencode_keep(current_params, {
+        "sort": "" if key == "run" else key,
+        "dir": "asc" if new_dir == "asc" else "",
+        "page": None,
+    })
+    return (f"<a class='sort-link' href='{_html.escape(href)}' "
+            f"title='Sort by {_html.escape(label)}'>{_html.escape(label)}{arrow}</a>")
+
+def _sort_header(current_params: Optional[Dict[str, Any]], cls: str, *links: Tuple[str, str]) -> str:
+    """<th> holding sort links for (label, key) pairs; plain labels without current_params."""
+    cls_attr = f" class='{cls}'" if cls else ""
+    if current_params is None:
+        return f"<th{cls_attr}>{_html.escape(links[0][0])}</th>"
+    return f"<th{cls_attr}>" + " ".join(_sort_link(l, k, current_params) for l, k in links) + "</th>"
+
+@_RENDER_TABLE.timed
 def render_table(rows: List[Tuple[Any, ...]],
                  meta: Dict[int, Dict[str, Any]],
-                 columns: List[str]) -> str:
+                 columns: List[str],
+                 current_params: Optional[Dict[str, Any]] = None) -> str:
+    """current_params: when given, column headers become sort links (see db_backend sorting)."""
     out = []
     out.append("<table border='1'>")
     out.append("<thead><tr>")
-    out.append("<th>Run #</th>")
-    out.append("<th>Begin Run Time</th>")
+    out.append(_sort_header(current_params, "", ("Run #", "run")))
+    out.append(_sort_header(current_params, "", ("Begin Run Time", "begin"), ("Duration", "duration")))
     out.append("<th>QA Links</th>")
     out.append("<th>Previews</th>")
     out.append("<th>Run Type</th>")
     for col in columns:
-        out.append(f"<th class='col-{col.lower()}'>{_html.escape(col)}</th>")
+        out.append(_sort_header(current_params, f"col-{col.lower()}", (col, col.lower())))
     out.append("<th>Tracking QA Ready</th>")
     out.append("<th>Calo QA Ready</th>")
     out.append("<th>Shifter Checked</th>")
@@ -465,15 +598,20 @@ def render_table(rows: List[Tuple[Any, ...]],
         )
         qa_links_cell = f"<div class='qa-links'>{off_html}{onl_html}</div>"
 
+        # QA-ready PNGs: checked once, shown as thumbnails and in the ready columns
+        with _PROBE_QA.time():
+            tqa_ready = os.path.exists(offline["tqa_fs"])
+            cqa_ready = os.path.exists(offline["cqa_fs"])
+
         # Thumbnails / previews (lazy load). Click -> lightbox
         thumbs = []
-        if os.path.exists(offline["tqa_fs"]):
+        if tqa_ready:
             thumbs.append(
                 "<img class='thumb' loading='lazy' "
                 f"src='{_html.escape(offline['tqa_url'])}' alt='TPC Lasers' "
                 f"onclick=\"openLightbox('{_html.escape(offline['tqa_url'])}','Run {rn} • TPC Lasers')\">"
             )
-        if os.path.exists(offline["cqa_fs"]):
+        if cqa_ready:
             thumbs.append(
                 "<img class='thumb' loading='lazy' "
                 f"src='{_html.escape(offline['cqa_url'])}' alt='Calo QA' "
@@ -481,20 +619,20 @@ def render_table(rows: List[Tuple[Any, ...]],
             )
         previews_cell = "<div class='thumbs'>" + ("".join(thumbs) if thumbs else "&mdash;") + "</div>"
 
-        out.append("<tr>")
+        out.append(f"<tr data-run='{rn}'>")
         out.append(f"<td>{rn}</td>")
         out.append(f"<td>{runtime}</td>")
         out.append(f"<td>{qa_links_cell}</td>")
         out.append(f"<td>{previews_cell}</td>")
         out.append(f"<td>{_html.escape(rt)}</td>")
 
-        # Subsystem cells (unchanged)
+        # Subsystem cells: view markup only. script.py builds the select/textarea
+        # editors from the cell (class + .note-ellip text) when editing starts.
         for i, raw in enumerate(subs):
             runclass, notes = parse_cell(raw)
             css = class_to_css(runclass)
             label = label_for(runclass)
             col_name = columns[i]
-            field_base = f"{col_name}_{rn}"
             col_class = f"col-{col_name.lower()}"
 
             pill_class = (
@@ -508,41 +646,22 @@ def render_table(rows: List[Tuple[Any, ...]],
                 + (f"<div class='note-ellip'>{_html.escape(notes or '')}</div>" if notes else "")
             )
 
-            edit_html = (
-                "<div class=\"editor-vert\">"
-                f"<select name=\"runclass_{field_base}\" class=\"{css}\">"
-                "<option value=\"\">--</option>"
-                f"<option value=\"GOLDEN\" {'selected' if (runclass or '').upper()=='GOLDEN' else ''}>GOLDEN</option>"
-                f"<option value=\"QUESTIONABLE\" {'selected' if (runclass or '').upper()=='QUESTIONABLE' else ''}>QUESTIONABLE</option>"
-                f"<option value=\"BAD\" {'selected' if (runclass or '').upper()=='BAD' else ''}>BAD</option>"
-                "</select>"
-                f"<textarea name=\"notes_{field_base}\" placeholder=\"Notes…\">{_html.escape(notes or '')}</textarea>"
-                "</div>"
-            )
-
             out.append(
-                f"<td class='{css} {col_class}'>"
-                f"<div class='label-wrap'>"
-                f"<div class='cell-view'>{view_html}</div>"
-                f"<div class='cell-edit'>{edit_html}</div>"
-                f"</div></td>"
+                f"<td class='{css} {col_class}' data-col='{col_name.lower()}'>"
+                f"<div class='label-wrap'><div class='cell-view'>{view_html}</div></div></td>"
             )
 
         # QA ready (re-using offline FS checks)
-        tqa_ready = os.path.exists(offline["tqa_fs"])
-        cqa_ready = os.path.exists(offline["cqa_fs"])
-        out.append("<td style='background-color:{};'>{}</td>".format("#c8f7c5" if tqa_ready else "#f7c5c5", "QA ready" if tqa_ready else "QA Not ready"))
-        out.append("<td style='background-color:{};'>{}</td>".format("#c8f7c5" if cqa_ready else "#f7c5c5", "QA ready" if cqa_ready else "QA Not ready"))
-
-        out.append("""
-<td style="background-color:#fff; color:#111; text-align:center;">
-  <select>
-    <option value="OPEN">Open</option>
-    <option value="COMPLETED">Shifter completed</option>
-    <option value="SIGNOFF">Expert signed off</option>
-  </select>
-</td>
-""")
+        out.append("<td class='qa-ready'>QA ready</td>" if tqa_ready else "<td class='qa-missing'>QA Not ready</td>")
+        out.append("<td class='qa-ready'>QA ready</td>" if cqa_ready else "<td class='qa-missing'>QA Not ready</td>")
+
+        out.append(
+            "<td class='shifter-cell'><select>"
+            "<option value='OPEN'>Open</option>"
+            "<option value='COMPLETED'>Shifter completed</option>"
+            "<option value='SIGNOFF'>Expert signed off</option>"
+            "</select></td>"
+        )
         out.append("</tr>")
 
     out.append("</tbody></table>")
@@ -0,0 +1,154 @@
+#!/usr/bin/python3
+# Emits JS for the virtual-scroll run table (all.py?view=virtual, rows from rows.py).
+import os, sys, io
+sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tools.response import start_response
+
+start_response("application/javascript; charset=utf-8")
+
+js = r'''
+(function(){
+  "use strict";
+
+  const ROW_H = 28;        // must match .vtable tr.vt-row height in style.py
+  const OVERSCAN = 15;     // rows rendered above/below the viewport
+  const WINDOW = 500;      // rows per rows.py request
+  const PREFETCH = 200;    // fetch the next window this many rows before the end
+
+  const CSS  = { GOLDEN: "golden", QUESTIONABLE: "questionable", BAD: "bad" };
+  const PILL = { GOLDEN: ["g", "Good"], QUESTIONABLE: ["q", "Quest."], BAD: ["b", "Bad"] };
+
+  function esc(s) {
+    return String(s == null ? "" : s).replace(/[&<>"']/g, (c) => (
+      { "&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;" }[c]));
+  }
+
+  function fmtDuration(sec) {
+    if (sec === null || sec === undefined) return "&mdash;";
+    const m = Math.floor(sec / 60), s = sec % 60;
+    return m + "m " + (s < 10 ? "0" : "") + s + "s";
+  }
+
+  function VTable(root) {
+    this.root = root;
+    this.qs = root.getAttribute("data-qs") || "";
+    this.cols = (root.getAttribute("data-cols") || "").split(",").filter(Boolean);
+    this.rows = [];            // compact arrays from rows.py
+    this.total = null;         // goodruns matches before post-join filters
+    this.nextOffset = 0;
+    this.done = false;
+    this.loading = false;
+    this.first = -1; this.last = -1;
+
+    const head = ["Run #", "Begin Run Time", "Run Type", "Duration"]
+      .map((h) => "<th>" + h + "</th>").join("") +
+      this.cols.map((c) => "<th class='col-" + esc(c.toLowerCase()) + "'>" + esc(c) + "</th>").join("");
+    root.innerHTML =
+      "<div class='vt-scroll'><table border='1'><thead><tr>" + head +
+      "</tr></thead><tbody></tbody></table></div>";
+    this.scroller = root.querySelector(".vt-scroll");
+    this.tbody = root.querySelector("tbody");
+    this.status = document.getElementById("vtStatus");
+
+    let queued = false;
+    this.scroller.addEventListener("scroll", () => {
+      if (queued) return;
+      queued = true;
+      requestAnimationFrame(() => { queued = false; this.render(); this.maybeFetch(); });
+    }, { passive: true });
+    window.addEventListener("resize", () => this.render(true));
+
+    this.maybeFetch();
+  }
+
+  // Scroll height covers the expected row count so the scrollbar is meaningful
+  // before everything is loaded.
+  VTable.prototype.virtualCount = function () {
+    if (this.done) return this.rows.length;
+    return Math.max(this.rows.length, this.total || 0);
+  };
+
+  VTable.prototype.visibleRange = function () {
+    const top = this.scroller.scrollTop;
+    const h = this.scroller.clientHeight;
+    const n = this.virtualCount();
+    const first = Math.max(0, Math.floor(top / ROW_H) - OVERSCAN);
+    const last = Math.min(n, Math.ceil((top + h) / ROW_H) + OVERSCAN);
+    return [first, last];
+  };
+
+  VTable.prototype.rowHTML = function (r, i) {
+    if (!r) {
+      return "<tr class='vt-row vt-pending'><td colspan='" + (4 + this.cols.length) + "'>Loading…</td></tr>";
+    }
+    const cells = r[4].map((c, k) => {
+      const key = (c[0] || "").toUpperCase();
+      const pill = PILL[key] || ["", "&mdash;"];
+      return "<td class='" + (CSS[key] || "unknown") + " col-" + esc(this.cols[k].toLowerCase()) + "'" +
+        (c[1] ? " title='" + esc(c[1]) + "'" : "") + ">" +
+        "<span class='pill " + pill[0] + "'>" + pill[1] + "</span>" + (c[1] ? " &#9998;" : "") + "</td>";
+    }).join("");
+    return "<tr class='vt-row'><td><a href='all.py?run_number=" + r[0] + "'>" + r[0] + "</a></td>" +
+      "<td>" + (esc(r[1]) || "&mdash;") + "</td><td>" + esc(r[2]) + "</td>" +
+      "<td>" + fmtDuration(r[3]) + "</td>" + cells + "</tr>";
+  };
+
+  VTable.prototype.render = function (force) {
+    const [first, last] = this.visibleRange();
+    if (!force && first === this.first && last === this.last) return;
+    this.first = first; this.last = last;
+    const n = this.virtualCount();
+    const parts = ["<tr class='vt-pad' style='height:" + (first * ROW_H) + "px'></tr>"];
+    for (let i = first; i < last; i++) parts.push(this.rowHTML(this.rows[i], i));
+    parts.push("<tr class='vt-pad' style='height:" + ((n - last) * ROW_H) + "px'></tr>");
+    this.tbody.innerHTML = parts.join("");
+    this.updateStatus();
+  };
+
+  VTable.prototype.updateStatus = function () {
+    if (!this.status) return;
+    const loaded = this.rows.length.toLocaleString();
+    this.status.textContent = this.done
+      ? loaded + " runs"
+      : loaded + " of ~" + (this.total || 0).toLocaleString() + " runs loaded" + (this.loading ? " …" : "");
+  };
+
+  // Windows are fetched in order (post-join filters make offsets non-linear),
+  // so a long jump keeps fetching until the viewport is covered.
+  VTable.prototype.maybeFetch = async function () {
+    if (this.loading || this.done) return;
+    const [, last] = this.visibleRange();
+    if (this.rows.length > 0 && last + PREFETCH < this.rows.length) return;
+    this.loading = true;
+    this.updateStatus();
+    try {
+      const url = "rows.py?" + this.qs + (this.qs ? "&" : "") +
+        "offset=" + this.nextOffset + "&limit=" + WINDOW;
+      const res = await fetch(url, { headers: { "Accept": "application/json" } });
+      const data = await res.json();
+      if (!res.ok || data.error) throw new Error(data.error || ("HTTP " + res.status));
+      if (data.total !== null && data.total !== undefined) this.total = data.total;
+      for (const r of data.rows) this.rows.push(r);
+      this.nextOffset = data.next_offset;
+      this.done = !!data.done || (this.total !== null && this.nextOffset >= this.total);
+    } catch (e) {
+      this.done = true;
+      if (window.showToast) window.showToast("Could not load runs: " + e.message);
+    } finally {
+      this.loading = false;
+    }
+    this.render(true);
+    this.maybeFetch();
+  };
+
+  function initVirtualTable() {
+    const root = document.getElementById("vtable");
+    if (root && !root._vt) root._vt = new VTable(root);
+  }
+
+  document.addEventListener("DOMContentLoaded", initVirtualTable);
+  window.initVirtualTable = initVirtualTable;
+})();
+'''
+print(js)